@@ -1,8 +1,11 @@
 from .account import Account, get_verified_account
-from .application import (get_authorization_url, get_token_from_code,
-                          verify_token)
+from .application import (TokenVerificationCache, get_authorization_url,
+                          get_token_from_code, verify_token)
 from .client import Client
 from .config import configuration
+from .http_cache import ResponseCache
+from .ratelimit import RateLimiter
+from .retry import RetryPolicy
 from .version import VERSION
 
 __version__ = VERSION
@@ -3,7 +3,9 @@ from __future__ import unicode_literals
 from . import exceptions
 from .application import verify_token
 from .client import Client
+from .transfer import MultipartUpload
 from .util import url_join
+from .walk import TreeWalker
 
 
 class Account(Client):
@@ -15,7 +17,10 @@ class Account(Client):
     :ivar str url: Base url which would be used as prefix for all http method
         calls
     """
-    def __init__(self, token=None, api_key=None, account_id=None):
+    def __init__(self, token=None, api_key=None, account_id=None,
+                 retry_policy=None, response_cache=None,
+                 metadata_cache=None, connection_pool=None,
+                 rate_limiter=None, request_coalescer=None):
         """
         Either ``token`` or ``api_key`` is needed for instantiation.
         ``account_id`` is needed if ``api_key`` is specified.
@@ -23,6 +28,12 @@ class Account(Client):
         :param token: Bearer token
         :param api_key: API key
         :param account_id: Account ID
+        :param retry_policy: See :func:`kloudless.client.Session.__init__`
+        :param response_cache: See :func:`kloudless.client.Session.__init__`
+        :param metadata_cache: See :func:`kloudless.client.Client.__init__`
+        :param connection_pool: See :func:`kloudless.client.Session.__init__`
+        :param rate_limiter: See :func:`kloudless.client.Session.__init__`
+        :param request_coalescer: See :func:`kloudless.client.Client.__init__`
         """
         if api_key and not account_id:
             raise exceptions.InvalidParameter(
@@ -30,7 +41,13 @@ class Account(Client):
                 " to create an account instance"
             )
 
-        super(Account, self).__init__(api_key=api_key, token=token)
+        super(Account, self).__init__(api_key=api_key, token=token,
+                                      retry_policy=retry_policy,
+                                      response_cache=response_cache,
+                                      metadata_cache=metadata_cache,
+                                      connection_pool=connection_pool,
+                                      rate_limiter=rate_limiter,
+                                      request_coalescer=request_coalescer)
 
         self.account_id = account_id or 'me'
         self.url = url_join(self.url, 'accounts/{}'.format(self.account_id))
@@ -54,18 +71,68 @@ class Account(Client):
         headers['X-Kloudless-Raw-URI'] = raw_uri
         return self.post('raw', get_raw_response=True, **kwargs)
 
+    def upload_multipart(self, source, parent_id, name, workers=4,
+                         checkpoint_path=None, **kwargs):
+        """
+        Upload a large file in parts concurrently through the multipart upload
+        endpoints. See :class:`kloudless.transfer.MultipartUpload`.
+
+        :param source: File path or seekable file object opened in binary mode
+        :param str parent_id: ID of the destination folder
+        :param str name: Name of the uploaded file
+        :param int workers: Maximum number of parts uploaded concurrently
+        :param str checkpoint_path: Path of the JSON file used to resume the
+            upload after a failure or crash
+        :param kwargs: See :class:`kloudless.transfer.MultipartUpload` for
+            more options.
+
+        :return: :class:`kloudless.resources.base.Resource` of the file
+        """
+        upload = MultipartUpload(self, source, parent_id, name,
+                                 workers=workers,
+                                 checkpoint_path=checkpoint_path, **kwargs)
+        return upload.upload()
+
+    def walk(self, folder_id='root', concurrency=4, max_depth=None,
+             **kwargs):
+        """
+        Generator walking the storage tree of ``folder_id``, listing up to
+        ``concurrency`` folders at a time. See
+        :class:`kloudless.walk.TreeWalker`.
+
+        .. code:: python
+
+            for path, resource in account.walk(concurrency=8):
+                print(path, resource.data['size'])
+
+        :param str folder_id: ID of the folder to walk
+        :param int concurrency: Maximum number of folders listed at a time
+        :param int max_depth: Depth of the deepest items yielded, ``1`` for
+            the items of ``folder_id`` only. ``None`` for no limit
+        :param kwargs: See :class:`kloudless.walk.TreeWalker` for more
+            options.
+
+        :return: generator that yield ``(path, resource)`` tuples in the
+            order resources are received
+        """
+        walker = TreeWalker(self, folder_id=folder_id,
+                            concurrency=concurrency, max_depth=max_depth,
+                            **kwargs)
+        return walker.walk()
+
 
-def get_verified_account(app_id, token):
+def get_verified_account(app_id, token, cache=None):
     """
     Verify the ``token`` belongs to an Application with ``app_id`` and return
     an :class:`kloudless.account.Account` instance.
 
     :param str app_id: Application ID
     :param str token: Account's Bearer token
+    :param cache: See :func:`kloudless.application.verify_token`
 
     :return: :class:`kloudless.account.Account`
     :raise: :class:`kloudless.exceptions.TokenVerificationFailed`
     """
-    verify_token(app_id, token)
+    verify_token(app_id, token, cache=cache)
     account = Account(token=token)
     return account
@@ -0,0 +1,375 @@
+"""
+Asyncio client built on `httpx <https://www.python-httpx.org>`_, which must be
+installed separately::
+
+    pip install kloudless[async]
+
+:class:`AsyncClient` and :class:`AsyncAccount` mirror
+:class:`kloudless.client.Client` and :class:`kloudless.account.Account`, except
+that all http methods are coroutines.
+"""
+import asyncio
+import re
+import time
+
+from . import exceptions, jsonlib
+from .auth import APIKeyAuth, BearerTokenAuth
+from .client import Client, Session, handle_response
+from .pool import get_connection_pool
+from .ratelimit import get_rate_limiter
+from .re_patterns import download_file_patterns
+from .resources.aio import (AsyncResourceList, AsyncResource, AsyncResponse,
+                            AsyncResponseJson)
+from .retry import get_retry_policy
+from .util import get_config, logger, url_join, construct_kloudless_endpoint
+from .version import VERSION
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+class SharedAsyncTransport(httpx.AsyncBaseTransport if httpx else object):
+    """
+    Async transport shared by the sessions of a
+    :class:`kloudless.pool.ConnectionPool`. It is not closed with them.
+    """
+    def __init__(self, transport):
+        self.transport = transport
+
+    async def handle_async_request(self, request):
+        return await self.transport.handle_async_request(request)
+
+    async def aclose(self):
+        pass
+
+
+def get_shared_transport(pool):
+    """
+    Return the transport shared by the sessions of ``pool`` on the running
+    event loop, or ``None`` if no event loop is running.
+
+    :param pool: :class:`kloudless.pool.ConnectionPool`
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+    transport = pool.async_transports.get(loop)
+    if transport is None:
+        transport = SharedAsyncTransport(httpx.AsyncHTTPTransport(
+            http2=pool.http2, limits=pool.get_httpx_limits()))
+        pool.async_transports[loop] = transport
+    return transport
+
+
+class AsyncSession(object):
+    """
+    Async counterpart of :class:`kloudless.client.Session` backed by
+    :class:`httpx.AsyncClient`.
+
+    **Instance attributes**
+
+    :ivar headers: Default headers sent with every request
+    :ivar retry_policy: :class:`kloudless.retry.RetryPolicy` or ``None``
+    :ivar rate_limiter: :class:`kloudless.ratelimit.RateLimiter` or ``None``
+    """
+    def __init__(self, retry_policy=None, connection_pool=None,
+                 rate_limiter=None, **client_kwargs):
+        """
+        :param retry_policy: See :func:`kloudless.client.Session.__init__`
+        :param connection_pool: :class:`kloudless.pool.ConnectionPool` whose
+            connections are shared with other sessions created on the same
+            running event loop. Default to
+            ``configuration['connection_pool']``. Set to ``False``, or pass a
+            ``transport``, to use connections of this session only
+        :param rate_limiter: See :func:`kloudless.client.Session.__init__`.
+            A limiter may be shared by sync and async sessions
+        :param client_kwargs: kwargs passed to :class:`httpx.AsyncClient`,
+            e.g. ``timeout``, ``verify``, ``limits`` or ``http2``
+        """
+        if httpx is None:
+            raise ImportError(
+                "httpx is required for the asyncio client. Install it with "
+                "`pip install kloudless[async]`.")
+
+        pool = get_connection_pool(connection_pool)
+        transport = None
+        if pool is not None and 'transport' not in client_kwargs:
+            transport = get_shared_transport(pool)
+        if transport is not None:
+            client_kwargs['transport'] = transport
+        else:
+            client_kwargs.setdefault('http2', get_config('http2'))
+
+        self.http = httpx.AsyncClient(**client_kwargs)
+        self.http.headers['User-Agent'] = 'kloudless-python/{}'.format(VERSION)
+        self.retry_policy = get_retry_policy(retry_policy)
+        self.rate_limiter = get_rate_limiter(rate_limiter)
+
+    @property
+    def headers(self):
+        return self.http.headers
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        """
+        Close all pooled connections.
+        """
+        await self.http.aclose()
+
+    def _build_request(self, method, url, params=None, data=None,
+                       headers=None, cookies=None, files=None, json=None,
+                       timeout=None, **kwargs):
+        """
+        Translate :func:`requests.Session.request` style kwargs into an
+        :class:`httpx.Request`.
+        """
+        content = None
+        if data is not None and not isinstance(data, (dict, list, tuple)):
+            content, data = data, None
+        elif isinstance(data, (list, tuple)):
+            data = dict(data)
+
+        build_kwargs = {}
+        if timeout is not None:
+            build_kwargs['timeout'] = timeout
+        if kwargs:
+            raise exceptions.InvalidParameter(
+                "Unsupported parameters for the asyncio client: {}".format(
+                    ', '.join(sorted(kwargs))))
+
+        return self.http.build_request(
+            method, url, params=params, data=data, content=content,
+            headers=headers, cookies=cookies, files=files, json=json,
+            **build_kwargs)
+
+    async def request(self, method, url, api_version=None, get_raw_data=None,
+                      raw_headers=None, impersonate_user_id=None,
+                      stream=False, allow_redirects=True,
+                      expected_statuses=(), **kwargs):
+        """
+        See :func:`kloudless.client.Session.request`.
+
+        :return: :class:`httpx.Response`. If ``stream`` is ``True``, the body
+            is not read and the response should be closed by the caller
+        """
+        if api_version is not None:
+            url = re.sub(
+                r'(https?://.+?/)v\d', r'\1v{}'.format(api_version), url
+            )
+
+        Session._update_kloudless_headers(
+            kwargs.setdefault('headers', dict()), get_raw_data, raw_headers,
+            impersonate_user_id)
+
+        request = self._build_request(method, url, **kwargs)
+        send_kwargs = {'stream': stream, 'follow_redirects': allow_redirects}
+
+        started_at = time.time()
+        response = await self._send(request, send_kwargs)
+        if self.retry_policy:
+            response = await self._retry(response, started_at, send_kwargs)
+        if stream and response.status_code >= 400:
+            await response.aread()
+        return handle_response(response, expected_statuses)
+
+    async def _send(self, request, send_kwargs):
+        """
+        Send ``request`` once ``self.rate_limiter``, if any, allows it.
+        """
+        limiter = self.rate_limiter
+        if limiter is None:
+            return await self.http.send(request, **send_kwargs)
+
+        buckets = limiter.get_buckets(str(request.url),
+                                      request.headers.get('Authorization'))
+        delay = limiter.reserve(buckets)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        response = await self.http.send(request, **send_kwargs)
+        limiter.update(buckets, response.status_code, response.headers)
+        return response
+
+    async def _retry(self, response, started_at, send_kwargs):
+        """
+        Replay ``response.request`` according to ``self.retry_policy`` and
+        return the last response.
+        """
+        policy = self.retry_policy
+        request = response.request
+        try:
+            request.content
+        except httpx.RequestNotRead:
+            return response
+
+        attempt = 1
+        while True:
+            delay = policy.get_retry_delay(attempt, request.method, response,
+                                           started_at)
+            if delay is None:
+                return response
+
+            logger.info("Request to '{}' got {}. Retry #{} in {:.2f}s".format(
+                response.url, response.status_code, attempt, delay))
+            await response.aclose()
+            await asyncio.sleep(delay)
+
+            response = await self._send(request, send_kwargs)
+            attempt += 1
+
+
+class AsyncClient(AsyncSession):
+    """
+    Async version of :class:`kloudless.client.Client`.
+
+    **Instance attributes**
+
+    :ivar str url: Base url that will be used as a prefix for all http method
+        calls
+    """
+    response_class = AsyncResponse
+    response_json_class = AsyncResponseJson
+    resource_class = AsyncResource
+    resource_list_class = AsyncResourceList
+
+    _create_response_object = Client._create_response_object
+
+    def __init__(self, api_key=None, token=None, retry_policy=None,
+                 connection_pool=None, rate_limiter=None, **client_kwargs):
+        """
+        Either ``api_key`` or ``token`` is needed for instantiation.
+
+        :param api_key: API key
+        :param token: Bearer token
+        :param retry_policy: See :func:`kloudless.client.Session.__init__`
+        :param connection_pool: See :func:`AsyncSession.__init__`
+        :param rate_limiter: See :func:`AsyncSession.__init__`
+        :param client_kwargs: See :func:`AsyncSession.__init__`
+        """
+        if token:
+            self.token = token
+            auth = BearerTokenAuth(token)
+        elif api_key:
+            self.api_key = api_key
+            auth = APIKeyAuth(api_key)
+        else:
+            raise exceptions.InvalidParameter(
+                "An API Key or Bearer Token must be provided. Please check "
+                "api_key and token parameters."
+            )
+
+        super(AsyncClient, self).__init__(retry_policy=retry_policy,
+                                          connection_pool=connection_pool,
+                                          rate_limiter=rate_limiter,
+                                          **client_kwargs)
+        self.headers['Authorization'] = auth.auth_header
+        self.url = construct_kloudless_endpoint()
+
+    def _compose_url(self, path):
+        return url_join(self.url, path)
+
+    async def request(self, method, path='', get_raw_response=False,
+                      **kwargs):
+        """
+        See :func:`kloudless.client.Client.request`.
+
+        :return:
+            - :class:`httpx.Response` if ``get_raw_response`` is ``True``
+            - :class:`kloudless.resources.aio.AsyncResponse` or its subclass
+              otherwise
+        """
+        url = self._compose_url(path)
+        jsonlib.encode_json_body(kwargs)
+        response = await super(AsyncClient, self).request(method, url,
+                                                          **kwargs)
+
+        if get_raw_response:
+            return response
+
+        return self._create_response_object(response)
+
+    async def get(self, path='', **kwargs):
+        """
+        Http GET request. See :func:`kloudless.client.Client.get`.
+        """
+        if download_file_patterns.search(path):
+            kwargs.setdefault('stream', True)
+
+        return await self.request('GET', path, **kwargs)
+
+    async def post(self, path='', data=None, json=None, **kwargs):
+        """
+        Http POST request. See :func:`kloudless.client.Client.post`.
+        """
+        return await self.request('POST', path, data=data, json=json,
+                                  **kwargs)
+
+    async def put(self, path='', data=None, **kwargs):
+        """
+        Http PUT request. See :func:`kloudless.client.Client.put`.
+        """
+        return await self.request('PUT', path, data=data, **kwargs)
+
+    async def patch(self, path='', data=None, **kwargs):
+        """
+        Http PATCH request. See :func:`kloudless.client.Client.patch`.
+        """
+        return await self.request('PATCH', path, data=data, **kwargs)
+
+    async def delete(self, path='', **kwargs):
+        """
+        Http DELETE request. See :func:`kloudless.client.Client.delete`.
+        """
+        return await self.request('DELETE', path, **kwargs)
+
+
+class AsyncAccount(AsyncClient):
+    """
+    Async version of :class:`kloudless.account.Account`.
+
+    **Instance attributes**
+
+    :ivar str url: Base url which would be used as prefix for all http method
+        calls
+    """
+    def __init__(self, token=None, api_key=None, account_id=None,
+                 retry_policy=None, connection_pool=None, rate_limiter=None,
+                 **client_kwargs):
+        """
+        See :func:`kloudless.account.Account.__init__`.
+
+        :param client_kwargs: See :func:`AsyncSession.__init__`
+        """
+        if api_key and not account_id:
+            raise exceptions.InvalidParameter(
+                "An account_id must be provided if you want to use api_key"
+                " to create an account instance"
+            )
+
+        super(AsyncAccount, self).__init__(api_key=api_key, token=token,
+                                           retry_policy=retry_policy,
+                                           connection_pool=connection_pool,
+                                           rate_limiter=rate_limiter,
+                                           **client_kwargs)
+
+        self.account_id = account_id or 'me'
+        self.url = url_join(self.url, 'accounts/{}'.format(self.account_id))
+
+    async def raw(self, raw_method, raw_uri, **kwargs):
+        """
+        See :func:`kloudless.account.Account.raw`.
+
+        :return: :class:`httpx.Response`
+        """
+        headers = kwargs.setdefault('headers', {})
+        headers['X-Kloudless-Raw-Method'] = raw_method
+        headers['X-Kloudless-Raw-URI'] = raw_uri
+        return await self.post('raw', get_raw_response=True, **kwargs)
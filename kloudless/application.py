@@ -1,25 +1,116 @@
 from __future__ import unicode_literals
 
 import base64
+import hashlib
 import os
+import time
 
 import requests
+import six
 
-from . import exceptions
+from . import exceptions, jsonlib
+from .cache import LRUCache
 from .client import Client
-from .util import construct_kloudless_endpoint
-
-try:
-    import simplejson as json
-except ImportError:
-    import json
+from .coalesce import RequestCoalescer
+from .util import construct_kloudless_endpoint, get_config
 
 
 #  Fix api version to v1 as API documentation described
 OAUTH_API_VERSION = 1
 
 
-def verify_token(app_id, token):
+class TokenVerificationCache(object):
+    """
+    Cache of :func:`verify_token` results keyed by the application ID and a
+    hash of the token, so that tokens are not kept in memory.
+
+    Successful verifications are kept for ``ttl`` seconds. Tokens rejected
+    with :class:`kloudless.exceptions.TokenVerificationFailed`, ``401`` or
+    ``403`` are kept for ``negative_ttl`` seconds. Other errors, like rate
+    limiting or network failures, are not cached.
+
+    Concurrent verifications of the same token send one request through a
+    :class:`kloudless.coalesce.RequestCoalescer`, and the other callers wait
+    for its result.
+
+    **Instance attributes**
+
+    :ivar float ttl: Seconds a verified token is cached
+    :ivar float negative_ttl: Seconds a rejected token is cached. ``0``
+        disables negative caching
+    """
+    NEGATIVE_ERRORS = (exceptions.TokenVerificationFailed,
+                       exceptions.AuthorizationException,
+                       exceptions.ForbiddenException)
+
+    def __init__(self, maxsize=10000, ttl=300, negative_ttl=30):
+        """
+        :param int maxsize: Maximum number of cached tokens
+        :param float ttl: Seconds a verified token is cached
+        :param float negative_ttl: Seconds a rejected token is cached
+        """
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._cache = LRUCache(maxsize=maxsize)
+        self._coalescer = RequestCoalescer()
+
+    @staticmethod
+    def get_key(app_id, token):
+        return app_id, hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _get_result(data, error):
+        if error is not None:
+            # drop the traceback of the original call
+            six.reraise(type(error), error, None)
+        return dict(data)
+
+    def verify(self, app_id, token, verify_func):
+        """
+        Return the cached token information of ``token``, or call
+        ``verify_func(app_id, token)`` and cache its result.
+        """
+        key = self.get_key(app_id, token)
+        entry = self._cache.get(key)
+        if entry is not None:
+            expires_at, data, error = entry
+            if expires_at > time.time():
+                return self._get_result(data, error)
+            self._cache.pop(key)
+
+        def verify():
+            try:
+                data = verify_func(app_id, token)
+            except self.NEGATIVE_ERRORS as e:
+                if self.negative_ttl:
+                    self._cache.set(
+                        key, (time.time() + self.negative_ttl, None, e))
+                raise
+            self._cache.set(key, (time.time() + self.ttl, data, None))
+            return data
+
+        return dict(self._coalescer.send(key, verify))
+
+    def invalidate(self, app_id, token):
+        """
+        Remove the cached result of ``token``, e.g. after revoking it.
+        """
+        self._cache.pop(self.get_key(app_id, token))
+
+    def clear(self):
+        """
+        Remove all entries and reset the counters.
+        """
+        self._cache.clear()
+
+    def info(self):
+        """
+        :return: (dict) ``hits``, ``misses``, ``size`` and ``maxsize``
+        """
+        return self._cache.info()
+
+
+def verify_token(app_id, token, cache=None):
     """
     Verify whether the ``token`` belongs to Application with ``app_id``.
 
@@ -28,10 +119,20 @@ def verify_token(app_id, token):
 
     :param str app_id: Application ID
     :param str token: Account's Bearer token
+    :param cache: :class:`kloudless.application.TokenVerificationCache`.
+        Default to ``configuration['token_verification_cache']``. Set to
+        ``False`` to always send the request
 
     :return: (dict) Token information
     :raise: :class:`kloudless.exceptions.TokenVerificationFailed`
     """
+    cache = get_config('token_verification_cache', cache)
+    if cache:
+        return cache.verify(app_id, token, _verify_token)
+    return _verify_token(app_id, token)
+
+
+def _verify_token(app_id, token):
 
     client = Client(token=token)
     response = client.get('oauth/token', api_version=OAUTH_API_VERSION)
@@ -78,7 +179,7 @@ def get_authorization_url(
     """
 
     if extra_data and isinstance(extra_data, dict):
-        extra_data = json.dumps(extra_data)
+        extra_data = jsonlib.dumps(extra_data).decode('utf-8')
     if not state:
         state = base64.urlsafe_b64encode(os.urandom(12)).decode('utf8')
 
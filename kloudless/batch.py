@@ -0,0 +1,190 @@
+from __future__ import unicode_literals
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import exceptions
+from .pool import check_concurrency
+from .util import logger
+
+
+class RateLimitGate(object):
+    """
+    Pause shared by the workers of a :class:`Batch`, so that a ``429``
+    received by one request holds back all of them instead of each worker
+    hitting the limit in turn.
+    """
+    def __init__(self):
+        self._resume_at = 0
+        self._lock = threading.Lock()
+
+    def pause(self, delay):
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.time() + delay)
+
+    def wait(self):
+        while True:
+            with self._lock:
+                delay = self._resume_at - time.time()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def call(self, func, max_retries=3, backoff_factor=1.0):
+        """
+        Call ``func()`` once the gate is open. If it raises
+        :class:`kloudless.exceptions.RateLimitException`, pause the gate for
+        the ``Retry-After`` delay, or ``backoff_factor`` doubled on each
+        retry, and call it again up to ``max_retries`` times.
+        """
+        attempt = 0
+        while True:
+            self.wait()
+            try:
+                return func()
+            except exceptions.RateLimitException as e:
+                if attempt >= max_retries:
+                    raise
+                delay = e.retry_after
+                if delay is None:
+                    delay = backoff_factor * 2 ** attempt
+                logger.info("Request to '{}' is rate limited. Pausing for "
+                            "{:.2f}s".format(e.response.url, delay))
+                self.pause(delay)
+                attempt += 1
+
+
+class Batch(object):
+    """
+    Requests of a client run concurrently by a bounded pool of threads.
+    Results are returned in the order the requests were added, and a failed
+    request gives its exception instead of failing the whole batch.
+
+    Used as a context manager, the requests added in the ``with`` block are
+    run when it exits and their results are available as ``self.results``.
+
+    .. code:: python
+
+        with account.batch(workers=8) as batch:
+            for file_id in file_ids:
+                batch.get('storage/files/{}'.format(file_id))
+
+        for result in batch.results:
+            if isinstance(result, Exception):
+                ...
+
+    A request answered with ``429`` pauses all workers for the
+    ``Retry-After`` delay, or an exponential backoff, and is retried up to
+    ``max_rate_limit_retries`` times.
+
+    **Instance attributes**
+
+    :ivar client: :class:`kloudless.client.Client` or
+        :class:`kloudless.account.Account`
+    :ivar int workers: Maximum number of requests sent at a time
+    :ivar list results: Results of the last :func:`run`, each is the return
+        value of :func:`kloudless.client.Client.request` or the exception it
+        raised
+    """
+    def __init__(self, client, workers=8, max_rate_limit_retries=3,
+                 backoff_factor=1.0):
+        """
+        :param client: :class:`kloudless.client.Client` or
+            :class:`kloudless.account.Account`
+        :param int workers: Maximum number of requests sent at a time
+        :param int max_rate_limit_retries: Maximum number of retries of a
+            request answered with ``429``
+        :param float backoff_factor: Base delay in seconds after a ``429``
+            without ``Retry-After``, doubled on each retry
+        """
+        self.client = client
+        self.workers = workers
+        self.max_rate_limit_retries = max_rate_limit_retries
+        self.backoff_factor = backoff_factor
+        self.requests = []
+        self.results = []
+        self._gate = RateLimitGate()
+
+    def __len__(self):
+        return len(self.requests)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is None:
+            self.run()
+
+    def add(self, method, path='', **kwargs):
+        """
+        Add a request.
+
+        :param str method: Http method
+        :param str path: Request path
+        :param kwargs: See :func:`kloudless.client.Client.request`
+        :return: (int) Index of the result in ``self.results``
+        """
+        self.requests.append((method, path, kwargs))
+        return len(self.requests) - 1
+
+    def extend(self, requests):
+        """
+        Add requests given as ``(method, path)`` or
+        ``(method, path, kwargs)`` tuples.
+        """
+        for request in requests:
+            method, path = request[:2]
+            kwargs = request[2] if len(request) > 2 else {}
+            self.add(method, path, **kwargs)
+
+    def get(self, path='', **kwargs):
+        return self.add('GET', path, **kwargs)
+
+    def post(self, path='', data=None, json=None, **kwargs):
+        return self.add('POST', path, data=data, json=json, **kwargs)
+
+    def put(self, path='', data=None, **kwargs):
+        return self.add('PUT', path, data=data, **kwargs)
+
+    def patch(self, path='', data=None, **kwargs):
+        return self.add('PATCH', path, data=data, **kwargs)
+
+    def delete(self, path='', **kwargs):
+        return self.add('DELETE', path, **kwargs)
+
+    def _send(self, method, path, kwargs):
+        try:
+            return self._gate.call(
+                lambda: self.client.request(method, path, **kwargs),
+                self.max_rate_limit_retries, self.backoff_factor)
+        except Exception as e:
+            return e
+
+    def run(self):
+        """
+        Send all requests added so far.
+
+        :return: (list) ``self.results``
+        """
+        check_concurrency(self.client, self.workers)
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        futures = []
+        try:
+            for request in self.requests:
+                futures.append(executor.submit(self._send, *request))
+            self.results = [future.result() for future in futures]
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+        return self.results
+
+    @property
+    def errors(self):
+        """
+        ``(index, exception)`` of the failed requests of the last
+        :func:`run`.
+        """
+        return [(i, result) for i, result in enumerate(self.results)
+                if isinstance(result, Exception)]
@@ -0,0 +1,117 @@
+from __future__ import unicode_literals
+
+import functools
+import threading
+from collections import OrderedDict
+
+_missing = object()
+
+
+class LRUCache(object):
+    """
+    Thread-safe mapping that keeps at most ``maxsize`` entries, evicting the
+    least recently used one first.
+
+    **Instance attributes**
+
+    :ivar maxsize: Maximum number of entries, or a callable returning it
+    :ivar int hits: Number of lookups that found an entry
+    :ivar int misses: Number of lookups that found no entry
+    """
+    def __init__(self, maxsize=128):
+        """
+        :param maxsize: Maximum number of entries, or a callable returning it
+            so that the limit can follow a configuration value
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_maxsize(self):
+        return self.maxsize() if callable(self.maxsize) else self.maxsize
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        """
+        Return the value of ``key`` and mark it as recently used, or
+        ``default`` if there is no entry.
+        """
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            maxsize = self.get_maxsize()
+            while len(self._data) > maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def keys(self):
+        """
+        Return a list of the keys, from the least to the most recently used.
+        """
+        with self._lock:
+            return list(self._data)
+
+    def clear(self):
+        """
+        Remove all entries and reset the counters.
+        """
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        """
+        :return: (dict) ``hits``, ``misses``, ``size`` and ``maxsize``
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._data),
+            'maxsize': self.get_maxsize(),
+        }
+
+
+def memoize(cache):
+    """
+    Decorator caching the results of a function of hashable positional
+    arguments in ``cache``, which is available as the ``cache`` attribute of
+    the decorated function.
+
+    :param cache: :class:`LRUCache`
+    """
+    def decorator(func):
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            value = cache.get(args, _missing)
+            if value is _missing:
+                value = func(*args)
+                cache.set(args, value)
+            return value
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
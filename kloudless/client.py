@@ -1,26 +1,40 @@
 from __future__ import unicode_literals
 
+import functools
 import re
+import time
 
 import requests
+import six
+from requests.structures import CaseInsensitiveDict
+from requests.utils import rewind_body
 
-from . import exceptions
+from . import exceptions, jsonlib, transfer
 from .auth import APIKeyAuth, BearerTokenAuth
+from .batch import Batch
+from .coalesce import get_request_coalescer
+from .http_cache import get_response_cache
+from .metadata_cache import get_metadata_cache
+from .pool import ConnectionPool, get_connection_pool
+from .ratelimit import get_rate_limiter
 from .re_patterns import download_file_patterns
-from .resources import ResourceList, Resource, Response, ResponseJson
+from .resources import (ResourceList, Resource, Response, ResponseJson,
+                        StreamingResourceList)
+from .retry import get_retry_policy
 from .util import logger, url_join, construct_kloudless_endpoint
 from .version import VERSION
 
-try:
-    import simplejson as json
-except ImportError:
-    import json
 
-
-def handle_response(response):
-
-    if not response.ok:
-        logger.error("Request to '{}' failed: {} - {}".format(
+def handle_response(response, expected_statuses=()):
+    """
+    Return ``response`` or raise the exception matching its error status.
+    Errors with a status in ``expected_statuses`` are part of the caller's
+    normal flow, so they are only logged at debug level.
+    """
+    if response.status_code >= 400:
+        log = (logger.debug if response.status_code in expected_statuses
+               else logger.error)
+        log("Request to '{}' failed: {} - {}".format(
             response.url, response.status_code, response.text))
         if response.status_code == 401:
             raise exceptions.AuthorizationException(response=response)
@@ -29,8 +43,6 @@ def handle_response(response):
         elif response.status_code == 404:
             raise exceptions.NotFoundException(response=response)
         elif response.status_code == 429:
-            # TODO: retry mechanism for 429 response
-            # Might be able to make use of response.request object
             raise exceptions.RateLimitException(response=response)
         elif response.status_code >= 500:
             raise exceptions.ServerException(response=response)
@@ -42,15 +54,78 @@ def handle_response(response):
     return response
 
 
+def is_replayable(request):
+    """
+    Whether the prepared ``request`` can be sent again. Streamed bodies can
+    only be replayed if their position could be recorded for rewinding.
+    """
+    body = request.body
+    if body is None or isinstance(body, (bytes, six.text_type)):
+        return True
+    seekable = getattr(body, 'seekable', None)
+    if seekable is not None and not seekable():
+        return False
+    return (hasattr(body, 'read') and isinstance(
+        getattr(request, '_body_position', None), six.integer_types))
+
+
 class Session(requests.Session):
     """
     The Session class helps build Kloudless specific headers.
+
+    **Instance attributes**
+
+    :ivar retry_policy: :class:`kloudless.retry.RetryPolicy` used to retry
+        failed requests, or ``None`` to disable retrying
+
+    :ivar response_cache: :class:`kloudless.http_cache.ResponseCache` used to
+        cache ``GET`` responses, or ``None`` to disable caching
+
+    :ivar connection_pool: :class:`kloudless.pool.ConnectionPool` shared with
+        other sessions, or ``None`` if the session has its own pool
+
+    :ivar rate_limiter: :class:`kloudless.ratelimit.RateLimiter` holding
+        requests back to stay under rate limits, or ``None`` to disable it
     """
-    def __init__(self):
+    def __init__(self, retry_policy=None, response_cache=None,
+                 connection_pool=None, rate_limiter=None):
+        """
+        :param retry_policy: :class:`kloudless.retry.RetryPolicy`. Default to
+            ``configuration['retry_policy']``. Set to ``False`` to disable
+            retrying
+
+        :param response_cache: :class:`kloudless.http_cache.ResponseCache`.
+            Default to ``configuration['response_cache']``. Set to ``False``
+            to disable caching
+
+        :param connection_pool: :class:`kloudless.pool.ConnectionPool`
+            shared with other sessions. Default to
+            ``configuration['connection_pool']``. Set to ``False`` to use a
+            pool of this session only
+
+        :param rate_limiter: :class:`kloudless.ratelimit.RateLimiter`.
+            Default to ``configuration['rate_limiter']``. Set to ``False`` to
+            disable rate limiting
+        """
         super(Session, self).__init__()
         self.headers.update({
             'User-Agent': 'kloudless-python/{}'.format(VERSION),
         })
+        self.retry_policy = get_retry_policy(retry_policy)
+        self.response_cache = get_response_cache(response_cache)
+        self.connection_pool = get_connection_pool(connection_pool)
+        (self.connection_pool or ConnectionPool()).mount(self)
+        self.rate_limiter = get_rate_limiter(rate_limiter)
+
+    def close(self):
+        """
+        Override :func:`requests.Session.close` to keep the connections of a
+        shared ``self.connection_pool`` open.
+        """
+        for adapter in self.adapters.values():
+            if (self.connection_pool is None
+                    or adapter is not self.connection_pool.adapter):
+                adapter.close()
 
     @staticmethod
     def _update_kloudless_headers(headers, get_raw_data, raw_headers,
@@ -59,14 +134,15 @@ class Session(requests.Session):
             headers['X-Kloudless-Raw-Data'] = str(get_raw_data).lower()
 
         if raw_headers and isinstance(raw_headers, dict):
-            headers['X-Kloudless-Raw-Headers'] = json.dumps(
-                raw_headers)
+            headers['X-Kloudless-Raw-Headers'] = jsonlib.dumps(
+                raw_headers).decode('utf-8')
 
         if impersonate_user_id:
             headers['X-Kloudless-As-User'] = str(impersonate_user_id)
 
     def request(self, method, url, api_version=None, get_raw_data=None,
-                raw_headers=None, impersonate_user_id=None, **kwargs):
+                raw_headers=None, impersonate_user_id=None,
+                expected_statuses=(), **kwargs):
         """
         Override :func:`requests.Session.request` with additional parameters.
 
@@ -90,6 +166,9 @@ class Session(requests.Session):
             individual user accounts. This is equal to the
             ``X-Kloudless-As-User`` request header.
 
+        :param tuple expected_statuses: Error status codes the caller handles
+            itself. They still raise, but are logged at debug level
+
         :param kwargs: kwargs passed to :func:`requests.Session.request`
 
         :return: :class:`requests.Response`
@@ -104,10 +183,65 @@ class Session(requests.Session):
         self._update_kloudless_headers(kwargs.setdefault('headers', dict()),
                                        get_raw_data, raw_headers,
                                        impersonate_user_id)
-        response = handle_response(
-            super(Session, self).request(method, url, **kwargs)
-        )
-        return response
+        started_at = time.time()
+        response = super(Session, self).request(method, url, **kwargs)
+        if self.retry_policy:
+            response = self._retry(response, started_at, **kwargs)
+        return handle_response(response, expected_statuses)
+
+    def send(self, request, **kwargs):
+        """
+        Override :func:`requests.Session.send` to go through
+        ``self.response_cache`` and ``self.rate_limiter``, if any. Responses
+        served from the cache are not rate limited.
+        """
+        send = super(Session, self).send
+        if self.rate_limiter is not None:
+            send = functools.partial(self.rate_limiter.send, send)
+        if self.response_cache is None:
+            return send(request, **kwargs)
+        return self.response_cache.send(send, request, **kwargs)
+
+    def _get_send_kwargs(self, url, stream=None, timeout=None, verify=None,
+                         cert=None, proxies=None, allow_redirects=True,
+                         **kwargs):
+        """
+        Build the kwargs of :func:`requests.Session.send` the same way
+        :func:`requests.Session.request` does.
+        """
+        send_kwargs = {'timeout': timeout, 'allow_redirects': allow_redirects}
+        send_kwargs.update(self.merge_environment_settings(
+            url, proxies or {}, stream, verify, cert))
+        return send_kwargs
+
+    def _retry(self, response, started_at, **kwargs):
+        """
+        Replay ``response.request`` according to ``self.retry_policy`` and
+        return the last response.
+        """
+        policy = self.retry_policy
+        request = response.request
+        if not is_replayable(request):
+            return response
+
+        send_kwargs = self._get_send_kwargs(request.url, **kwargs)
+        attempt = 1
+        while True:
+            delay = policy.get_retry_delay(attempt, request.method, response,
+                                           started_at)
+            if delay is None:
+                return response
+
+            logger.info("Request to '{}' got {}. Retry #{} in {:.2f}s".format(
+                response.url, response.status_code, attempt, delay))
+            response.close()
+            time.sleep(delay)
+
+            request = request.copy()
+            if getattr(request, '_body_position', None) is not None:
+                rewind_body(request)
+            response = self.send(request, **send_kwargs)
+            attempt += 1
 
 
 class Client(Session):
@@ -118,15 +252,47 @@ class Client(Session):
 
     :ivar str url: Base url that will be used as a prefix for all http method
         calls
+
+    :ivar metadata_cache: :class:`kloudless.metadata_cache.MetadataCache`
+        consulted by ``GET`` requests, or ``None`` to disable it
+
+    :ivar request_coalescer: :class:`kloudless.coalesce.RequestCoalescer`
+        sharing the responses of identical ``GET`` requests in flight, or
+        ``None`` to disable it
     """
-    def __init__(self, api_key=None, token=None):
+    response_class = Response
+    response_json_class = ResponseJson
+    resource_class = Resource
+    resource_list_class = ResourceList
+    streaming_resource_list_class = StreamingResourceList
+
+    def __init__(self, api_key=None, token=None, retry_policy=None,
+                 response_cache=None, metadata_cache=None,
+                 connection_pool=None, rate_limiter=None,
+                 request_coalescer=None):
         """
         Either ``api_key`` or ``token`` is needed for instantiation.
 
         :param api_key: API key
         :param token: Bearer token
+        :param retry_policy: See :func:`kloudless.client.Session.__init__`
+        :param response_cache: See :func:`kloudless.client.Session.__init__`
+        :param metadata_cache: :class:`kloudless.metadata_cache.MetadataCache`.
+            Default to ``configuration['metadata_cache']``. Set to ``False``
+            to disable it
+        :param connection_pool: See :func:`kloudless.client.Session.__init__`
+        :param rate_limiter: See :func:`kloudless.client.Session.__init__`
+        :param request_coalescer:
+            :class:`kloudless.coalesce.RequestCoalescer`. Default to
+            ``configuration['request_coalescer']``. Set to ``False`` to
+            disable it
         """
-        super(Client, self).__init__()
+        super(Client, self).__init__(retry_policy=retry_policy,
+                                     response_cache=response_cache,
+                                     connection_pool=connection_pool,
+                                     rate_limiter=rate_limiter)
+        self.metadata_cache = get_metadata_cache(metadata_cache)
+        self.request_coalescer = get_request_coalescer(request_coalescer)
 
         if token:
             self.token = token
@@ -147,14 +313,14 @@ class Client(Session):
 
     def _create_response_object(self, response):
 
-        url = response.url
+        url = six.text_type(response.url)
 
         if ('application/json' not in response.headers.get('content-type', '')
                 or not response.content):
-            return Response(self, url, response)
+            return self.response_class(self, url, response)
 
         try:
-            response_data = response.json()
+            response_data = jsonlib.loads(response.content)
         except ValueError:
             logger.error("Request to {} failed to decode json: {} - {}".format(
                 response.url, response.status_code, response.text))
@@ -162,17 +328,83 @@ class Client(Session):
 
         type_ = response_data.get('type')
         if type_ == 'object_list':
-            return ResourceList(data=response_data, url=url,
-                                client=self, response=response)
+            return self.resource_list_class(data=response_data, url=url,
+                                            client=self, response=response)
         elif 'id' in response_data or 'href' in response_data:
-            return Resource(
+            return self.resource_class(
                 data=response_data, url=url, client=self, response=response
             )
         else:
-            return ResponseJson(data=response_data, url=url,
-                                client=self, response=response)
+            return self.response_json_class(data=response_data, url=url,
+                                            client=self, response=response)
+
+    def _get_identity(self, headers=None):
+        """
+        Return the credential of a request with ``headers``: its
+        ``Authorization`` header, otherwise the one of ``self.headers`` or
+        ``self.auth``.
+        """
+        headers = CaseInsensitiveDict(headers or {})
+        return (headers.get('Authorization')
+                or self.headers.get('Authorization')
+                or getattr(self.auth, 'auth_header', None))
 
-    def request(self, method, path='', get_raw_response=False, **kwargs):
+    def _get_metadata_cache_key(self, method, url, kwargs):
+        """
+        Return the key of the request in ``self.metadata_cache``, or ``None``
+        if the request is not cacheable.
+        """
+        if (method.upper() != 'GET' or kwargs.get('stream')
+                or kwargs.get('api_version') is not None
+                or kwargs.get('get_raw_data') is not None
+                or kwargs.get('raw_headers')):
+            return None
+
+        headers = CaseInsensitiveDict(kwargs.get('headers') or {})
+        as_user = kwargs.get('impersonate_user_id')
+        if not as_user:
+            as_user = (headers.get('X-Kloudless-As-User')
+                       or self.headers.get('X-Kloudless-As-User'))
+        return self.metadata_cache.get_key(
+            url, kwargs.get('params'), as_user, self._get_identity(headers))
+
+    def _update_metadata_cache(self, method, url, key, response, headers):
+        cache = self.metadata_cache
+        if key is not None:
+            cache.set(key, response)
+        elif method.upper() in ('POST', 'PUT', 'PATCH', 'DELETE'):
+            cache.invalidate_url(url, self._get_identity(headers))
+
+    def _get_coalesce_key(self, method, url, kwargs):
+        """
+        Return the key of the request in ``self.request_coalescer``, or
+        ``None`` if the request is not coalesced.
+        """
+        if (method.upper() != 'GET' or kwargs.get('stream')
+                or kwargs.get('api_version') is not None
+                or any(kwargs.get(name) is not None
+                       for name in ('data', 'json', 'files'))):
+            return None
+
+        headers = CaseInsensitiveDict(self.headers)
+        headers.update(kwargs.get('headers') or {})
+        self._update_kloudless_headers(
+            headers, kwargs.get('get_raw_data'), kwargs.get('raw_headers'),
+            kwargs.get('impersonate_user_id'))
+        return self.request_coalescer.get_key(
+            method, url, kwargs.get('params'), headers,
+            self._get_identity(headers))
+
+    def _create_streaming_response_object(self, response):
+
+        if 'application/json' not in response.headers.get('content-type', ''):
+            return self._create_response_object(response)
+
+        return self.streaming_resource_list_class(
+            url=six.text_type(response.url), client=self, response=response)
+
+    def request(self, method, path='', get_raw_response=False,
+                progress_callback=None, stream_objects=False, **kwargs):
         """
         | Override :func:`kloudless.client.Session.request`.
         | Note that the actual request url will have ``self.url`` as a prefix.
@@ -182,19 +414,67 @@ class Client(Session):
         :param str get_raw_response: Set to ``True`` if the raw
             :class:`requests.Response` instance is in the returned value
 
+        :param progress_callback: Callable that takes the number of bytes of
+            ``data`` sent so far and its total size, or ``None`` if unknown.
+            See :class:`kloudless.transfer.StreamingBody`
+
+        :param bool stream_objects: Set to ``True`` to parse a JSON response
+            incrementally into a
+            :class:`kloudless.resources.base.StreamingResourceList` while it
+            is being received. Meant for large ``object_list`` responses
+
         :param kwargs: kwargs passed to :func:`kloudless.client.Session.request`
 
         :return:
             - :class:`requests.Response` if ``get_raw_response`` is ``True``
+            - :class:`kloudless.resources.base.StreamingResourceList` if
+              ``stream_objects`` is ``True`` and the response is JSON
             - :class:`kloudless.resources.base.Response` or its subclass otherwise
         """
         url = self._compose_url(path)
-        response = super(Client, self).request(method, url, **kwargs)
+        if stream_objects:
+            kwargs['stream'] = True
+
+        cache_key = None
+        if self.metadata_cache is not None:
+            cache_key = self._get_metadata_cache_key(method, url, kwargs)
+        if cache_key is not None:
+            response = self.metadata_cache.get(cache_key)
+            if response is not None:
+                if get_raw_response:
+                    return response
+                return self._create_response_object(response)
+
+        coalesce_key = None
+        if self.request_coalescer is not None:
+            coalesce_key = self._get_coalesce_key(method, url, kwargs)
+
+        jsonlib.encode_json_body(kwargs)
+        if 'data' in kwargs:
+            kwargs['data'] = transfer.get_streaming_body(
+                kwargs['data'], progress_callback)
+        send = functools.partial(super(Client, self).request, method, url,
+                                 **kwargs)
+        if coalesce_key is not None:
+            response = self.request_coalescer.send(coalesce_key, send)
+        else:
+            response = send()
+
+        if self.metadata_cache is not None:
+            self._update_metadata_cache(method, url, cache_key, response,
+                                        kwargs.get('headers'))
 
         if get_raw_response:
             return response
 
-        return self._create_response_object(response)
+        if stream_objects:
+            return self._create_streaming_response_object(response)
+        response_object = self._create_response_object(response)
+        if (self.metadata_cache is not None
+                and isinstance(response_object, ResourceList)
+                and response_object.is_retrieving_events):
+            self.metadata_cache.invalidate_events(response_object.objects.data)
+        return response_object
 
     def get(self, path='', **kwargs):
         """
@@ -220,8 +500,11 @@ class Client(Session):
           prefix.
 
         :param str path: Request path
-        :param data: passed to :func:`request.Request.post`
-        :param json: passed to :func:`request.Request.post`
+        :param data: passed to :func:`request.Request.post`. File objects,
+            iterators of bytes, ``mmap`` and ``memoryview`` objects are
+            streamed without being loaded into memory
+        :param json: JSON body encoded with the backend of
+            :mod:`kloudless.jsonlib`
         :param kwargs: See :func:`kloudless.client.Client.request` for more
             options.
 
@@ -236,7 +519,8 @@ class Client(Session):
           prefix.
 
         :param str path: Request path
-        :param data: passed to :func:`request.Request.put`
+        :param data: passed to :func:`request.Request.put`. See
+            :func:`kloudless.client.Client.post`
         :param kwargs: See :func:`kloudless.client.Client.request` for more
             options.
 
@@ -251,7 +535,8 @@ class Client(Session):
           prefix.
 
         :param str path: Request path
-        :param data: passed to :func:`request.Request.patch`
+        :param data: passed to :func:`request.Request.patch`. See
+            :func:`kloudless.client.Client.post`
         :param kwargs: See :func:`kloudless.client.Client.request` for more
             options.
 
@@ -272,3 +557,57 @@ class Client(Session):
         :return: :class:`kloudless.resources.base.Response` or its subclass
         """
         return super(Client, self).delete(path, **kwargs)
+
+    def download_to(self, path, dest, parts=4, part_size=None, **kwargs):
+        """
+        Download the content of ``path`` to ``dest`` with concurrent http
+        Range requests. See :func:`kloudless.transfer.download_to`.
+
+        :param str path: Request path, e.g. ``storage/files/{id}/contents``
+        :param dest: File path or seekable file object opened in binary mode
+        :param int parts: Maximum number of concurrent requests
+        :param int part_size: Bytes per Range request
+        :param kwargs: See :func:`kloudless.transfer.download_to` for more
+            options.
+
+        :return: (int) Size in bytes of the downloaded content
+        """
+        return transfer.download_to(self, path, dest, parts=parts,
+                                    part_size=part_size, **kwargs)
+
+    def batch(self, workers=8, **kwargs):
+        """
+        Create a :class:`kloudless.batch.Batch` to send many requests
+        concurrently, e.g.
+
+        .. code:: python
+
+            with account.batch(workers=8) as batch:
+                for file_id in file_ids:
+                    batch.get('storage/files/{}'.format(file_id))
+            print(batch.results)
+
+        :param int workers: Maximum number of requests sent at a time
+        :param kwargs: See :class:`kloudless.batch.Batch` for more options.
+
+        :return: :class:`kloudless.batch.Batch`
+        """
+        return Batch(self, workers=workers, **kwargs)
+
+    def bulk(self, requests, workers=8, **kwargs):
+        """
+        Send ``requests`` concurrently. See :func:`batch`.
+
+        :param requests: ``(method, path)`` or ``(method, path, kwargs)``
+            tuples, where ``kwargs`` are passed to
+            :func:`kloudless.client.Client.request`
+        :param int workers: Maximum number of requests sent at a time
+        :param kwargs: See :class:`kloudless.batch.Batch` for more options.
+
+        :return: (list) The result of each request in order, which is the
+            :class:`kloudless.resources.base.Response` or the exception
+            raised, e.g. :class:`kloudless.exceptions.NotFoundException`
+        """
+        batch = self.batch(workers=workers, **kwargs)
+        batch.extend(requests)
+        return batch.run()
@@ -0,0 +1,138 @@
+"""
+Coalescing of identical ``GET`` requests sent concurrently by the threads of
+a process. While a request is in flight, callers of
+:func:`kloudless.client.Client.get` with the same url, query parameters,
+credential and headers wait for its response instead of sending the request
+again. Each caller still gets its own
+:class:`kloudless.resources.base.Resource` or
+:class:`kloudless.resources.base.ResourceList`.
+"""
+from __future__ import unicode_literals
+
+import hashlib
+import threading
+
+import six
+
+from . import exceptions
+from .util import get_config, get_query_items, split_query
+
+
+class _PendingCall(object):
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class RequestCoalescer(object):
+    """
+    Single-flight layer of :class:`kloudless.client.Client`. Only ``GET``
+    requests that are not streamed are coalesced. Responses are not kept
+    once the request completes, see :mod:`kloudless.metadata_cache` for
+    caching.
+
+    Callers sharing a request get the same :class:`requests.Response` and the
+    same exception if it fails. Options that do not change the response, like
+    ``timeout``, are those of the caller that sent the request.
+
+    :func:`send` is not specific to requests: any call identified by a key
+    may be shared, as done by
+    :class:`kloudless.application.TokenVerificationCache`.
+
+    **Instance attributes**
+
+    :ivar int sent: Number of calls made
+    :ivar int coalesced: Number of callers that waited for a call made by
+        another caller
+    """
+    def __init__(self):
+        self.sent = 0
+        self.coalesced = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_key(method, url, params=None, headers=None, identity=None):
+        """
+        Return the key of a request.
+
+        :param str method: Http method
+        :param str url: Request url
+        :param params: Query parameters besides the ones in ``url``
+        :param headers: Request headers. All of them but ``Authorization``
+            are part of the key, since any of them, e.g. ``Range`` or
+            ``If-None-Match``, may change the response
+        :param str identity: Credential of the request
+        """
+        url, query = split_query(url)
+        headers = sorted(
+            ('{}'.format(name).lower(), '{}'.format(value))
+            for name, value in (headers or {}).items()
+            if value is not None and name.lower() != 'authorization')
+        return (
+            method.upper(), url, get_query_items(query, params),
+            identity and hashlib.sha256(identity.encode('utf-8')).hexdigest(),
+            tuple(headers),
+        )
+
+    def send(self, key, send_func):
+        """
+        Return the result of the call of ``key`` in progress, or call
+        ``send_func()``.
+
+        :return: The result of ``send_func``, e.g. a
+            :class:`requests.Response`
+        :raise: The exception raised by ``send_func``, or
+            :class:`kloudless.exceptions.KloudlessException` if the call was
+            interrupted, e.g. by ``KeyboardInterrupt``
+        """
+        with self._lock:
+            pending = self._pending.get(key)
+            is_leader = pending is None
+            if is_leader:
+                pending = self._pending[key] = _PendingCall()
+                self.sent += 1
+            else:
+                self.coalesced += 1
+
+        if not is_leader:
+            pending.done.wait()
+            error = pending.error
+            if error is not None and not isinstance(error, Exception):
+                raise exceptions.KloudlessException(
+                    "The call shared with another caller was interrupted by "
+                    "{}.".format(type(error).__name__))
+            if error is not None:
+                # drop the traceback of the original call
+                six.reraise(type(error), error, None)
+            return pending.result
+
+        try:
+            pending.result = send_func()
+            return pending.result
+        except BaseException as e:
+            pending.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._pending[key]
+            pending.done.set()
+
+    def info(self):
+        """
+        :return: (dict) ``sent``, ``coalesced`` and ``in_flight``
+        """
+        with self._lock:
+            return {'sent': self.sent, 'coalesced': self.coalesced,
+                    'in_flight': len(self._pending)}
+
+
+def get_request_coalescer(overwrite=None):
+    """
+    Return ``overwrite`` if given, otherwise the coalescer from
+    ``configuration['request_coalescer']``. ``False`` disables coalescing.
+    """
+    coalescer = get_config('request_coalescer', overwrite)
+    return coalescer or None
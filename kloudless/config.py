@@ -2,5 +2,33 @@ from __future__ import unicode_literals
 
 configuration = {
     'api_version': '1',
-    'base_url': 'https://api.kloudless.com'
+    'base_url': 'https://api.kloudless.com',
+    # kloudless.retry.RetryPolicy instance applied to all sessions
+    'retry_policy': None,
+    # kloudless.http_cache.ResponseCache instance applied to all sessions
+    'response_cache': None,
+    # kloudless.metadata_cache.MetadataCache instance shared by all clients
+    'metadata_cache': None,
+    # kloudless.coalesce.RequestCoalescer instance shared by all clients
+    'request_coalescer': None,
+    # kloudless.application.TokenVerificationCache instance used by
+    # verify_token and get_verified_account
+    'token_verification_cache': None,
+    # maximum entries of each url parsing cache in kloudless.util
+    'url_cache_size': 4096,
+    # 'orjson', 'ujson', 'simplejson', 'json', 'auto' or None for simplejson
+    # if installed, otherwise json. See kloudless.jsonlib
+    'json_backend': None,
+    # kloudless.pool.ConnectionPool shared by all sessions. 'auto' is a
+    # process-wide pool built from the settings below, None gives each
+    # session its own pool built from them
+    'connection_pool': None,
+    'pool_connections': 10,
+    'pool_maxsize': 10,
+    'pool_block': False,
+    'keep_alive': True,
+    # kloudless.ratelimit.RateLimiter instance applied to all sessions
+    'rate_limiter': None,
+    # send requests over HTTP/2, requires `pip install kloudless[http2]`
+    'http2': False,
 }
@@ -0,0 +1,453 @@
+from __future__ import unicode_literals
+
+import heapq
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import exceptions
+from .resources.base import empty
+from .util import logger, write_json_atomic
+
+
+class CheckpointStore(object):
+    """
+    Base class of the stores used by :class:`EventStream` to persist event
+    cursors between polls and runs.
+    """
+    def get(self, key):
+        """
+        Return the cursor saved for ``key``, or ``None``.
+        """
+        raise NotImplementedError
+
+    def set(self, key, cursor):
+        """
+        Save ``cursor`` for ``key``.
+        """
+        raise NotImplementedError
+
+
+class MemoryCheckpointStore(CheckpointStore):
+    """
+    Keeps cursors in memory. Cursors are lost when the process exits.
+    """
+    def __init__(self):
+        self._cursors = {}
+
+    def get(self, key):
+        return self._cursors.get(key)
+
+    def set(self, key, cursor):
+        self._cursors[key] = cursor
+
+
+class FileCheckpointStore(CheckpointStore):
+    """
+    Keeps cursors of all keys in one JSON file. The file is replaced
+    atomically on every update.
+    """
+    def __init__(self, path):
+        """
+        :param str path: Path of the JSON file
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._cursors = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self._cursors = json.load(f)
+
+    def get(self, key):
+        with self._lock:
+            return self._cursors.get(key)
+
+    def set(self, key, cursor):
+        with self._lock:
+            self._cursors[key] = cursor
+            write_json_atomic(self.path, self._cursors)
+
+
+class SQLiteCheckpointStore(CheckpointStore):
+    """
+    Keeps cursors in a SQLite database, which may be shared by several
+    processes.
+    """
+    def __init__(self, path, table='kloudless_event_cursors'):
+        """
+        :param str path: Path of the SQLite database
+        :param str table: Name of the table storing cursors
+        """
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS {} '
+                '(key TEXT PRIMARY KEY, cursor TEXT)'.format(table))
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT cursor FROM {} WHERE key = ?'.format(self.table),
+                (key,)).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, cursor):
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO {} (key, cursor) '
+                'VALUES (?, ?)'.format(self.table), (key, str(cursor)))
+
+    def close(self):
+        self._conn.close()
+
+
+class EventBatch(object):
+    """
+    Events retrieved by one :func:`EventStream.fetch` call.
+
+    **Instance attributes**
+
+    :ivar list events: :class:`kloudless.resources.base.Resource` instances
+    :ivar cursor: Cursor to retrieve the events after ``events``
+    :ivar bool is_full: Whether the batch stopped at ``max_batch_size``, so
+        more events are likely available
+    """
+    def __init__(self, events, cursor, is_full=False):
+        self.events = events
+        self.cursor = cursor
+        self.is_full = is_full
+
+    def __iter__(self):
+        return iter(self.events)
+
+    def __len__(self):
+        return len(self.events)
+
+
+class EventStream(object):
+    """
+    Long-running consumer of the `Events API <https://developers.kloudless.com
+    /docs/latest/events>`_ of one account.
+
+    The events endpoint is polled quickly while events arrive and the interval
+    backs off up to ``max_interval`` while the account is idle. The cursor is
+    saved to ``checkpoint_store`` only after a batch is handled, so events are
+    delivered at least once across restarts.
+
+    **Instance attributes**
+
+    :ivar account: :class:`kloudless.account.Account`
+    :ivar checkpoint_store: :class:`CheckpointStore`
+    :ivar float interval: Seconds to wait before the next poll
+    """
+    def __init__(self, account, checkpoint_store=None, key=None,
+                 page_size=None, max_batch_size=1000, min_interval=1.0,
+                 max_interval=60.0, backoff=2.0):
+        """
+        :param account: :class:`kloudless.account.Account`
+        :param checkpoint_store: :class:`CheckpointStore`. Default to
+            :class:`MemoryCheckpointStore`
+        :param str key: Key of the cursor in ``checkpoint_store``. Default to
+            the account ID, which is retrieved from the API if the account was
+            created from a bearer token
+        :param int page_size: Number of events per page
+        :param int max_batch_size: Maximum number of events per batch
+        :param float min_interval: Poll interval while events arrive
+        :param float max_interval: Poll interval upper bound while idle
+        :param float backoff: Multiplier of the interval after an idle poll
+        """
+        self.account = account
+        self.checkpoint_store = checkpoint_store or MemoryCheckpointStore()
+        self._key = key
+        self.page_size = page_size
+        self.max_batch_size = max_batch_size
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.interval = min_interval
+        self._stopped = threading.Event()
+
+    @property
+    def key(self):
+        if self._key is None:
+            account_id = self.account.account_id
+            if account_id == 'me':
+                account_id = self.account.get().data['id']
+            self._key = str(account_id)
+        return self._key
+
+    def _get_cursor(self):
+        cursor = self.checkpoint_store.get(self.key)
+        if cursor is None:
+            cursor = self.account.get('events/latest').data['cursor']
+            self.checkpoint_store.set(self.key, cursor)
+        return cursor
+
+    def fetch(self):
+        """
+        Retrieve the events after the saved cursor without saving the new
+        cursor.
+
+        :return: :class:`EventBatch`
+        """
+        cursor = self._get_cursor()
+        params = {'cursor': cursor}
+        if self.page_size:
+            params['page_size'] = self.page_size
+
+        resource_list = self.account.get('events', params=params)
+        events = []
+        while True:
+            events.extend(resource_list.objects)
+            if resource_list.cursor not in (empty, None):
+                cursor = resource_list.cursor
+            if len(events) >= self.max_batch_size:
+                return EventBatch(events, cursor, is_full=True)
+            try:
+                resource_list = resource_list.get_next_page()
+            except exceptions.NoNextPage:
+                return EventBatch(events, cursor)
+
+    def commit(self, batch):
+        """
+        Save the cursor of the handled ``batch``.
+        """
+        self.checkpoint_store.set(self.key, batch.cursor)
+
+    def update_interval(self, batch):
+        """
+        Adapt ``self.interval`` to the result of the latest poll and return it.
+        """
+        if batch.is_full:
+            self.interval = 0
+        elif batch.events:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.max_interval,
+                                max(self.interval, self.min_interval)
+                                * self.backoff)
+        return self.interval
+
+    def poll(self):
+        """
+        Fetch one batch and update ``self.interval``. Rate limiting and server
+        errors back off instead of being raised.
+
+        :return: :class:`EventBatch` or ``None`` if the request failed
+        """
+        try:
+            batch = self.fetch()
+        except exceptions.RateLimitException as e:
+            self.interval = max(e.retry_after or 0,
+                                min(self.max_interval,
+                                    max(self.interval, self.min_interval)
+                                    * self.backoff))
+        except exceptions.ServerException as e:
+            logger.warning("Polling events of account {} failed: {}".format(
+                self.key, e))
+            self.interval = min(self.max_interval,
+                                max(self.interval, self.min_interval)
+                                * self.backoff)
+        else:
+            self.update_interval(batch)
+            return batch
+
+    def __iter__(self):
+        """
+        Generator yielding non-empty :class:`EventBatch` instances until
+        :func:`stop` is called. The cursor of a batch is saved once the
+        caller asks for the next one.
+        """
+        self._stopped.clear()
+        while not self._stopped.is_set():
+            batch = self.poll()
+            if batch is not None:
+                if batch.events:
+                    yield batch
+                self.commit(batch)
+            if self.interval:
+                self._stopped.wait(self.interval)
+
+    def run(self, callback):
+        """
+        Poll events until :func:`stop` is called, passing each batch to
+        ``callback``. The cursor is saved after ``callback`` returns.
+
+        :param callback: Callable that takes an :class:`EventBatch`
+        """
+        for batch in self:
+            callback(batch)
+
+    def stop(self):
+        """
+        Stop polling. Can be called from another thread or from the callback.
+        """
+        self._stopped.set()
+
+
+class _ScheduledStream(object):
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.event_rate = 0.0  # moving average of events per second
+        self.last_polled_at = None
+
+
+class EventScheduler(object):
+    """
+    Polls the events of many accounts with a bounded pool of worker threads.
+
+    Accounts are kept in a priority queue keyed by the time they are due. The
+    next due time of an account is derived from its recent event rate, so busy
+    accounts are polled often and quiet ones rarely, and it is delayed by the
+    ``Retry-After`` of rate limited responses. Each account is polled by at
+    most one worker at a time.
+
+    **Instance attributes**
+
+    :ivar int workers: Maximum number of concurrent polls
+    """
+    def __init__(self, callback, checkpoint_store=None, workers=4,
+                 target_batch_size=1, rate_smoothing=0.5, **stream_kwargs):
+        """
+        :param callback: Callable that takes an
+            :class:`kloudless.account.Account` and an :class:`EventBatch`.
+            It is called from worker threads
+        :param checkpoint_store: :class:`CheckpointStore` shared by all
+            accounts. Default to :class:`MemoryCheckpointStore`
+        :param int workers: Maximum number of concurrent polls
+        :param int target_batch_size: Number of events expected to be
+            retrieved by each poll of an active account
+        :param float rate_smoothing: Weight of the latest poll in the moving
+            average of the event rate of an account, from 0 to 1
+        :param stream_kwargs: kwargs passed to :class:`EventStream`, e.g.
+            ``min_interval`` and ``max_interval``
+        """
+        self.callback = callback
+        self.checkpoint_store = checkpoint_store or MemoryCheckpointStore()
+        self.workers = workers
+        self.target_batch_size = target_batch_size
+        self.rate_smoothing = rate_smoothing
+        self.stream_kwargs = stream_kwargs
+
+        self._entries = {}
+        self._queue = []
+        self._counter = itertools.count()
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self._stopped = threading.Event()
+
+    def _schedule(self, entry, delay):
+        heapq.heappush(self._queue, (time.time() + delay,
+                                     next(self._counter), entry))
+        self._condition.notify()
+
+    def add_account(self, account, key=None):
+        """
+        Start polling the events of ``account``.
+
+        :param account: :class:`kloudless.account.Account`
+        :param str key: See :class:`EventStream`
+
+        :return: :class:`EventStream` of the account
+        """
+        stream = EventStream(account, self.checkpoint_store, key=key,
+                             **self.stream_kwargs)
+        entry = _ScheduledStream(stream)
+        with self._condition:
+            self._entries[id(account)] = entry
+            self._schedule(entry, 0)
+        return stream
+
+    def remove_account(self, account):
+        """
+        Stop polling the events of ``account``. A poll in progress is
+        completed.
+        """
+        with self._condition:
+            self._entries.pop(id(account), None)
+
+    def _get_delay(self, entry, batch):
+        stream = entry.stream
+        if batch is None or batch.is_full:
+            # failed polls back off in stream.poll
+            return stream.interval
+
+        now = time.time()
+        if entry.last_polled_at is not None:
+            elapsed = max(now - entry.last_polled_at, 1e-3)
+            entry.event_rate += self.rate_smoothing * (
+                len(batch) / elapsed - entry.event_rate)
+        entry.last_polled_at = now
+
+        if not batch.events and stream.interval > stream.min_interval:
+            return stream.interval
+        if entry.event_rate <= 0:
+            return stream.interval
+        return min(stream.max_interval,
+                   max(stream.min_interval,
+                       self.target_batch_size / entry.event_rate))
+
+    def _poll(self, entry):
+        stream = entry.stream
+        batch = None
+        try:
+            batch = stream.poll()
+            if batch is not None:
+                if batch.events:
+                    self.callback(stream.account, batch)
+                stream.commit(batch)
+        except Exception:
+            logger.exception(
+                "Handling events of account {} failed".format(stream.key))
+            batch = None
+            stream.interval = stream.max_interval
+        finally:
+            with self._condition:
+                self._in_flight -= 1
+                if self._entries.get(id(stream.account)) is entry:
+                    self._schedule(entry, self._get_delay(entry, batch))
+                self._condition.notify()
+
+    def _get_next_entry(self):
+        with self._condition:
+            while not self._stopped.is_set():
+                timeout = None
+                if self._queue and self._in_flight < self.workers:
+                    due_at, _, entry = self._queue[0]
+                    timeout = due_at - time.time()
+                    if timeout <= 0:
+                        heapq.heappop(self._queue)
+                        if self._entries.get(id(entry.stream.account)) \
+                                is not entry:
+                            continue
+                        self._in_flight += 1
+                        return entry
+                self._condition.wait(timeout)
+
+    def run(self):
+        """
+        Poll events until :func:`stop` is called. Polls in progress are
+        completed before returning.
+        """
+        self._stopped.clear()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while True:
+                entry = self._get_next_entry()
+                if entry is None:
+                    break
+                executor.submit(self._poll, entry)
+
+    def stop(self):
+        """
+        Stop polling. Can be called from another thread or from the callback.
+        """
+        with self._condition:
+            self._stopped.set()
+            self._condition.notify_all()
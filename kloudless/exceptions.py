@@ -44,6 +44,21 @@ class NoNextPage(KloudlessException):
         self.cursor = cursor  # cursor for next time event retrieving
 
 
+class TransferFailed(KloudlessException):
+    """
+    A download or upload could not be completed.
+
+    **Instance attributes**
+
+    :ivar list parts: The incomplete parts that could be resumed
+    """
+    default_message = "The transfer failed."
+
+    def __init__(self, *args, **kwargs):
+        super(TransferFailed, self).__init__(*args, **kwargs)
+        self.parts = []
+
+
 class APIException(KloudlessException):
     """
     Base Exception class for API requests.
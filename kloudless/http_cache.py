@@ -0,0 +1,359 @@
+"""
+Response cache of :class:`kloudless.client.Session` based on HTTP validators.
+
+``GET`` responses carrying an ``ETag`` or ``Last-Modified`` header are stored
+in a :class:`CacheBackend`. Following requests of the same url are sent with
+``If-None-Match`` or ``If-Modified-Since``, and a ``304 Not Modified`` answer
+is served from the stored response. :class:`ResponseCache` rules may also
+serve responses of some paths without contacting the server for a while.
+"""
+from __future__ import unicode_literals
+
+import base64
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from six.moves.urllib.parse import urlparse
+
+from .cache import LRUCache
+from .util import get_config, write_json_atomic
+
+# Request headers that change the content of a response
+VARY_HEADERS = ('Authorization', 'X-Kloudless-As-User',
+                'X-Kloudless-Raw-Data', 'X-Kloudless-Raw-Headers',
+                'Accept', 'Accept-Encoding')
+
+# Request headers asking for a partial or conditional response, which the
+# cache does not handle
+BYPASS_HEADERS = ('Range', 'If-Match', 'If-None-Match', 'If-Modified-Since',
+                  'If-Unmodified-Since', 'If-Range')
+
+
+class CacheEntry(object):
+    """
+    Stored response.
+
+    **Instance attributes**
+
+    :ivar str url: Request url
+    :ivar int status_code: Status code of the response
+    :ivar headers: :class:`requests.structures.CaseInsensitiveDict` of the
+        response headers
+    :ivar bytes content: Response body
+    :ivar float stored_at: Time when the response was stored or last
+        revalidated
+    """
+    def __init__(self, url, status_code, headers, content, stored_at=None):
+        self.url = url
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content
+        self.stored_at = time.time() if stored_at is None else stored_at
+
+    @property
+    def etag(self):
+        return self.headers.get('ETag')
+
+    @property
+    def last_modified(self):
+        return self.headers.get('Last-Modified')
+
+    def is_fresh(self, ttl):
+        return bool(ttl) and time.time() - self.stored_at < ttl
+
+    def to_dict(self):
+        return {
+            'url': self.url,
+            'status_code': self.status_code,
+            'headers': dict(self.headers),
+            'content': base64.b64encode(self.content).decode('ascii'),
+            'stored_at': self.stored_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['url'], data['status_code'], data['headers'],
+                   base64.b64decode(data['content']), data['stored_at'])
+
+
+class CacheBackend(object):
+    """
+    Base class of the storages of :class:`ResponseCache`.
+    """
+    def get(self, key):
+        """
+        Return the :class:`CacheEntry` saved for ``key``, or ``None``.
+        """
+        raise NotImplementedError
+
+    def set(self, key, entry):
+        """
+        Save :class:`CacheEntry` ``entry`` for ``key``.
+        """
+        raise NotImplementedError
+
+    def delete(self, key):
+        """
+        Remove the entry of ``key``, if any.
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        """
+        Remove all entries.
+        """
+        raise NotImplementedError
+
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    Keeps at most ``maxsize`` entries in memory, evicting the least recently
+    used one first.
+    """
+    def __init__(self, maxsize=1024):
+        self.cache = LRUCache(maxsize=maxsize)
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, entry):
+        self.cache.set(key, entry)
+
+    def delete(self, key):
+        self.cache.pop(key)
+
+    def clear(self):
+        self.cache.clear()
+
+
+class DiskCacheBackend(CacheBackend):
+    """
+    Keeps each entry in a JSON file under ``directory``, so that entries
+    survive restarts and may be shared by several processes. Files are
+    replaced atomically.
+    """
+    def __init__(self, directory):
+        """
+        :param str directory: Directory of the cache files, created if missing
+        """
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _get_path(self, key):
+        return os.path.join(self.directory, '{}.json'.format(key))
+
+    def get(self, key):
+        try:
+            with open(self._get_path(key)) as f:
+                return CacheEntry.from_dict(json.load(f))
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+
+    def set(self, key, entry):
+        write_json_atomic(self._get_path(key), entry.to_dict())
+
+    def delete(self, key):
+        try:
+            os.remove(self._get_path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                self.delete(name[:-len('.json')])
+
+
+class ResponseCache(object):
+    """
+    Conditional request cache used by :class:`kloudless.client.Session`.
+
+    ``rules`` is a list of ``(pattern, ttl)`` tuples. The ``ttl`` of the
+    first ``pattern`` found in the path of a request url by
+    :func:`re.search` applies, ``default_ttl`` otherwise:
+
+    - ``None``: responses are not cached
+    - ``0``: responses are cached but always revalidated with the server
+    - a positive number: responses are served from the cache without
+      contacting the server for ``ttl`` seconds, then revalidated
+
+    Responses without ``ETag`` or ``Last-Modified`` headers are only cached
+    for a positive ``ttl``. Streamed requests, such as file downloads,
+    requests with a header of ``BYPASS_HEADERS`` and responses with
+    ``Cache-Control: no-store`` are never cached. A successful ``POST``,
+    ``PUT``, ``PATCH`` or ``DELETE`` request removes the entry of its url.
+
+    Responses of cacheable requests have ``from_cache`` set to ``True`` if
+    they are served from the cache, ``False`` otherwise.
+
+    **Instance attributes**
+
+    :ivar backend: :class:`CacheBackend`
+    :ivar list rules: ``(compiled pattern, ttl)`` tuples
+    :ivar default_ttl: TTL of paths that match no rule
+    :ivar int hits: Number of responses served from the cache, including
+        revalidated ones
+    :ivar int misses: Number of responses received from the server
+    """
+    UNSAFE_METHODS = frozenset(['POST', 'PUT', 'PATCH', 'DELETE'])
+
+    def __init__(self, backend=None, rules=None, default_ttl=0):
+        """
+        :param backend: :class:`CacheBackend`. Default to a
+            :class:`MemoryCacheBackend`
+        :param list rules: ``(pattern, ttl)`` tuples where ``pattern`` is a
+            regular expression string or compiled pattern
+        :param default_ttl: TTL of paths that match no rule
+        """
+        self.backend = MemoryCacheBackend() if backend is None else backend
+        self.rules = [(re.compile(pattern), ttl)
+                      for pattern, ttl in (rules or [])]
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get_ttl(self, url):
+        path = urlparse(url).path
+        for pattern, ttl in self.rules:
+            if pattern.search(path):
+                return ttl
+        return self.default_ttl
+
+    @staticmethod
+    def get_key(request, method=None):
+        """
+        Return the key of ``request``, derived from its method, url and the
+        headers in ``VARY_HEADERS``.
+        """
+        parts = [method or request.method, request.url]
+        for name in VARY_HEADERS:
+            parts.append('{}:{}'.format(name, request.headers.get(name, '')))
+        return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def send(self, session_send, request, **kwargs):
+        """
+        Send ``request`` through the callable ``session_send`` taking the
+        request and ``kwargs``, using the cache if possible.
+
+        :return: :class:`requests.Response`
+        """
+        method = request.method.upper()
+        if method in self.UNSAFE_METHODS:
+            response = session_send(request, **kwargs)
+            if response.status_code < 400:
+                self.backend.delete(self.get_key(request, method='GET'))
+            return response
+
+        ttl = self.get_ttl(request.url)
+        if (method != 'GET' or ttl is None or kwargs.get('stream')
+                or any(name in request.headers for name in BYPASS_HEADERS)):
+            return session_send(request, **kwargs)
+
+        key = self.get_key(request)
+        entry = self.backend.get(key)
+        sent = request
+        if entry is not None:
+            if entry.is_fresh(ttl):
+                self._count(True)
+                return self.build_response(request, entry)
+            # validators are only added to the request sent, so that retries
+            # of the caller's request go through the cache again
+            sent = request.copy()
+            self.add_validators(sent, entry)
+
+        response = session_send(sent, **kwargs)
+        response.request = request
+
+        if response.status_code == 304 and entry is not None:
+            self._count(True)
+            headers = CaseInsensitiveDict(response.headers)
+            # the length is the one of the stored body
+            headers.pop('Content-Length', None)
+            entry.headers.update(headers)
+            entry.stored_at = time.time()
+            self.backend.set(key, entry)
+            response.close()
+            return self.build_response(request, entry, response)
+
+        self._count(False)
+        response.from_cache = False
+        if self.is_storable(response, ttl):
+            self.backend.set(key, CacheEntry(
+                request.url, response.status_code, response.headers,
+                response.content))
+        elif (entry is not None and response.status_code < 500
+                and response.status_code != 429):
+            # keep the entry on transient errors, so that a retry revalidates
+            self.backend.delete(key)
+        return response
+
+    @staticmethod
+    def add_validators(request, entry):
+        if entry.etag:
+            request.headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            request.headers['If-Modified-Since'] = entry.last_modified
+
+    @staticmethod
+    def is_storable(response, ttl):
+        if response.status_code != 200:
+            return False
+        if 'no-store' in response.headers.get('Cache-Control', ''):
+            return False
+        return bool(ttl or response.headers.get('ETag')
+                    or response.headers.get('Last-Modified'))
+
+    @staticmethod
+    def build_response(request, entry, original=None):
+        """
+        Return a :class:`requests.Response` of ``entry`` for ``request``.
+
+        :param original: The ``304`` response, if the entry was revalidated
+        """
+        response = requests.Response()
+        response.status_code = entry.status_code
+        response.reason = 'OK'
+        response.headers = CaseInsensitiveDict(entry.headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = entry.content
+        response.url = request.url
+        response.request = request
+        response.from_cache = True
+        if original is not None:
+            response.elapsed = original.elapsed
+            response.connection = original.connection
+        return response
+
+    def clear(self):
+        """
+        Remove all entries and reset the counters.
+        """
+        self.backend.clear()
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+def get_response_cache(overwrite=None):
+    """
+    Return ``overwrite`` if given, otherwise the cache from
+    ``configuration['response_cache']``. ``False`` disables caching.
+    """
+    cache = get_config('response_cache', overwrite)
+    return cache or None
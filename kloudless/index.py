@@ -0,0 +1,264 @@
+"""
+Local index of resource metadata, so that lookups by name, type, parent or
+modification time are answered without requesting the API again nor
+scanning lists of :class:`kloudless.resources.base.Resource`.
+
+The schema of the metadata tables is shared with
+:class:`kloudless.mirror.StorageMirror`.
+"""
+from __future__ import unicode_literals
+
+import calendar
+import numbers
+import sqlite3
+import threading
+
+from . import exceptions, jsonlib
+from .util import to_datetime
+
+# Columns that can be queried by :func:`MetadataIndex.find`, followed by the
+# JSON object of the resource in the ``data`` column
+COLUMNS = ('account', 'id', 'parent_id', 'type', 'name', 'mime_type',
+           'size', 'modified')
+COLUMN_TYPES = ('TEXT', 'TEXT', 'TEXT', 'TEXT', 'TEXT', 'TEXT', 'INTEGER',
+                'REAL')
+INDEXED_COLUMNS = (('id',), ('parent_id', 'account'), ('name',),
+                   ('modified',))
+
+
+def to_timestamp(value):
+    """
+    Convert an ISO 8601 timestamp or a :class:`datetime.datetime` into
+    seconds since the epoch. Naive datetimes are considered UTC.
+    """
+    if value is None or isinstance(value, numbers.Number):
+        return value
+    value = to_datetime(value)
+    if value.utcoffset() is not None:
+        value = value.replace(tzinfo=None) - value.utcoffset()
+    return calendar.timegm(value.timetuple()) + value.microsecond / 1e6
+
+
+def to_row(data, account=None):
+    """
+    Return the values of ``COLUMNS`` and ``data`` for the JSON object
+    ``data`` of a resource.
+
+    :param str account: Value of the ``account`` column. Default to the
+        ``account`` field of ``data``
+    """
+    parent = data.get('parent') or {}
+    if account is None:
+        account = data.get('account') or ''
+    return (
+        '{}'.format(account), '{}'.format(data['id']),
+        parent.get('id'), data.get('type'), data.get('name'),
+        data.get('mime_type'), data.get('size'),
+        to_timestamp(data.get('modified')),
+        jsonlib.dumps(data).decode('utf-8'),
+    )
+
+
+def create_table(conn, table, extra_columns=()):
+    """
+    Create the metadata table ``table`` and its indexes if missing.
+
+    :param conn: :class:`sqlite3.Connection`
+    :param extra_columns: ``(name, type)`` of the columns following ``data``
+    """
+    columns = list(zip(COLUMNS, COLUMN_TYPES)) + [('data', 'TEXT')]
+    columns.extend(extra_columns)
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS {} ({}, PRIMARY KEY (account, id))'.format(
+            table, ', '.join('{} {}'.format(*column) for column in columns)))
+    for indexed in INDEXED_COLUMNS:
+        conn.execute('CREATE INDEX IF NOT EXISTS {0}_{1} ON {0} ({2})'.format(
+            table, '_'.join(indexed), ', '.join(indexed)))
+
+
+def get_insert_query(table, extra_columns=()):
+    """
+    Return the query adding or replacing a row of :func:`to_row` followed by
+    the values of ``extra_columns`` in ``table``.
+
+    :param extra_columns: Names of the columns following ``data``
+    """
+    columns = COLUMNS + ('data',) + tuple(extra_columns)
+    return 'INSERT OR REPLACE INTO {} ({}) VALUES ({})'.format(
+        table, ', '.join(columns), ', '.join('?' * len(columns)))
+
+
+class MetadataIndex(object):
+    """
+    Metadata of resources in a SQLite database with indexes on id, parent,
+    name and modification time. An index kept in a file persists between
+    runs.
+
+    Resources are added from listings, e.g. a
+    :class:`kloudless.resources.base.ResourceList` or its
+    :func:`kloudless.resources.base.ResourceList.get_paging_iterator`. Adding
+    a resource again replaces its metadata. Resources are keyed by their
+    ``account`` and ``id`` fields.
+
+    .. code:: python
+
+        index = MetadataIndex('metadata.db')
+        contents = account.get('storage/folders/root/contents')
+        index.add(contents.get_paging_iterator())
+
+        pdfs = index.find(mime_type='application/pdf',
+                          modified_after=datetime(2020, 1, 1),
+                          order_by='-modified')
+
+    **Instance attributes**
+
+    :ivar str path: Path of the SQLite database, ``:memory:`` if not
+        persisted
+    :ivar str table: Name of the table storing metadata
+    """
+    ORDER_COLUMNS = frozenset(['name', 'modified', 'size', 'type', 'id'])
+
+    def __init__(self, path=':memory:', table='kloudless_metadata'):
+        """
+        :param str path: Path of the SQLite database. Default to an index in
+            memory
+        :param str table: Name of the table storing metadata
+        """
+        self.path = path
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            create_table(self._conn, table)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(
+                'SELECT COUNT(*) FROM {}'.format(self.table)).fetchone()[0]
+
+    def add(self, resources, batch_size=1000):
+        """
+        Add or replace the metadata of ``resources``.
+
+        :param resources: Iterable of
+            :class:`kloudless.resources.base.Resource` instances or of their
+            JSON objects, such as a
+            :class:`kloudless.resources.base.ResourceList` or
+            :func:`kloudless.resources.base.ResourceList.get_paging_iterator`
+        :param int batch_size: Number of resources added per transaction, so
+            that the index is queryable while a long listing is consumed
+
+        :return: (int) Number of resources added
+        """
+        count = 0
+        rows = []
+        for resource in resources:
+            rows.append(to_row(getattr(resource, 'data', resource)))
+            if len(rows) >= batch_size:
+                count += self._insert(rows)
+                rows = []
+        return count + self._insert(rows)
+
+    def _insert(self, rows):
+        if rows:
+            with self._lock, self._conn:
+                self._conn.executemany(get_insert_query(self.table), rows)
+        return len(rows)
+
+    def remove(self, ids, account=None):
+        """
+        Remove the resources of ``ids``, in any account unless ``account`` is
+        given.
+        """
+        query = 'DELETE FROM {} WHERE id = ?'.format(self.table)
+        params = [('{}'.format(i),) for i in ids]
+        if account is not None:
+            query += ' AND account = ?'
+            params = [p + ('{}'.format(account),) for p in params]
+        with self._lock, self._conn:
+            self._conn.executemany(query, params)
+
+    def clear(self):
+        """
+        Remove all resources.
+        """
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM {}'.format(self.table))
+
+    def get(self, resource_id, account=None):
+        """
+        :return: (dict) Metadata of ``resource_id``, in any account unless
+            ``account`` is given, or ``None``
+        """
+        query = 'SELECT data FROM {} WHERE id = ?'.format(self.table)
+        params = ['{}'.format(resource_id)]
+        if account is not None:
+            query += ' AND account = ?'
+            params.append('{}'.format(account))
+        with self._lock:
+            row = self._conn.execute(query + ' LIMIT 1', params).fetchone()
+        return jsonlib.loads(row[0]) if row else None
+
+    def find(self, name=None, name_contains=None, mime_type=None, type=None,
+             parent_id=None, account=None, id=None, modified_after=None,
+             modified_before=None, order_by='name', limit=None):
+        """
+        Return the metadata of the resources matching all the given
+        criteria.
+
+        :param str name: Exact name
+        :param str name_contains: Case-insensitive part of the name
+        :param str mime_type: Exact MIME type
+        :param str type: ``file`` or ``folder``
+        :param str parent_id: ID of the parent folder
+        :param str account: Account ID
+        :param str id: Resource ID
+        :param modified_after: :class:`datetime.datetime` or ISO 8601
+            timestamp. Only resources modified at or after it match
+        :param modified_before: :class:`datetime.datetime` or ISO 8601
+            timestamp. Only resources modified before it match
+        :param str order_by: One of ``name``, ``modified``, ``size``,
+            ``type`` or ``id``, prefixed by ``-`` for descending order
+        :param int limit: Maximum number of results
+
+        :return: (list) JSON objects of the resources
+        """
+        conditions = []
+        params = []
+        for column, value in (('name', name), ('mime_type', mime_type),
+                              ('type', type), ('parent_id', parent_id),
+                              ('account', account), ('id', id)):
+            if value is not None:
+                conditions.append('{} = ?'.format(column))
+                params.append('{}'.format(value))
+        if name_contains is not None:
+            conditions.append("name LIKE ? ESCAPE '\\'")
+            params.append('%{}%'.format(
+                name_contains.replace('\\', '\\\\').replace('%', '\\%')
+                .replace('_', '\\_')))
+        if modified_after is not None:
+            conditions.append('modified >= ?')
+            params.append(to_timestamp(modified_after))
+        if modified_before is not None:
+            conditions.append('modified < ?')
+            params.append(to_timestamp(modified_before))
+
+        column = order_by.lstrip('-')
+        if column not in self.ORDER_COLUMNS:
+            raise exceptions.InvalidParameter(
+                "Unsupported order_by: {}".format(order_by))
+
+        query = 'SELECT data FROM {}'.format(self.table)
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY {} {}'.format(
+            column, 'DESC' if order_by.startswith('-') else 'ASC')
+        if limit is not None:
+            query += ' LIMIT {:d}'.format(limit)
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [jsonlib.loads(row[0]) for row in rows]
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,202 @@
+"""
+JSON backend used to decode response bodies and encode request bodies.
+
+The backend is chosen by ``configuration['json_backend']``, one of
+``'orjson'``, ``'ujson'``, ``'simplejson'`` or ``'json'``. ``None`` (the
+default) uses ``simplejson`` if installed, otherwise ``json``. ``'auto'`` picks
+the first one installed in the order above.
+
+:func:`iter_object_list` parses a response body incrementally with
+`ijson <https://pypi.org/project/ijson/>`_, which must be installed
+separately::
+
+    pip install kloudless[streaming]
+"""
+from __future__ import unicode_literals
+
+import importlib
+
+from . import exceptions
+from .util import get_config
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+AUTO_BACKENDS = ('orjson', 'ujson', 'simplejson', 'json')
+DEFAULT_BACKENDS = ('simplejson', 'json')
+
+OBJECTS_ITEM = 'objects.item'
+_SCALAR_EVENTS = frozenset(
+    ('null', 'boolean', 'integer', 'double', 'number', 'string'))
+
+
+class JSONBackend(object):
+    """
+    Adapter of a JSON module that decodes from ``bytes`` and encodes to
+    ``bytes``.
+
+    **Instance attributes**
+
+    :ivar str name: Module name
+    """
+    def __init__(self, name):
+        self.name = name
+        self.module = importlib.import_module(name)
+
+    def loads(self, content):
+        return self.module.loads(content)
+
+    def dumps(self, obj):
+        return self.module.dumps(obj).encode('utf-8')
+
+
+class StdlibBackend(JSONBackend):
+
+    def loads(self, content):
+        # json only decodes bytes since Python 3.6
+        if isinstance(content, bytes):
+            content = content.decode('utf-8')
+        return self.module.loads(content)
+
+
+class OrjsonBackend(JSONBackend):
+
+    def dumps(self, obj):
+        # orjson encodes to bytes natively
+        return self.module.dumps(obj)
+
+
+_backend_classes = {
+    'json': StdlibBackend,
+    'orjson': OrjsonBackend,
+}
+_backends = {}
+
+
+def _load_backend(name):
+    if name not in _backends:
+        _backends[name] = _backend_classes.get(name, JSONBackend)(name)
+    return _backends[name]
+
+
+def get_backend(name=None):
+    """
+    Return the :class:`JSONBackend` of ``name``, default to
+    ``configuration['json_backend']``.
+
+    :raise: :class:`kloudless.exceptions.InvalidParameter` if the backend is
+        unknown or not installed
+    """
+    name = get_config('json_backend', name)
+    if name in _backends:
+        return _backends[name]
+    if name is None or name == 'auto':
+        candidates = AUTO_BACKENDS if name else DEFAULT_BACKENDS
+        for candidate in candidates:
+            try:
+                backend = _load_backend(candidate)
+            except ImportError:
+                continue
+            _backends[name] = backend
+            return backend
+
+    if name not in AUTO_BACKENDS:
+        raise exceptions.InvalidParameter(
+            "Unknown JSON backend {!r}. Choose from {}.".format(
+                name, ', '.join(AUTO_BACKENDS + ('auto',))))
+    try:
+        return _load_backend(name)
+    except ImportError:
+        raise exceptions.InvalidParameter(
+            "JSON backend {!r} is not installed.".format(name))
+
+
+def loads(content):
+    """
+    Decode JSON from ``bytes`` or ``str``.
+
+    :raise: ``ValueError`` if ``content`` is not valid JSON
+    """
+    return get_backend().loads(content)
+
+
+def dumps(obj):
+    """
+    Encode ``obj`` into JSON ``bytes``.
+    """
+    return get_backend().dumps(obj)
+
+
+def encode_json_body(kwargs):
+    """
+    Replace the ``json`` request kwarg by ``data`` encoded with the configured
+    backend, setting the ``Content-Type`` header if missing. Like
+    :mod:`requests`, ``json`` is ignored if ``data`` is given.
+    """
+    json = kwargs.pop('json', None)
+    if json is None or kwargs.get('data'):
+        return
+
+    kwargs['data'] = dumps(json)
+    headers = kwargs.get('headers')
+    if headers is None:
+        headers = kwargs['headers'] = {}
+    if not any(key.lower() == 'content-type' for key in headers):
+        headers['Content-Type'] = 'application/json'
+
+
+def _iter_parse_events(chunks):
+    events = ijson.sendable_list()
+    coroutine = ijson.parse_coro(events, use_float=True)
+    for chunk in chunks:
+        coroutine.send(chunk)
+        for event in events:
+            yield event
+        del events[:]
+    coroutine.close()
+    for event in events:
+        yield event
+
+
+def iter_object_list(chunks):
+    """
+    Generator parsing a JSON object incrementally from the iterable of
+    ``bytes`` ``chunks``. Each item of the ``objects`` array is yielded as
+    ``(OBJECTS_ITEM, item)`` as soon as it's parsed, and each other member as
+    ``(name, value)``, in the order of the document.
+
+    Without ijson, ``chunks`` are joined and decoded at once by the configured
+    backend and the same pairs are yielded.
+
+    :raise: ``ValueError`` if the content is not valid JSON
+    """
+    if ijson is None:
+        for name, value in loads(b''.join(chunks)).items():
+            if name == 'objects' and isinstance(value, list):
+                for item in value:
+                    yield OBJECTS_ITEM, item
+            else:
+                yield name, value
+        return
+
+    name = builder = None
+    for prefix, event, value in _iter_parse_events(chunks):
+        if prefix == '':
+            # start_map, end_map or map_key of the top-level object
+            if event == 'map_key':
+                name = value
+            continue
+        if prefix == 'objects' and event in ('start_array', 'end_array'):
+            continue
+
+        if builder is None:
+            builder = ijson.ObjectBuilder()
+        builder.event(event, value)
+
+        if prefix in (OBJECTS_ITEM, name) and (
+                event in ('end_map', 'end_array') or event in _SCALAR_EVENTS):
+            yield (OBJECTS_ITEM if prefix == OBJECTS_ITEM else name,
+                   builder.value)
+            builder = None
@@ -0,0 +1,185 @@
+"""
+In-process cache of resource metadata consulted by
+:func:`kloudless.client.Client.get`, for read-heavy workloads that look up
+the same resources repeatedly. Unlike :mod:`kloudless.http_cache`, cached
+responses are served without contacting the server until they expire.
+"""
+from __future__ import unicode_literals
+
+import hashlib
+import re
+import threading
+import time
+
+from .cache import LRUCache
+from .util import get_account_url, get_config, get_query_items, split_query
+
+
+class MetadataCache(object):
+    """
+    Size and TTL bounded cache of ``GET`` responses keyed by
+    ``(account, credential, path, query parameters, impersonated user)``.
+    Only paths relative to the account url matching one of ``patterns`` are
+    cached.
+
+    Entries are invalidated when:
+
+    - a ``POST``, ``PUT``, ``PATCH`` or ``DELETE`` request is made to the
+      path of an entry, or to one of its parent paths, with any credential
+    - events retrieved from the events endpoint refer to the id of a cached
+      resource, including its parent folder
+
+    The same cache may be shared by several clients. Entries are kept apart
+    for each credential, so that a response is only served to the token or
+    API key that received it.
+
+    **Instance attributes**
+
+    :ivar float ttl: Seconds an entry is served
+    :ivar list patterns: Compiled patterns of the cached paths
+    :ivar int hits: Number of responses served from the cache
+    :ivar int misses: Number of cacheable requests sent to the server
+    """
+    DEFAULT_PATTERNS = (r'^storage/(?:files|folders)/[^/]+$',)
+
+    def __init__(self, maxsize=4096, ttl=30, patterns=DEFAULT_PATTERNS):
+        """
+        :param int maxsize: Maximum number of entries
+        :param float ttl: Seconds an entry is served
+        :param patterns: Regular expressions matched against the path
+            relative to the account url, e.g. ``storage/files/{id}``
+        """
+        self.ttl = ttl
+        self.patterns = [re.compile(pattern) for pattern in patterns]
+        self.hits = 0
+        self.misses = 0
+        self._cache = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _split_url(url):
+        """
+        Return the account, the path relative to the account url and the
+        query string of ``url``. The account and path are ``None`` if it is
+        not an account url.
+        """
+        url, query = split_query(url)
+        account_url = get_account_url(url)
+        if account_url is None:
+            return None, None, query
+        return (account_url.rsplit('/', 1)[-1],
+                url[len(account_url):].strip('/'), query)
+
+    @staticmethod
+    def _hash_identity(identity):
+        return identity and hashlib.sha256(
+            identity.encode('utf-8')).hexdigest()
+
+    def get_key(self, url, params=None, as_user=None, identity=None):
+        """
+        Return the key of a ``GET`` request, or ``None`` if it is not
+        cacheable.
+
+        :param str url: Request url
+        :param params: Query parameters besides the ones in ``url``
+        :param as_user: Value of the ``X-Kloudless-As-User`` header
+        :param str identity: Credential of the request, i.e. the value of its
+            ``Authorization`` header
+        """
+        account, path, query = self._split_url(url)
+        if account is None or not any(p.search(path) for p in self.patterns):
+            return None
+
+        return (account, self._hash_identity(identity), path,
+                get_query_items(query, params),
+                as_user and '{}'.format(as_user))
+
+    def get(self, key):
+        """
+        Return the response cached for ``key`` if it has not expired, or
+        ``None``.
+        """
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] <= time.time():
+            self._cache.pop(key)
+            entry = None
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return entry[1]
+
+    def set(self, key, response):
+        self._cache.set(key, (time.time() + self.ttl, response))
+
+    def _invalidate(self, matches):
+        for key in self._cache.keys():
+            if matches(key):
+                self._cache.pop(key)
+
+    def invalidate_url(self, url, identity=None):
+        """
+        Remove the entries of the path of ``url`` and of the paths under it,
+        for all credentials. Only the entries of ``identity`` are removed for
+        ``accounts/me`` urls, which do not tell which account they refer to.
+        """
+        account, path, _ = self._split_url(url)
+        if account is None:
+            return
+        identity = self._hash_identity(identity) if account == 'me' else None
+        prefix = '{}/'.format(path)
+        self._invalidate(
+            lambda key: key[0] == account
+            and (identity is None or key[1] == identity)
+            and (key[2] == path or key[2].startswith(prefix)))
+
+    def invalidate_ids(self, ids):
+        """
+        Remove the entries whose path refers to one of the resource ``ids``,
+        in any account.
+        """
+        ids = set('{}'.format(i) for i in ids if i is not None)
+        if ids:
+            self._invalidate(lambda key: not ids.isdisjoint(key[2].split('/')))
+
+    def invalidate_events(self, events):
+        """
+        Remove the entries of the resources referred by ``events``, which are
+        JSON objects of the events endpoint.
+        """
+        ids = []
+        for event in events:
+            ids.extend(event.get('ids') or [])
+            for name in ('metadata', 'previous_metadata'):
+                metadata = event.get(name) or {}
+                ids.append(metadata.get('id'))
+                ids.append((metadata.get('parent') or {}).get('id'))
+        self.invalidate_ids(ids)
+
+    def clear(self):
+        """
+        Remove all entries and reset the counters.
+        """
+        self._cache.clear()
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        """
+        :return: (dict) ``hits``, ``misses``, ``size`` and ``maxsize``
+        """
+        info = self._cache.info()
+        info.update(hits=self.hits, misses=self.misses)
+        return info
+
+
+def get_metadata_cache(overwrite=None):
+    """
+    Return ``overwrite`` if given, otherwise the cache from
+    ``configuration['metadata_cache']``. ``False`` disables caching.
+    """
+    cache = get_config('metadata_cache', overwrite)
+    return cache or None
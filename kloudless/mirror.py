@@ -0,0 +1,304 @@
+"""
+Local SQLite mirror of the storage metadata of accounts, kept current with
+the `Events API <https://developers.kloudless.com/docs/latest/events>`_.
+
+The tree of an account is walked once with :func:`kloudless.account.Account
+.walk`. Afterward only the events since the saved cursor are requested and
+applied, so keeping a large tree current costs requests in proportion to the
+change rate rather than to the tree size.
+"""
+from __future__ import unicode_literals
+
+import sqlite3
+import threading
+import time
+
+from . import exceptions, jsonlib
+from .events import CheckpointStore, EventStream
+from .index import create_table, get_insert_query, to_row
+from .util import logger
+
+
+class MirrorCheckpointStore(CheckpointStore):
+    """
+    Keeps the cursors of a :class:`StorageMirror` in its database, so that a
+    cursor is saved in the same transaction as the events it follows.
+    """
+    def __init__(self, mirror):
+        self.mirror = mirror
+
+    def get(self, key):
+        with self.mirror._lock:
+            row = self.mirror._conn.execute(
+                'SELECT cursor FROM mirror_state WHERE account = ?',
+                (key,)).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, cursor):
+        with self.mirror._lock, self.mirror._conn:
+            self.mirror._set_cursor(key, cursor)
+
+
+class StorageMirror(object):
+    """
+    Metadata of the files and folders of an account in a SQLite database,
+    which may hold the mirrors of several accounts.
+
+    :func:`sync` walks the tree the first time, then applies the events since
+    the last sync. The cursor is saved in the same transaction as the changes
+    of its events, and applying an event again leaves the mirror unchanged,
+    so a sync interrupted at any point is resumed by the next one.
+
+    Events with metadata update the mirror directly. Resources of events
+    without metadata are requested again, and deleted resources are removed
+    with everything under them.
+
+    .. code:: python
+
+        mirror = StorageMirror(account, 'mirror.db')
+        mirror.sync()  # walks the tree the first time
+        ...
+        mirror.sync()  # applies the changes since the previous sync
+        for item in mirror.get_children(folder_id):
+            print(item['name'], item['size'])
+
+    **Instance attributes**
+
+    :ivar account: :class:`kloudless.account.Account`
+    :ivar str path: Path of the SQLite database
+    :ivar str folder_id: ID of the folder mirrored
+    :ivar stream: :class:`kloudless.events.EventStream` retrieving the events
+    """
+    def __init__(self, account, path, folder_id='root', key=None,
+                 concurrency=4, page_size=None, max_batch_size=1000,
+                 **walk_kwargs):
+        """
+        :param account: :class:`kloudless.account.Account`
+        :param str path: Path of the SQLite database
+        :param str folder_id: ID of the folder mirrored. Events of resources
+            outside of it are applied as well
+        :param str key: Key of the account in the database. Default to the
+            account ID, see :class:`kloudless.events.EventStream`
+        :param int concurrency: Maximum number of folders listed at a time
+            by the initial walk
+        :param int page_size: Number of events per page
+        :param int max_batch_size: Maximum number of events applied per
+            transaction
+        :param walk_kwargs: See :class:`kloudless.walk.TreeWalker`
+        """
+        self.account = account
+        self.path = path
+        self.folder_id = folder_id
+        self.concurrency = concurrency
+        self.walk_kwargs = walk_kwargs
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._create_tables()
+        self.stream = EventStream(account, MirrorCheckpointStore(self),
+                                  key=key, page_size=page_size,
+                                  max_batch_size=max_batch_size)
+
+    def _create_tables(self):
+        with self._conn:
+            # the table of kloudless.index.MetadataIndex, plus synced_at
+            create_table(self._conn, 'mirror_items',
+                         extra_columns=[('synced_at', 'REAL')])
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS mirror_state ('
+                'account TEXT PRIMARY KEY, cursor TEXT, synced_at REAL)')
+
+    @property
+    def key(self):
+        return self.stream.key
+
+    def _set_cursor(self, key, cursor):
+        self._conn.execute(
+            'INSERT OR REPLACE INTO mirror_state (account, cursor, synced_at) '
+            'VALUES (?, ?, ?)', (key, str(cursor), time.time()))
+
+    def _upsert(self, key, data, synced_at):
+        self._conn.execute(
+            get_insert_query('mirror_items', extra_columns=['synced_at']),
+            to_row(data, account=key) + (synced_at,))
+
+    def _delete(self, key, resource_id):
+        """
+        Remove ``resource_id`` and all the items under it.
+        """
+        self._conn.execute(
+            'WITH RECURSIVE tree(id) AS (SELECT ? UNION '
+            'SELECT i.id FROM mirror_items i '
+            'JOIN tree ON i.parent_id = tree.id WHERE i.account = ?) '
+            'DELETE FROM mirror_items WHERE account = ? '
+            'AND id IN (SELECT id FROM tree)',
+            (resource_id, key, key))
+
+    def is_initialized(self):
+        """
+        Whether the tree has been walked, so that :func:`sync` applies events.
+        """
+        return self.stream.checkpoint_store.get(self.key) is not None
+
+    def rebuild(self):
+        """
+        Walk the tree and replace the mirror of the account. The cursor is
+        retrieved before the walk, so changes made during it are applied by
+        the next :func:`sync`.
+
+        :return: (int) Number of items mirrored
+        """
+        key = self.key
+        cursor = self.account.get('events/latest').data['cursor']
+        started_at = time.time()
+        count = 0
+        walk = self.account.walk(self.folder_id,
+                                 concurrency=self.concurrency,
+                                 **self.walk_kwargs)
+        batch = []
+        for _, resource in walk:
+            batch.append(resource.data)
+            if len(batch) >= 1000:
+                count += self._upsert_all(key, batch, started_at)
+                batch = []
+        count += self._upsert_all(key, batch, started_at)
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                'DELETE FROM mirror_items WHERE account = ? '
+                'AND synced_at < ?', (key, started_at))
+            self._set_cursor(key, cursor)
+        logger.info("Mirrored {} items of account {}".format(count, key))
+        return count
+
+    def _upsert_all(self, key, items, synced_at):
+        with self._lock, self._conn:
+            for data in items:
+                self._upsert(key, data, synced_at)
+        return len(items)
+
+    def _fetch_metadata(self, resource_id):
+        """
+        Return the metadata of ``resource_id``, or ``None`` if it no longer
+        exists.
+        """
+        row = self.get(resource_id)
+        types = ['files', 'folders']
+        if row is not None and row['type'] == 'folder':
+            types.reverse()
+        for type_ in types:
+            try:
+                return self.account.get(
+                    'storage/{}/{}'.format(type_, resource_id)).data
+            except exceptions.NotFoundException:
+                pass
+        return None
+
+    def _get_changes(self, event):
+        """
+        Return the ``(resource_id, metadata)`` changes of ``event``, where
+        ``metadata`` is ``None`` if the resource is deleted.
+        """
+        data = event.data
+        metadata = data.get('metadata') or None
+        if data.get('type') == 'delete':
+            ids = list(data.get('ids') or [])
+            if metadata and metadata.get('id'):
+                ids.append(metadata['id'])
+            return [(resource_id, None) for resource_id in ids]
+        if metadata and metadata.get('id'):
+            return [(metadata['id'], metadata)]
+        return [(resource_id, self._fetch_metadata(resource_id))
+                for resource_id in data.get('ids') or []]
+
+    def apply_events(self, events, cursor=None):
+        """
+        Apply ``events`` and save ``cursor``, if given, in one transaction.
+
+        :param events: :class:`kloudless.resources.base.Resource` instances
+            of the events endpoint
+        :param cursor: Cursor following ``events``
+        """
+        # resources are requested before the transaction starts
+        key = self.key
+        changes = []
+        for event in events:
+            changes.extend(self._get_changes(event))
+
+        synced_at = time.time()
+        with self._lock, self._conn:
+            for resource_id, metadata in changes:
+                if metadata is None:
+                    self._delete(key, resource_id)
+                else:
+                    self._upsert(key, metadata, synced_at)
+            if cursor is not None:
+                self._set_cursor(key, cursor)
+        return len(changes)
+
+    def sync(self):
+        """
+        Walk the tree if the mirror is not initialized, otherwise apply all
+        events since the last sync.
+
+        :return: (int) Number of items mirrored by the walk, or number of
+            changes applied
+        """
+        if not self.is_initialized():
+            return self.rebuild()
+
+        count = 0
+        while True:
+            batch = self.stream.fetch()
+            count += self.apply_events(batch.events, batch.cursor)
+            if not batch.is_full:
+                return count
+
+    @staticmethod
+    def _to_item(row):
+        return jsonlib.loads(row[0]) if row else None
+
+    def get(self, resource_id):
+        """
+        :return: (dict) Metadata of ``resource_id``, or ``None``
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT data FROM mirror_items WHERE account = ? AND id = ?',
+                (self.key, resource_id)).fetchone()
+        return self._to_item(row)
+
+    def get_children(self, parent_id):
+        """
+        :return: (list) Metadata of the items of folder ``parent_id``
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT data FROM mirror_items WHERE account = ? '
+                'AND parent_id = ? ORDER BY name', (self.key, parent_id))
+            return [self._to_item(row) for row in rows]
+
+    def get_path(self, resource_id):
+        """
+        :return: (list) Names of the folders leading to ``resource_id`` and
+            its own name, as far as they are mirrored
+        """
+        names = []
+        seen = set()
+        item = self.get(resource_id)
+        while item is not None and item['id'] not in seen:
+            seen.add(item['id'])
+            names.append(item.get('name'))
+            item = self.get((item.get('parent') or {}).get('id'))
+        return names[::-1]
+
+    def count(self):
+        """
+        :return: (int) Number of items mirrored for the account
+        """
+        with self._lock:
+            return self._conn.execute(
+                'SELECT COUNT(*) FROM mirror_items WHERE account = ?',
+                (self.key,)).fetchone()[0]
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,292 @@
+"""
+Connection pools shared by :class:`kloudless.client.Session` instances.
+
+By default each session has its own :class:`ConnectionPool`. With
+``configuration['connection_pool'] = 'auto'``, all the sessions of a process
+share one, so that creating a :class:`kloudless.account.Account` per linked
+account or per request reuses established connections instead of paying a
+TCP and TLS handshake. Authentication and headers remain specific to each
+session.
+
+A pool is the transport of the sessions it is mounted on. Pools created with
+``http2=True`` send requests with `httpx <https://www.python-httpx.org>`_ over
+HTTP/2, which multiplexes concurrent requests to a host over one connection.
+It must be installed separately::
+
+    pip install kloudless[http2]
+"""
+from __future__ import unicode_literals
+
+import os
+import threading
+import weakref
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from .util import get_config, logger
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """
+    :class:`requests.adapters.HTTPAdapter` that may disable keep-alive.
+    """
+    def __init__(self, keep_alive=True, **kwargs):
+        self.keep_alive = keep_alive
+        super(PooledHTTPAdapter, self).__init__(**kwargs)
+
+    def add_headers(self, request, **kwargs):
+        if not self.keep_alive:
+            request.headers['Connection'] = 'close'
+
+
+class HTTPXRawResponse(object):
+    """
+    File-like view of a streamed :class:`httpx.Response`, used as the ``raw``
+    attribute of the :class:`requests.Response` built by
+    :class:`HTTP2Adapter`. The content is already decoded.
+
+    **Instance attributes**
+
+    :ivar str http_version: ``HTTP/2`` or ``HTTP/1.1``
+    """
+    def __init__(self, response):
+        self.response = response
+        self.http_version = response.http_version
+        self._chunks = response.iter_bytes()
+        self._buffer = b''
+
+    def stream(self, chunk_size=None, decode_content=True):
+        # chunks are yielded as they are received, whatever chunk_size is
+        if self._buffer:
+            chunk, self._buffer = self._buffer, b''
+            yield chunk
+        for chunk in self._chunks:
+            yield chunk
+
+    def read(self, amt=None, **kwargs):
+        while amt is None or len(self._buffer) < amt:
+            try:
+                self._buffer += next(self._chunks)
+            except StopIteration:
+                break
+        if amt is None:
+            amt = len(self._buffer)
+        data, self._buffer = self._buffer[:amt], self._buffer[amt:]
+        return data
+
+    def close(self):
+        self.response.close()
+
+    release_conn = close
+
+
+class HTTP2Adapter(BaseAdapter):
+    """
+    Transport adapter sending requests over HTTP/2 with :class:`httpx.Client`.
+    Hosts that do not support HTTP/2 are accessed over HTTP/1.1.
+
+    TLS verification, client certificates and proxies are settings of the
+    underlying client given by ``client_kwargs``, so the ``verify``, ``cert``
+    and ``proxies`` request options are not applied. Cookies are not stored.
+
+    **Instance attributes**
+
+    :ivar client: :class:`httpx.Client`
+    """
+    def __init__(self, limits=None, **client_kwargs):
+        """
+        :param limits: :class:`httpx.Limits`
+        :param client_kwargs: kwargs passed to :class:`httpx.Client`, e.g.
+            ``verify``
+        """
+        if httpx is None:
+            raise ImportError(
+                "httpx is required for HTTP/2. Install it with "
+                "`pip install kloudless[http2]`.")
+
+        super(HTTP2Adapter, self).__init__()
+        client_kwargs.setdefault('http2', True)
+        if limits is not None:
+            client_kwargs['limits'] = limits
+        self.client = httpx.Client(**client_kwargs)
+
+    @staticmethod
+    def _get_timeout(timeout):
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            return httpx.Timeout(read, connect=connect)
+        return httpx.Timeout(timeout)
+
+    def send(self, request, stream=False, timeout=None, verify=True,
+             cert=None, proxies=None):
+        httpx_request = self.client.build_request(
+            request.method, request.url, headers=dict(request.headers),
+            content=request.body, timeout=self._get_timeout(timeout))
+        try:
+            httpx_response = self.client.send(httpx_request, stream=True)
+        except httpx.ConnectTimeout as e:
+            raise requests.exceptions.ConnectTimeout(e, request=request)
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.ReadTimeout(e, request=request)
+        except httpx.TransportError as e:
+            raise requests.exceptions.ConnectionError(e, request=request)
+        return self.build_response(request, httpx_response)
+
+    def build_response(self, request, httpx_response):
+        """
+        Return a :class:`requests.Response` streaming ``httpx_response``.
+        """
+        response = requests.Response()
+        response.status_code = httpx_response.status_code
+        response.reason = httpx_response.reason_phrase
+        response.headers = CaseInsensitiveDict(httpx_response.headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = HTTPXRawResponse(httpx_response)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        self.client.close()
+
+
+class ConnectionPool(object):
+    """
+    Pool of connections that can be mounted on several sessions.
+
+    **Instance attributes**
+
+    :ivar adapter: :class:`PooledHTTPAdapter`, or :class:`HTTP2Adapter` if
+        ``http2`` is ``True``
+    :ivar bool http2: Whether requests are sent over HTTP/2
+    :ivar async_transports: Transports of :class:`kloudless.aio.AsyncSession`
+        instances sharing this pool, by event loop. Connections cannot be
+        shared across event loops
+    """
+    def __init__(self, pool_connections=None, pool_maxsize=None,
+                 pool_block=None, keep_alive=None, http2=None):
+        """
+        Parameters default to the configuration values of the same name.
+
+        :param int pool_connections: Number of hosts whose connections are
+            pooled
+        :param int pool_maxsize: Maximum number of connections kept per host
+        :param bool pool_block: Whether to wait for a free connection instead
+            of opening a connection beyond ``pool_maxsize``, which is then
+            discarded after use
+        :param bool keep_alive: Whether to keep connections open between
+            requests
+        :param bool http2: Whether to send requests over HTTP/2. Note that
+            ``pool_connections`` does not apply to HTTP/2 pools, where
+            ``pool_maxsize`` bounds the connections kept for all hosts
+        """
+        self.pool_connections = get_config('pool_connections',
+                                           pool_connections)
+        self.pool_maxsize = get_config('pool_maxsize', pool_maxsize)
+        self.pool_block = get_config('pool_block', pool_block)
+        self.keep_alive = get_config('keep_alive', keep_alive)
+        self.http2 = get_config('http2', http2)
+        self.async_transports = weakref.WeakKeyDictionary()
+
+        if self.http2:
+            self.adapter = HTTP2Adapter(limits=self.get_httpx_limits())
+        else:
+            self.adapter = PooledHTTPAdapter(
+                pool_connections=self.pool_connections,
+                pool_maxsize=self.pool_maxsize,
+                pool_block=self.pool_block,
+                keep_alive=self.keep_alive,
+            )
+
+    def get_httpx_limits(self):
+        """
+        :return: :class:`httpx.Limits` equivalent to the pool settings
+        """
+        return httpx.Limits(
+            max_connections=self.pool_maxsize if self.pool_block else None,
+            max_keepalive_connections=(self.pool_maxsize if self.keep_alive
+                                       else 0),
+        )
+
+    def mount(self, session):
+        """
+        Send the http and https requests of ``session`` through this pool.
+        """
+        session.mount('https://', self.adapter)
+        session.mount('http://', self.adapter)
+
+    def close(self):
+        """
+        Close all pooled connections of sync sessions. The pool remains
+        usable.
+        """
+        self.adapter.close()
+
+
+_default_pool = None
+_default_pool_pid = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_pool():
+    """
+    Return the process-wide :class:`ConnectionPool`, created on first use.
+    A forked process gets its own pool.
+    """
+    global _default_pool, _default_pool_pid
+
+    with _default_pool_lock:
+        if _default_pool is None or _default_pool_pid != os.getpid():
+            _default_pool = ConnectionPool()
+            _default_pool_pid = os.getpid()
+        return _default_pool
+
+
+def get_connection_pool(overwrite=None):
+    """
+    Return ``overwrite`` if given, otherwise the pool from
+    ``configuration['connection_pool']``. ``'auto'`` is the process-wide
+    pool of :func:`get_default_pool`. ``False`` or ``None`` give each session
+    its own pool, returned as ``None``.
+    """
+    pool = get_config('connection_pool', overwrite)
+    if pool == 'auto':
+        return get_default_pool()
+    return pool or None
+
+
+def check_concurrency(session, workers):
+    """
+    Log a warning if ``workers`` concurrent requests of ``session`` exceed
+    the number of connections its pool keeps per host, in which case the
+    extra connections are opened and discarded for each request, or waited
+    for if ``pool_block`` is set.
+
+    :param session: :class:`kloudless.client.Session`
+    :param int workers: Number of concurrent requests
+    """
+    pool = getattr(session, 'connection_pool', None)
+    if pool is None:
+        # the own pool of the session is built from the configuration
+        http2 = get_config('http2')
+        maxsize = get_config('pool_maxsize')
+    else:
+        http2 = pool.http2
+        maxsize = pool.pool_maxsize
+    if http2:
+        return
+
+    if workers > maxsize:
+        logger.warning(
+            "{} concurrent requests exceed the {} connections kept per host "
+            "by the connection pool. Raise configuration['pool_maxsize'] or "
+            "pass a larger ConnectionPool.".format(workers, maxsize))
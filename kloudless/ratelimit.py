@@ -0,0 +1,376 @@
+"""
+Client-side rate limiting of :class:`kloudless.client.Session` requests with
+token buckets, so that requests wait for their turn instead of being rejected
+with ``429 Too Many Requests``.
+
+A :class:`RateLimiter` keeps a bucket for the application, one per account
+and one per upstream service. A request takes a token from each bucket that
+applies to it, and waits until all of them are available. Buckets are kept in
+a :class:`RateLimitBackend`: :class:`MemoryRateLimitBackend` coordinates the
+threads and event loops of a process, :class:`SQLiteRateLimitBackend` the
+processes sharing a database file.
+
+The rate of a bucket is halved by each ``429`` response, which also holds
+the bucket for the ``Retry-After`` delay, and recovers gradually with the
+following requests.
+"""
+from __future__ import unicode_literals
+
+import hashlib
+import numbers
+import sqlite3
+import threading
+import time
+
+from .retry import RetryPolicy
+from .util import get_account_url, get_config
+
+
+class Limit(object):
+    """
+    Rate of a bucket.
+
+    **Instance attributes**
+
+    :ivar float rate: Requests per second
+    :ivar float burst: Requests that may be sent at once after an idle period
+    """
+    def __init__(self, rate, burst=None):
+        """
+        :param float rate: Requests per second
+        :param float burst: Size of the bucket. Default to ``rate``, and at
+            least 1
+        """
+        self.rate = float(rate)
+        self.burst = max(1.0, float(self.rate if burst is None else burst))
+
+    @classmethod
+    def create(cls, value):
+        """
+        Return ``value`` as a :class:`Limit`. ``value`` is a :class:`Limit`,
+        a number of requests per second or a ``(rate, burst)`` tuple.
+        """
+        if value is None or isinstance(value, Limit):
+            return value
+        if isinstance(value, numbers.Number):
+            return cls(value)
+        return cls(*value)
+
+
+def take_token(state, now, limit, recovery):
+    """
+    Take a token from the bucket ``state``, a dict of ``tokens``,
+    ``updated_at`` and ``rate`` or ``None`` for a new bucket. The token may be
+    borrowed from the future, so concurrent requests queue up.
+
+    :return: ``(state, delay)`` where ``delay`` is the number of seconds to
+        wait before sending the request
+    """
+    if state is None:
+        state = {'tokens': limit.burst, 'updated_at': now, 'rate': limit.rate}
+
+    rate = min(state['rate'], limit.rate)
+    elapsed = max(0.0, now - state['updated_at'])
+    tokens = min(limit.burst, state['tokens'] + elapsed * rate) - 1
+    delay = -tokens / rate if tokens < 0 else 0.0
+
+    state = {
+        'tokens': tokens,
+        'updated_at': now,
+        'rate': min(limit.rate, rate + limit.rate * recovery),
+    }
+    return state, delay
+
+
+def slow_down(state, now, limit, factor, min_rate, delay):
+    """
+    Apply a ``429`` response to the bucket ``state``: multiply its rate by
+    ``factor`` and hold it for ``delay`` seconds.
+
+    :return: The new state
+    """
+    if state is None:
+        state = {'tokens': limit.burst, 'updated_at': now, 'rate': limit.rate}
+
+    rate = min(state['rate'], limit.rate) * factor
+    rate = max(min(min_rate, limit.rate), rate)
+    elapsed = max(0.0, now - state['updated_at'])
+    tokens = min(limit.burst, state['tokens'] + elapsed * state['rate'])
+    return {
+        'tokens': min(tokens, -delay * rate),
+        'updated_at': now,
+        'rate': rate,
+    }
+
+
+class RateLimitBackend(object):
+    """
+    Base class of the storages of :class:`RateLimiter` buckets. Each method
+    must update the state of a bucket atomically.
+    """
+    def update(self, key, func):
+        """
+        Replace the state of bucket ``key`` with the first value returned by
+        ``func(state)``, where ``state`` is ``None`` for a new bucket.
+
+        :return: The second value returned by ``func``
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        """
+        Remove all buckets.
+        """
+        raise NotImplementedError
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """
+    Keeps buckets in memory, shared by the threads and event loops of a
+    process.
+    """
+    def __init__(self):
+        self.buckets = {}
+        self._lock = threading.Lock()
+
+    def update(self, key, func):
+        with self._lock:
+            self.buckets[key], result = func(self.buckets.get(key))
+        return result
+
+    def clear(self):
+        with self._lock:
+            self.buckets.clear()
+
+
+class SQLiteRateLimitBackend(RateLimitBackend):
+    """
+    Keeps buckets in a SQLite database, so that processes sharing it are
+    limited together. Updates run in ``IMMEDIATE`` transactions, which
+    serialize them across processes.
+    """
+    def __init__(self, path, table='kloudless_rate_limits', timeout=10):
+        """
+        :param str path: Path of the SQLite database
+        :param str table: Name of the table storing buckets
+        :param float timeout: Seconds to wait for the lock of the database
+        """
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=timeout,
+                                     check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS {} (key TEXT PRIMARY KEY, '
+            'tokens REAL, updated_at REAL, rate REAL)'.format(table))
+
+    def update(self, key, func):
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute(
+                    'SELECT tokens, updated_at, rate FROM {} '
+                    'WHERE key = ?'.format(self.table), (key,)).fetchone()
+                state = None
+                if row is not None:
+                    state = dict(zip(('tokens', 'updated_at', 'rate'), row))
+                state, result = func(state)
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO {} '
+                    '(key, tokens, updated_at, rate) '
+                    'VALUES (?, ?, ?, ?)'.format(self.table),
+                    (key, state['tokens'], state['updated_at'], state['rate']))
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM {}'.format(self.table))
+
+    def close(self):
+        self._conn.close()
+
+
+class RateLimiter(object):
+    """
+    Token bucket limiter used by :class:`kloudless.client.Session` and
+    :class:`kloudless.aio.AsyncSession`.
+
+    A request takes a token from:
+
+    - the ``application`` bucket, shared by all requests of the limiter
+    - the bucket of its account, if ``account`` is set. Requests to
+      ``accounts/me`` are told apart by their credential
+    - the bucket of the upstream service of its account, if ``service`` is set
+      and ``services`` gives the service of the account
+
+    The same limiter, or limiters of the same ``name`` sharing a backend, must
+    only be used for one application.
+
+    .. code:: python
+
+        limiter = RateLimiter(application=50, account=(5, 10),
+                              services={'123': 'gdrive'}, service=20)
+        kloudless.configuration['rate_limiter'] = limiter
+
+    **Instance attributes**
+
+    :ivar backend: :class:`RateLimitBackend`
+    :ivar application: :class:`Limit` of the application bucket, or ``None``
+    :ivar account: :class:`Limit` of each account bucket, or ``None``
+    :ivar service: :class:`Limit` of each service bucket, or dict of
+        :class:`Limit` by service name
+    :ivar float waited: Total seconds requests have been held back
+    """
+    def __init__(self, application=None, account=None, service=None,
+                 services=None, backend=None, name='default',
+                 slow_down_factor=0.5, min_rate=0.1, recovery=0.01):
+        """
+        Limits are given as a :class:`Limit`, a number of requests per second
+        or a ``(rate, burst)`` tuple. ``None`` disables the bucket.
+
+        :param application: Limit of all requests
+        :param account: Limit of the requests of each account
+        :param service: Limit of the requests of each upstream service, or
+            dict of limits by service name
+        :param services: Dict of the service names by account id, or callable
+            taking an account id and returning its service name or ``None``
+        :param backend: :class:`RateLimitBackend`. Default to a
+            :class:`MemoryRateLimitBackend`
+        :param str name: Prefix of the bucket keys in ``backend``
+        :param float slow_down_factor: Factor applied to the rate of buckets
+            on ``429`` responses
+        :param float min_rate: Requests per second below which a bucket is not
+            slowed down
+        :param float recovery: Fraction of the configured rate regained by a
+            slowed down bucket with each request
+        """
+        self.backend = MemoryRateLimitBackend() if backend is None else backend
+        self.application = Limit.create(application)
+        self.account = Limit.create(account)
+        if isinstance(service, dict):
+            self.service = dict((name_, Limit.create(limit))
+                                for name_, limit in service.items())
+        else:
+            self.service = Limit.create(service)
+        self.services = services or {}
+        self.name = name
+        self.slow_down_factor = slow_down_factor
+        self.min_rate = min_rate
+        self.recovery = recovery
+        self.waited = 0.0
+        self._lock = threading.Lock()
+
+    def _get_service(self, account_id):
+        if callable(self.services):
+            return self.services(account_id)
+        return self.services.get(account_id)
+
+    def _get_service_limit(self, service):
+        if isinstance(self.service, dict):
+            return self.service.get(service)
+        return self.service
+
+    def get_buckets(self, url, identity=None):
+        """
+        Return the ``(key, limit)`` of the buckets of a request.
+
+        :param str url: Request url
+        :param str identity: Credential of the request, used to tell apart
+            ``accounts/me`` urls of different tokens
+        """
+        buckets = []
+        if self.application is not None:
+            buckets.append(('{}:application'.format(self.name),
+                            self.application))
+
+        account_url = get_account_url(url)
+        if account_url is None:
+            return buckets
+        account_id = account_url.rsplit('/', 1)[-1]
+
+        if self.account is not None:
+            account = account_id
+            if account == 'me' and identity:
+                account = 'me:{}'.format(hashlib.sha256(
+                    identity.encode('utf-8')).hexdigest()[:16])
+            buckets.append(('{}:account:{}'.format(self.name, account),
+                            self.account))
+
+        if self.service and account_id != 'me':
+            service = self._get_service(account_id)
+            limit = self._get_service_limit(service) if service else None
+            if limit is not None:
+                buckets.append(('{}:service:{}'.format(self.name, service),
+                                limit))
+        return buckets
+
+    def reserve(self, buckets):
+        """
+        Take a token from each of ``buckets``.
+
+        :return: (float) Seconds to wait before sending the request
+        """
+        now = time.time()
+        delay = 0.0
+        for key, limit in buckets:
+            delay = max(delay, self.backend.update(
+                key, lambda state: take_token(state, now, limit,
+                                              self.recovery)))
+        if delay:
+            with self._lock:
+                self.waited += delay
+        return delay
+
+    def update(self, buckets, status_code, headers):
+        """
+        Slow down ``buckets`` if a response is ``429 Too Many Requests``.
+
+        :param int status_code: Status code of the response
+        :param headers: Headers of the response
+        """
+        if status_code != 429:
+            return
+
+        delay = RetryPolicy.parse_retry_after(headers.get('Retry-After'))
+        now = time.time()
+        for key, limit in buckets:
+            self.backend.update(key, lambda state: (slow_down(
+                state, now, limit, self.slow_down_factor, self.min_rate,
+                delay or 0.0), None))
+
+    def send(self, session_send, request, **kwargs):
+        """
+        Send ``request`` through the callable ``session_send`` taking the
+        request and ``kwargs`` once the buckets of the request allow it.
+
+        :return: :class:`requests.Response`
+        """
+        buckets = self.get_buckets(request.url,
+                                   request.headers.get('Authorization'))
+        delay = self.reserve(buckets)
+        if delay > 0:
+            time.sleep(delay)
+        response = session_send(request, **kwargs)
+        self.update(buckets, response.status_code, response.headers)
+        return response
+
+    def clear(self):
+        """
+        Reset all buckets and ``self.waited``.
+        """
+        self.backend.clear()
+        with self._lock:
+            self.waited = 0.0
+
+
+def get_rate_limiter(overwrite=None):
+    """
+    Return ``overwrite`` if given, otherwise the limiter from
+    ``configuration['rate_limiter']``. ``False`` disables rate limiting.
+    """
+    limiter = get_config('rate_limiter', overwrite)
+    return limiter or None
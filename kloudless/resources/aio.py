@@ -0,0 +1,262 @@
+"""
+Asyncio counterparts of :mod:`kloudless.resources.base`, returned by
+:class:`kloudless.aio.AsyncClient` and :class:`kloudless.aio.AsyncAccount`.
+
+Http methods like ``get`` or ``post`` are forwarded to the async client as in
+the base classes, so they return awaitables. Methods that need the result of
+a request, like ``refresh`` or ``get_next_page``, are coroutines here.
+"""
+import asyncio
+import itertools
+from collections import deque
+
+from .. import exceptions
+from .base import Response, ResponseJson, Resource, ResourceList
+
+
+class AsyncBackgroundIterator(object):
+    """
+    Async iterator that consumes the async ``iterable`` in a separate task and
+    buffers up to ``size`` items ahead of the caller. An exception raised by
+    ``iterable`` is re-raised to the caller once the items before it are
+    consumed.
+    """
+    _done = object()
+
+    def __init__(self, iterable, size=1):
+        self._queue = asyncio.Queue(maxsize=max(1, size))
+        self._finished = False
+        self._task = asyncio.ensure_future(self._run(iterable))
+
+    async def _run(self, iterable):
+        try:
+            async for item in iterable:
+                await self._queue.put((item, None))
+        except Exception as e:
+            await self._queue.put((self._done, e))
+        else:
+            await self._queue.put((self._done, None))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._finished:
+            raise StopAsyncIteration
+        item, error = await self._queue.get()
+        if item is self._done:
+            self._finished = True
+            if error is not None:
+                raise error
+            raise StopAsyncIteration
+        return item
+
+    def close(self):
+        """
+        Stop consuming ``iterable``. Items already buffered are dropped.
+        """
+        self._finished = True
+        self._task.cancel()
+
+
+class AsyncResponseMixin(object):
+    __slots__ = ()
+
+    async def _get_self(self):
+        """
+        Performs GET request to self.url.
+        """
+        if self.response and self.response.request.method == 'GET':
+            orig_request = self.response.request
+            response = await self.get(str(orig_request.url),
+                                      headers=orig_request.headers)
+        else:
+            response = await self.get(self.url)
+        return response
+
+    async def refresh(self):
+        """
+        Performs GET request through ``self.client.get`` to ``self.url``, then
+        refresh ``self``. The original query parameters and headers would be
+        reused if original request is http GET request.
+        """
+        self._update_from(await self._get_self())
+
+
+class AsyncResponse(AsyncResponseMixin, Response):
+    """
+    Async version of :class:`kloudless.resources.base.Response`.
+    """
+    __slots__ = ()
+
+
+class AsyncResponseJson(AsyncResponseMixin, ResponseJson):
+    """
+    Async version of :class:`kloudless.resources.base.ResponseJson`.
+    """
+    __slots__ = ()
+
+
+class AsyncResource(AsyncResponseMixin, Resource):
+    """
+    Async version of :class:`kloudless.resources.base.Resource`.
+    """
+    __slots__ = ()
+
+
+class AsyncResourceList(AsyncResponseMixin, ResourceList):
+    """
+    Async version of :class:`kloudless.resources.base.ResourceList`.
+    """
+    resource_class = AsyncResource
+
+    async def _get_event_next_page(self):
+
+        params = self._get_event_next_page_params()
+        response = await self.client.get(
+            self.url, params=params, headers=self.response.request.headers)
+        if not response.objects:
+            raise exceptions.NoNextPage(cursor=self.cursor)
+
+        return response
+
+    async def _get_page(self, params):
+
+        try:
+            response = await self.client.get(
+                self.url, params=params,
+                headers=self.response.request.headers,
+                expected_statuses=(404,))
+        except exceptions.NotFoundException:
+            raise exceptions.NoNextPage()
+
+        return response
+
+    async def _get_next_page(self):
+        return await self._get_page(self._get_next_page_params())
+
+    async def get_next_page(self):
+        """
+        Get the resources of the next page, if any.
+
+        :return: :class:`kloudless.resources.aio.AsyncResourceList`
+        :raise: :class:`kloudless.exceptions.NoNextPage`
+        """
+        if self.is_retrieving_events:
+            return await self._get_event_next_page()
+        else:
+            return await self._get_next_page()
+
+    async def _iter_pages(self):
+        """
+        Async generator yielding ``self`` and each following page. The
+        :class:`kloudless.exceptions.NoNextPage` raised after the last page is
+        propagated to the caller.
+        """
+        resource_list = self
+        while True:
+            yield resource_list
+            resource_list = await resource_list.get_next_page()
+
+    async def get_paging_iterator(self, max_resources=None, prefetch=0):
+        """
+        Async generator to iterate thorough all resources under
+        ``self.objects`` and all resources in the following page, if any.
+
+        See :func:`kloudless.resources.base.ResourceList.get_paging_iterator`.
+
+        :param max_resources: the maximum quantity of resources that would be
+            contained in the returned generator
+
+        :param int prefetch: the number of following pages to request in a
+            background task while resources of the current page are being
+            yielded
+
+        :return: async generator that yield
+            :class:`kloudless.resources.aio.AsyncResource` instance
+        """
+        counter = 0
+        pages = self._iter_pages()
+        if prefetch:
+            pages = AsyncBackgroundIterator(pages, prefetch)
+
+        try:
+            async for resource_list in pages:
+                for resource in resource_list:
+                    yield resource
+                    counter += 1
+                    if max_resources is not None and counter == max_resources:
+                        return
+        except exceptions.NoNextPage as e:
+            if self.is_retrieving_events:
+                self.latest_cursor = e.cursor
+        finally:
+            if prefetch:
+                pages.close()
+
+    async def get_pages_parallel(self, workers=4):
+        """
+        Async generator to iterate thorough ``self`` and all the following
+        pages in order, requesting up to ``workers`` pages concurrently.
+
+        See :func:`kloudless.resources.base.ResourceList.get_pages_parallel`.
+
+        :return: async generator that yield
+            :class:`kloudless.resources.aio.AsyncResourceList` instance
+        """
+        if workers <= 1 or not self._has_page_numbers():
+            try:
+                async for resource_list in self._iter_pages():
+                    yield resource_list
+            except exceptions.NoNextPage:
+                pass
+            return
+
+        yield self
+        if self._get_next_page_identifier() is None:
+            return
+
+        page_numbers = itertools.count(self._get_next_page_identifier())
+        window = deque(
+            asyncio.ensure_future(self._get_page(
+                self._get_page_number_params(next(page_numbers))))
+            for _ in range(workers))
+        try:
+            while window:
+                try:
+                    resource_list = await window.popleft()
+                except exceptions.NoNextPage:
+                    break
+                if not resource_list.objects:
+                    break
+                yield resource_list
+                if resource_list._get_next_page_identifier() is None:
+                    break
+                window.append(asyncio.ensure_future(self._get_page(
+                    self._get_page_number_params(next(page_numbers)))))
+        finally:
+            for task in window:
+                task.cancel()
+
+    async def iter_all(self, concurrency=4, max_resources=None):
+        """
+        Async generator to iterate thorough all resources under
+        ``self.objects`` and all resources in the following pages, requesting
+        up to ``concurrency`` pages at a time.
+
+        See :func:`kloudless.resources.base.ResourceList.iter_all`.
+
+        :return: async generator that yield
+            :class:`kloudless.resources.aio.AsyncResource` instance
+        """
+        counter = 0
+        pages = self.get_pages_parallel(workers=concurrency)
+        try:
+            async for resource_list in pages:
+                for resource in resource_list:
+                    yield resource
+                    counter += 1
+                    if max_resources is not None and counter == max_resources:
+                        return
+        finally:
+            await pages.aclose()
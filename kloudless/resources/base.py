@@ -1,11 +1,17 @@
 from __future__ import unicode_literals
 
-from six.moves.urllib.parse import parse_qs, urlparse, urlunparse
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-from .. import exceptions
-from ..re_patterns import (events_pattern, full_account_pattern,
-                           primary_calendar_alias)
-from ..util import url_join
+from six.moves.collections_abc import Sequence
+from six.moves.urllib.parse import parse_qs
+
+from .. import exceptions, jsonlib
+from ..pool import check_concurrency
+from ..re_patterns import events_pattern
+from ..util import (BackgroundIterator, get_account_url,
+                    is_primary_calendar_url, split_query, url_join)
 
 
 class Empty(object):
@@ -22,6 +28,39 @@ class Empty(object):
 empty = Empty()  # create instance to make __bool__ take effect
 
 
+class ResponseContext(object):
+    """
+    State derived from the request url of a response, shared by all the
+    resources created from the same page.
+
+    **Instance attributes**
+
+    :ivar client: :class:`kloudless.client.Client` or
+        :class:`kloudless.account.Account`
+
+    :ivar str url: Request url without query string
+
+    :ivar dict query_params: Query parameter from request
+
+    :ivar bool shared: Whether the context is shared by several responses.
+        A response copies ``query_params`` into its own context before
+        giving them out, so that changing them does not affect the others
+    """
+    __slots__ = ('client', 'url', 'query_params', 'shared')
+
+    def __init__(self, client, url, query_params, shared=False):
+        self.client = client
+        self.url = url
+        self.query_params = query_params
+        self.shared = shared
+
+    @classmethod
+    def from_url(cls, client, url):
+        # clean up the url to make url_join work
+        url, query = split_query(url)
+        return cls(client, url, parse_qs(query) if query else {})
+
+
 class Response(object):
     """
     Base Response class for this library.
@@ -38,17 +77,42 @@ class Response(object):
 
     :ivar response: :class:`requests.Response` if available
     """
-    def __init__(self, client, url, response=None):
+    __slots__ = ('_context', 'url', 'response')
 
-        parse_result = urlparse(url)
-        # clean up the url to make url_join work
-        self.url = urlunparse(parse_result._replace(query=''))
-        self.query_params = parse_qs(parse_result.query)
+    def __init__(self, client=None, url=None, response=None, context=None):
 
-        self.client = client
+        if context is None:
+            context = ResponseContext.from_url(client, url)
+        self._context = context
+        self.url = context.url
         self.response = response
 
+    @property
+    def client(self):
+        return self._context.client
+
+    @client.setter
+    def client(self, client):
+        self._context = ResponseContext(client, self._context.url,
+                                        self.query_params)
+
+    @property
+    def query_params(self):
+        context = self._context
+        if context.shared:
+            self._context = context = ResponseContext(
+                context.client, context.url, dict(context.query_params))
+        return context.query_params
+
+    @query_params.setter
+    def query_params(self, query_params):
+        self._context = ResponseContext(self._context.client,
+                                        self._context.url, query_params)
+
     def __getattr__(self, name):
+        # slots are looked up through __getattr__ until they are assigned
+        if name in ('_context', 'response'):
+            raise AttributeError(name)
         if self.response:
             return getattr(self.response, name)
         raise AttributeError(name)
@@ -118,7 +182,9 @@ class Response(object):
         refresh ``self``. The original query parameters and headers would be
         reused if original request is http GET request.
         """
-        new = self._get_self()
+        self._update_from(self._get_self())
+
+    def _update_from(self, new):
         self.__init__(new.client, new.url, new.response)
 
 
@@ -130,19 +196,15 @@ class ResponseJson(Response):
 
     :ivar dict data: JSON data
     """
+    __slots__ = ('data',)
+
     def __init__(self, data, **kwargs):
 
         super(ResponseJson, self).__init__(**kwargs)
 
         self.data = data
 
-    def refresh(self):
-        """
-        Perform GET request through ``self.client.get`` to ``self.url``, then
-        refresh ``self``. The original query parameters and headers would be
-        reused if original request is http GET request.
-        """
-        new = self._get_self()
+    def _update_from(self, new):
         self.__init__(client=new.client, data=new.data,
                       url=new.url, response=new.response)
 
@@ -155,7 +217,14 @@ class Resource(ResponseJson):
 
     Example resources include: Files and folders in the Storage API,
     calendar events in the Calendar API, and events in Events API.
+
+    Resources are slotted objects. The ones created from the same
+    :class:`kloudless.resources.base.ResourceList` page share one
+    :class:`kloudless.resources.base.ResponseContext` and only keep their own
+    ``data`` and ``url``. A resource gets a context of its own once its
+    ``query_params`` are accessed.
     """
+    __slots__ = ()
 
     def __init__(self, **kwargs):
 
@@ -178,25 +247,65 @@ class Resource(ResponseJson):
         if href:
             return href
 
-        if primary_calendar_alias.search(url):
+        if is_primary_calendar_url(url):
             return url
 
         object_api = data.get('api', None)
         object_type = data.get('type', None)
         object_id = str(data.get('id', ''))
 
+        account_url = None
         if object_api == 'storage' and object_type in ('file', 'folder'):
-            account_url = full_account_pattern.match(url).group(0)
+            account_url = get_account_url(url)
+
+        if account_url is not None:
             url = '{}/storage/{}s/{}'.format(account_url, object_type,
                                              object_id)
-        else:
-            if object_id and not url.rstrip('/').endswith(object_id):
-                # construct from ResourceList.__init__
-                url = url_join(url, object_id)
+        elif object_id and not url.rstrip('/').endswith(object_id):
+            # construct from ResourceList.__init__
+            url = url_join(url, object_id)
 
         return url
 
 
+class LazyResourceSequence(Sequence):
+    """
+    Read-only sequence of :class:`kloudless.resources.base.Resource` built
+    from a list of JSON objects. Each resource is created when it is first
+    accessed and then cached, so objects that are never used cost nothing
+    more than their JSON data.
+
+    **Instance attributes**
+
+    :ivar list data: JSON objects of the resources
+    """
+    def __init__(self, data, factory):
+        self.data = data
+        self._factory = factory
+        self._resources = [None] * len(data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        resource = self._resources[index]
+        if resource is None:
+            resource = self._factory(self.data[index])
+            self._resources[index] = resource
+        return resource
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __repr__(self):
+        return '<{}: {} objects>'.format(LazyResourceSequence.__name__,
+                                         len(self))
+
+
 class ResourceList(ResponseJson):
     """
     Represents a list of resources from API response. ResourceList itself is also
@@ -204,31 +313,49 @@ class ResourceList(ResponseJson):
 
     **Instance attributes**
 
-    :ivar objects: list of :class:`kloudless.resource.base.Resource` instance
+    :ivar objects: :class:`kloudless.resources.base.LazyResourceSequence` of
+        :class:`kloudless.resource.base.Resource` instance. Use
+        ``self.objects.data`` to access the JSON objects without creating
+        resources
     """
+    resource_class = Resource
+
     def __init__(self, **kwargs):
 
         super(ResourceList, self).__init__(**kwargs)
 
+        self.is_retrieving_events = bool(events_pattern.search(self.url))
+        if self.is_retrieving_events:
+            # Record latest_cursor while self.get_paging_iterator run out
+            self.latest_cursor = None
+        self._load_metadata()
+
+        # Resources of this page are based on self.url without query string
+        self._resource_context = ResponseContext(self.client, self.url, {},
+                                                 shared=True)
+        self._init_objects()
+
+    def _load_metadata(self):
+
         self.api = self.data.get('api', empty)
         self.type = self.data.get('type', empty)
 
-        self.is_retrieving_events = bool(events_pattern.search(self.url))
-
         if self.is_retrieving_events:
             self.cursor = self.data.get('cursor', empty)
-            # Record latest_cursor while self.get_paging_iterator run out
-            self.latest_cursor = None
         else:
             self.page = self.data.get('page', empty)
             self.next_page = self.data.get('next_page', empty)
 
-        self.objects = []
-        for object_data in self.data.get('objects', []):
-            self.objects.append(
-                Resource(data=object_data, url=self.url,
-                         client=self.client)
-            )
+    def _init_objects(self):
+        self.objects = LazyResourceSequence(
+            self.data.get('objects', []), self._create_resource)
+
+    def _create_resource(self, object_data):
+        return self.resource_class(data=object_data,
+                                   context=self._resource_context)
+
+    def _has_objects(self):
+        return bool(self.objects)
 
     def __iter__(self):
         return iter(self.objects)
@@ -254,22 +381,17 @@ class ResourceList(ResponseJson):
 
         return None
 
-    def _get_event_next_page(self):
+    def _get_event_next_page_params(self):
 
-        if self.cursor is empty or str(self.cursor) == '-1' or not self.objects:
+        if (self.cursor is empty or str(self.cursor) == '-1'
+                or not self._has_objects()):
             raise exceptions.NoNextPage(cursor=self.cursor)
 
         params = self._get_query_params_for_pagination()
         params['cursor'] = self.cursor
+        return params
 
-        response = self.client.get(self.url, params=params,
-                                   headers=self.response.request.headers)
-        if not response.objects:
-            raise exceptions.NoNextPage(cursor=self.cursor)
-
-        return response
-
-    def _get_next_page(self):
+    def _get_next_page_params(self):
 
         next_page = self._get_next_page_identifier()
         if next_page is None:
@@ -277,15 +399,49 @@ class ResourceList(ResponseJson):
 
         params = self._get_query_params_for_pagination()
         params['page'] = next_page
+        return params
+
+    def _request_page(self, params, **kwargs):
+        return self.client.get(self.url, params=params,
+                               headers=self.response.request.headers, **kwargs)
+
+    def _get_event_next_page(self):
+
+        params = self._get_event_next_page_params()
+        response = self._request_page(params)
+        if not response._has_objects():
+            raise exceptions.NoNextPage(cursor=self.cursor)
+
+        return response
+
+    def _get_page(self, params):
 
         try:
-            response = self.client.get(self.url, params=params,
-                                       headers=self.response.request.headers)
+            # Page numbers past the last page are requested speculatively
+            response = self._request_page(params, expected_statuses=(404,))
         except exceptions.NotFoundException:
             raise exceptions.NoNextPage()
 
         return response
 
+    def _get_next_page(self):
+        return self._get_page(self._get_next_page_params())
+
+    def _get_page_number_params(self, page):
+
+        params = self._get_query_params_for_pagination()
+        params['page'] = page
+        return params
+
+    def _has_page_numbers(self):
+        """
+        Whether following pages are addressed by predictable integer page
+        numbers, so that they could be requested concurrently.
+        """
+        return (not self.is_retrieving_events
+                and isinstance(self.page, int)
+                and isinstance(self._get_next_page_identifier(), int))
+
     def get_next_page(self):
         """
         Get the resources of the next page, if any.
@@ -298,7 +454,18 @@ class ResourceList(ResponseJson):
         else:
             return self._get_next_page()
 
-    def get_paging_iterator(self, max_resources=None):
+    def _iter_pages(self):
+        """
+        Generator yielding ``self`` and each following page. The
+        :class:`kloudless.exceptions.NoNextPage` raised after the last page is
+        propagated to the caller.
+        """
+        resource_list = self
+        while True:
+            yield resource_list
+            resource_list = resource_list.get_next_page()
+
+    def get_paging_iterator(self, max_resources=None, prefetch=0):
         """
         Generator to iterate thorough all resources under ``self.objects`` and
         all resources in the following page, if any.
@@ -310,21 +477,222 @@ class ResourceList(ResponseJson):
         :param max_resources: the maximum quantity of resources that would be
             contained in the returned generator
 
+        :param int prefetch: the number of following pages to request in a
+            background thread while resources of the current page are being
+            yielded. Pages are fetched sequentially, so this only hides the
+            network latency behind the caller's processing time. Default to
+            ``0`` which fetches the next page on demand
+
         :return: generator that yield :class:`kloudless.resources.base.Resource`
             instance
         """
         counter = 0
-        resource_list = self
+        pages = self._iter_pages()
+        if prefetch:
+            pages = BackgroundIterator(pages, prefetch)
 
-        while resource_list:
-            for resource in resource_list:
-                yield resource
-                counter += 1
-                if max_resources is not None and counter == max_resources:
-                    return
+        try:
+            for resource_list in pages:
+                for resource in resource_list:
+                    yield resource
+                    counter += 1
+                    if max_resources is not None and counter == max_resources:
+                        return
+        except exceptions.NoNextPage as e:
+            if self.is_retrieving_events:
+                self.latest_cursor = e.cursor
+        finally:
+            if prefetch:
+                pages.close()
+
+    def get_pages_parallel(self, workers=4):
+        """
+        Generator to iterate thorough ``self`` and all the following pages in
+        order, requesting up to ``workers`` pages concurrently.
+
+        Concurrent requests are only possible for listings paginated by
+        integer page numbers. Other listings, including events, are paged
+        sequentially. Iteration stops at the first page that is not found,
+        is empty or reports no next page.
+
+        :param int workers: the maximum quantity of pages requested at a time
+
+        :return: generator that yield
+            :class:`kloudless.resources.base.ResourceList` instance
+        """
+        if workers <= 1 or not self._has_page_numbers():
             try:
-                resource_list = resource_list.get_next_page()
-            except exceptions.NoNextPage as e:
-                if self.is_retrieving_events:
-                    self.latest_cursor = e.cursor
-                break
+                for resource_list in self._iter_pages():
+                    yield resource_list
+            except exceptions.NoNextPage:
+                pass
+            return
+
+        yield self
+        if self._get_next_page_identifier() is None:
+            return
+
+        check_concurrency(self.client, workers)
+        page_numbers = itertools.count(self._get_next_page_identifier())
+        executor = ThreadPoolExecutor(max_workers=workers)
+        window = deque()
+        try:
+            for _ in range(workers):
+                window.append(executor.submit(
+                    self._get_page,
+                    self._get_page_number_params(next(page_numbers))))
+
+            while window:
+                try:
+                    resource_list = window.popleft().result()
+                except exceptions.NoNextPage:
+                    break
+                if not resource_list.objects:
+                    break
+                yield resource_list
+                if resource_list._get_next_page_identifier() is None:
+                    break
+                window.append(executor.submit(
+                    self._get_page,
+                    self._get_page_number_params(next(page_numbers))))
+        finally:
+            for future in window:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def iter_all(self, concurrency=4, max_resources=None):
+        """
+        Generator to iterate thorough all resources under ``self.objects`` and
+        all resources in the following pages, requesting up to
+        ``concurrency`` pages at a time. Resources are yielded in order.
+
+        See :func:`kloudless.resources.base.ResourceList.get_pages_parallel`.
+
+        :param int concurrency: the maximum quantity of pages requested at a
+            time
+
+        :param max_resources: the maximum quantity of resources that would be
+            contained in the returned generator
+
+        :return: generator that yield
+            :class:`kloudless.resources.base.Resource` instance
+        """
+        counter = 0
+        pages = self.get_pages_parallel(workers=concurrency)
+        try:
+            for resource_list in pages:
+                for resource in resource_list:
+                    yield resource
+                    counter += 1
+                    if max_resources is not None and counter == max_resources:
+                        return
+        finally:
+            pages.close()
+
+
+class StreamingResourceList(ResourceList):
+    """
+    :class:`kloudless.resources.base.ResourceList` parsed incrementally from
+    the response body, so that the first resources of a large page are
+    available while the rest is still being received, and the page is never
+    held in memory as a whole. Returned by
+    :func:`kloudless.client.Client.request` if ``stream_objects`` is ``True``.
+
+    Iterating yields each resource as soon as its object is parsed. Resources
+    are not kept, so a page can only be iterated once and ``objects`` is not
+    available. Other fields such as ``cursor``, ``page`` or ``next_page`` are
+    ``empty`` until they are parsed, then added to ``self.data``. They are all
+    available once the iteration is over or :func:`finish` is called.
+
+    Following pages requested by ``get_next_page`` or
+    ``get_paging_iterator`` are streamed as well. Since page numbers and
+    cursors are only known once a page is parsed, ``get_pages_parallel`` and
+    ``iter_all`` request pages sequentially, and ``get_paging_iterator``
+    requests the next page once the current one is exhausted.
+
+    See :func:`kloudless.jsonlib.iter_object_list`.
+
+    **Instance attributes**
+
+    :ivar int count: Number of objects parsed so far
+    """
+    def __init__(self, **kwargs):
+        kwargs.setdefault('data', {})
+        super(StreamingResourceList, self).__init__(**kwargs)
+
+    def _init_objects(self):
+        self.count = 0
+        self._objects = self._parse()
+
+    def _parse(self):
+        # chunk_size=None yields the data as soon as it is received
+        chunks = self.response.iter_content(chunk_size=None)
+        try:
+            for name, value in jsonlib.iter_object_list(chunks):
+                if name == jsonlib.OBJECTS_ITEM:
+                    self.count += 1
+                    yield value
+                else:
+                    self.data[name] = value
+                    self._load_metadata()
+        finally:
+            self.response.close()
+
+    def __iter__(self):
+        for object_data in self._objects:
+            yield self._create_resource(object_data)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def finish(self):
+        """
+        Parse the rest of the body, skipping the objects that are not
+        iterated yet.
+        """
+        for _ in self._objects:
+            pass
+
+    def close(self):
+        """
+        Stop parsing and release the connection.
+        """
+        self._objects.close()
+        self.response.close()
+
+    def _has_objects(self):
+        self.finish()
+        return self.count > 0
+
+    def get_paging_iterator(self, max_resources=None, prefetch=0):
+        """
+        See :func:`kloudless.resources.base.ResourceList.get_paging_iterator`.
+        ``prefetch`` is ignored, since the next page cannot be requested
+        before the current one is parsed by the caller's iteration.
+        """
+        return super(StreamingResourceList, self).get_paging_iterator(
+            max_resources=max_resources)
+
+    def _has_page_numbers(self):
+        return False
+
+    def _request_page(self, params, **kwargs):
+        kwargs['stream_objects'] = True
+        return super(StreamingResourceList, self)._request_page(params,
+                                                                **kwargs)
+
+    def _get_event_next_page(self):
+        # Whether the next page is empty is only known once it is iterated
+        return self._request_page(self._get_event_next_page_params())
+
+    def _get_next_page_params(self):
+        self.finish()
+        return super(StreamingResourceList, self)._get_next_page_params()
+
+    def _get_self(self):
+        request = self.response.request
+        return self.get(request.url, headers=request.headers,
+                        stream_objects=True)
@@ -0,0 +1,149 @@
+from __future__ import unicode_literals
+
+import random
+import time
+from email.utils import mktime_tz, parsedate_tz
+
+from .util import get_config
+
+
+class RetryPolicy(object):
+    """
+    Policy describing how failed requests are retried by
+    :class:`kloudless.client.Session`.
+
+    Requests answered with ``429`` are always safe to replay because the server
+    did not process them. Other retryable status codes (``5xx`` by default) are
+    only retried for idempotent methods.
+
+    **Instance attributes**
+
+    :ivar int max_attempts: Maximum number of attempts including the first one
+    :ivar float backoff_factor: Base delay in seconds of the exponential
+        backoff curve. The delay before retry ``n`` is
+        ``backoff_factor * 2 ** (n - 1)``
+    :ivar float max_backoff: Upper bound of a single delay, including the
+        ones requested by ``Retry-After``
+    :ivar float jitter: Fraction of the delay that is randomized. ``0`` turns
+        jitter off and ``1`` gives "full jitter"
+    :ivar float deadline: Maximum seconds spent on one request including all
+        retries and delays, or ``None`` for no limit
+    :ivar bool respect_retry_after: Whether to honor the ``Retry-After``
+        response header
+    :ivar set status_codes: Status codes that are retried
+    :ivar set idempotent_methods: Methods that are retried on non-``429``
+        status codes
+    """
+    DEFAULT_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+    DEFAULT_IDEMPOTENT_METHODS = frozenset(
+        ['GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS', 'TRACE'])
+
+    def __init__(self, max_attempts=3, backoff_factor=0.5, max_backoff=30,
+                 jitter=1.0, deadline=None, respect_retry_after=True,
+                 status_codes=None, idempotent_methods=None):
+        """
+        :param int max_attempts: Maximum number of attempts
+        :param float backoff_factor: Base delay of the exponential backoff
+        :param float max_backoff: Upper bound of a single delay
+        :param float jitter: Randomized fraction of the delay, from 0 to 1
+        :param float deadline: Total seconds allowed for one request
+        :param bool respect_retry_after: Honor the ``Retry-After`` header
+        :param status_codes: Iterable of retryable status codes
+        :param idempotent_methods: Iterable of idempotent http methods
+        """
+        self.max_attempts = max_attempts
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.deadline = deadline
+        self.respect_retry_after = respect_retry_after
+        self.status_codes = frozenset(
+            self.DEFAULT_STATUS_CODES if status_codes is None
+            else status_codes)
+        self.idempotent_methods = frozenset(
+            m.upper() for m in (self.DEFAULT_IDEMPOTENT_METHODS
+                                if idempotent_methods is None
+                                else idempotent_methods))
+
+    def is_retryable(self, method, status_code):
+        """
+        Whether a response with ``status_code`` to a ``method`` request may be
+        replayed.
+        """
+        if status_code not in self.status_codes:
+            return False
+        if status_code == 429:
+            return True
+        return method.upper() in self.idempotent_methods
+
+    @staticmethod
+    def parse_retry_after(value):
+        """
+        Parse a ``Retry-After`` header value, which is either delay seconds or
+        an http date, into delay seconds. Return ``None`` if not parsable.
+        """
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        parsed = parsedate_tz(value)
+        if parsed is None:
+            return None
+        return max(0.0, mktime_tz(parsed) - time.time())
+
+    def get_backoff(self, attempt):
+        """
+        Return the jittered exponential delay before retry number ``attempt``
+        (starting from 1).
+        """
+        delay = min(self.max_backoff,
+                    self.backoff_factor * (2 ** (attempt - 1)))
+        if self.jitter:
+            delay -= delay * self.jitter * random.random()
+        return delay
+
+    def get_delay(self, attempt, response):
+        """
+        Return the delay before retry number ``attempt`` of ``response``.
+        ``Retry-After`` takes precedence over the backoff curve when present,
+        and is capped by ``max_backoff`` as well.
+        """
+        if self.respect_retry_after:
+            retry_after = self.parse_retry_after(
+                response.headers.get('Retry-After'))
+            if retry_after is not None:
+                return min(self.max_backoff, retry_after)
+        return self.get_backoff(attempt)
+
+    def get_retry_delay(self, attempt, method, response, started_at):
+        """
+        Decide whether the ``attempt``-th response should be retried.
+
+        :param int attempt: Number of attempts made so far
+        :param str method: Http method
+        :param response: The latest http response
+        :param float started_at: ``time.time()`` of the first attempt
+
+        :return: (float) Seconds to sleep before the next attempt, or ``None``
+            if the response should be returned to the caller as is
+        """
+        if attempt >= self.max_attempts:
+            return None
+        if not self.is_retryable(method, response.status_code):
+            return None
+        delay = self.get_delay(attempt, response)
+        if (self.deadline is not None
+                and time.time() + delay - started_at > self.deadline):
+            return None
+        return delay
+
+
+def get_retry_policy(overwrite=None):
+    """
+    Return ``overwrite`` if given, otherwise the policy from
+    ``configuration['retry_policy']``. ``False`` disables retrying.
+    """
+    policy = get_config('retry_policy', overwrite)
+    return policy or None
@@ -0,0 +1,607 @@
+from __future__ import unicode_literals
+
+import io
+import json
+import mmap
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import six
+
+from . import exceptions
+from .pool import check_concurrency
+from .util import logger, write_json_atomic
+
+content_range_pattern = re.compile(r'bytes\s+(\d+)-(\d+)/(\d+|\*)')
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+STREAM_CHUNK_SIZE = 64 * 1024
+
+BUFFER_TYPES = (bytes, bytearray, memoryview, mmap.mmap)
+
+# errors after which a part is transferred again
+RETRYABLE_ERRORS = (requests.RequestException, exceptions.RateLimitException,
+                    exceptions.ServerException, exceptions.TransferFailed)
+
+
+class StreamingBody(object):
+    """
+    Request body that is read in chunks while it is being sent, so the whole
+    content never has to be held in memory.
+
+    ``bytes``, ``bytearray``, ``memoryview`` and ``mmap`` sources are sent as
+    ``memoryview`` slices without copying. The view of the source is released
+    once the body is read to the end or closed, so that an ``mmap`` can be
+    closed after the request. File objects are read from their
+    current position and iterators of bytes are consumed on demand. The body
+    is sent with ``Content-Length`` when its size is known, otherwise with
+    chunked transfer encoding.
+
+    **Instance attributes**
+
+    :ivar int size: Size in bytes, or ``None`` if unknown
+    :ivar int bytes_read: Bytes read by the http library so far
+    """
+    def __init__(self, source, size=None, chunk_size=STREAM_CHUNK_SIZE,
+                 progress_callback=None):
+        """
+        :param source: Bytes-like object, ``mmap``, file object opened in
+            binary mode or iterator of bytes
+        :param int size: Bytes to send from ``source``. Required for
+            iterators to send ``Content-Length``. Default to the rest of
+            ``source``
+        :param int chunk_size: Bytes per chunk when the body is iterated
+        :param progress_callback: Callable that takes the number of bytes
+            sent so far and ``size``
+        """
+        self.chunk_size = chunk_size
+        self.progress_callback = progress_callback
+        self.bytes_read = 0
+        self._source = None
+        self._view = None
+        self._file = None
+        self._iterator = None
+        self._buffer = b''
+
+        if isinstance(source, BUFFER_TYPES):
+            self._source = source
+            self._view = self._get_view(size)
+            size = len(self._view)
+        elif hasattr(source, 'read'):
+            self._file = source
+            self._start = source.tell() if self._is_file_seekable() else None
+            if size is None:
+                size = self._get_file_size()
+        else:
+            self._iterator = iter(source)
+
+        self.size = size
+        if size is not None:
+            # requests uses `len` for the Content-Length header
+            self.len = size
+
+    def _get_view(self, size):
+        view = memoryview(self._source)
+        if view.ndim != 1 or view.itemsize != 1:
+            view = view.cast('B')
+        if size is not None:
+            view = view[:size]
+        return view
+
+    def _release(self):
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+
+    def _is_file_seekable(self):
+        seekable = getattr(self._file, 'seekable', None)
+        if seekable is not None:
+            return seekable()
+        return hasattr(self._file, 'seek') and hasattr(self._file, 'tell')
+
+    def _get_file_size(self):
+        try:
+            return os.fstat(self._file.fileno()).st_size - self._start
+        except (AttributeError, OSError, TypeError, ValueError):
+            pass
+        if self._start is None:
+            return None
+        self._file.seek(0, os.SEEK_END)
+        size = self._file.tell() - self._start
+        self._file.seek(self._start)
+        return size
+
+    def seekable(self):
+        if self._file is not None:
+            return self._start is not None
+        return self._source is not None
+
+    def tell(self):
+        return self.bytes_read
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        """
+        Move to ``offset`` bytes from the start of the body. Used by requests
+        to rewind the body before sending it again.
+        """
+        if whence != os.SEEK_SET or not self.seekable():
+            raise io.UnsupportedOperation("The body is not seekable.")
+        if self._file is not None:
+            self._file.seek(self._start + offset)
+        self.bytes_read = offset
+        return offset
+
+    def _read_iterator(self, n):
+        chunks = [self._buffer]
+        length = len(self._buffer)
+        while n < 0 or length < n:
+            try:
+                chunk = next(self._iterator)
+            except StopIteration:
+                break
+            chunks.append(chunk)
+            length += len(chunk)
+        data = b''.join(chunks)
+        if n < 0:
+            self._buffer = b''
+            return data
+        self._buffer = data[n:]
+        return data[:n]
+
+    def read(self, n=-1):
+        if n is None:
+            n = -1
+        if self.size is not None:
+            remaining = self.size - self.bytes_read
+            n = remaining if n < 0 else min(n, remaining)
+
+        if self._source is not None:
+            if self._view is None:
+                # rewound after the view was released
+                self._view = self._get_view(self.size)
+            data = self._view[self.bytes_read:self.bytes_read + n]
+            if self.bytes_read + len(data) >= self.size:
+                self._release()
+        elif self._file is not None:
+            data = self._file.read(n)
+        else:
+            data = self._read_iterator(n)
+
+        if data:
+            self.bytes_read += len(data)
+            if self.progress_callback is not None:
+                self.progress_callback(self.bytes_read, self.size)
+        return data
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self.chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self):
+        """
+        Release the view of a buffer source. The body may still be read
+        again after a :func:`seek`.
+        """
+        self._release()
+
+
+def get_streaming_body(data, progress_callback=None):
+    """
+    Wrap ``data`` into a :class:`StreamingBody` if it should be streamed,
+    i.e. it is a bytes-like object, ``mmap``, file object or iterator of bytes
+    and ``progress_callback`` is requested or ``requests`` could not send it
+    as is. Form data and other values are returned unchanged.
+    """
+    if data is None or isinstance(data, StreamingBody):
+        return data
+    if isinstance(data, (bytearray, memoryview, mmap.mmap)):
+        return StreamingBody(data, progress_callback=progress_callback)
+    if progress_callback is None or isinstance(
+            data, (six.text_type, list, tuple, dict)):
+        return data
+    if (isinstance(data, bytes) or hasattr(data, 'read')
+            or hasattr(data, '__iter__')):
+        return StreamingBody(data, progress_callback=progress_callback)
+    return data
+
+
+class FileWriter(object):
+    """
+    Writes chunks at given offsets of a seekable file object from multiple
+    threads.
+    """
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self._lock = threading.Lock()
+
+    def write(self, offset, data):
+        with self._lock:
+            self.fileobj.seek(offset)
+            self.fileobj.write(data)
+
+
+class DownloadPart(object):
+    """
+    A byte range ``[start, end]`` of a download and the progress made on it.
+    """
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+        self.offset = start  # the next byte to download
+
+    @property
+    def is_done(self):
+        return self.offset > self.end
+
+    def __repr__(self):
+        return '<DownloadPart: bytes={}-{}, offset={}>'.format(
+            self.start, self.end, self.offset)
+
+
+def _open_destination(dest, size, resume=False):
+    if isinstance(dest, six.string_types):
+        fileobj = open(dest, 'r+b' if resume else 'w+b')
+        should_close = True
+    else:
+        fileobj = dest
+        should_close = False
+    if size is not None:
+        fileobj.seek(0)
+        fileobj.truncate(size)  # preallocate
+    return fileobj, should_close
+
+
+def _get_range_size(response):
+    """
+    Return the total size if ``response`` is a ``206`` partial response,
+    otherwise ``None``.
+    """
+    if response.status_code != 206:
+        return None
+    match = content_range_pattern.match(
+        response.headers.get('Content-Range', ''))
+    if not match or match.group(3) == '*':
+        return None
+    return int(match.group(3))
+
+
+def _download_part(client, path, part, writer, max_retries, kwargs):
+    """
+    Download the remaining bytes of ``part``, resuming from the last written
+    offset after a failure.
+    """
+    headers = dict(kwargs.pop('headers', None) or {})
+    failures = 0
+    while not part.is_done:
+        headers['Range'] = 'bytes={}-{}'.format(part.offset, part.end)
+        try:
+            response = client.get(path, headers=headers, stream=True,
+                                  get_raw_response=True, **kwargs)
+            try:
+                if response.status_code != 206:
+                    raise exceptions.TransferFailed(
+                        "Range request to {} got status {}".format(
+                            response.url, response.status_code))
+                for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                    chunk = chunk[:part.end + 1 - part.offset]
+                    writer.write(part.offset, chunk)
+                    part.offset += len(chunk)
+                    if part.is_done:
+                        break
+            finally:
+                response.close()
+            if not part.is_done:
+                raise exceptions.TransferFailed(
+                    "Connection closed before {!r} is complete".format(part))
+        except RETRYABLE_ERRORS as e:
+            failures += 1
+            if failures > max_retries:
+                raise
+            logger.warning("Downloading {!r} of {} failed: {}. "
+                           "Resuming.".format(part, path, e))
+    return part
+
+
+def _download_parts(client, path, download_parts, fileobj, should_close,
+                    workers, max_retries, kwargs):
+
+    writer = FileWriter(fileobj)
+    check_concurrency(client, workers)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = [
+                executor.submit(_download_part, client, path, part, writer,
+                                max_retries, dict(kwargs))
+                for part in download_parts if not part.is_done]
+        errors = [f.exception() for f in futures if f.exception()]
+    finally:
+        if should_close:
+            fileobj.close()
+
+    failed_parts = [part for part in download_parts if not part.is_done]
+    if failed_parts:
+        error = exceptions.TransferFailed(
+            "Failed to download {} of {} parts of {}: {}".format(
+                len(failed_parts), len(download_parts), path, errors[0]))
+        error.parts = failed_parts
+        raise error
+    return sum(part.end - part.start + 1 for part in download_parts)
+
+
+def download_to(client, path, dest, parts=4, part_size=None, max_retries=3,
+                resume_parts=None, **kwargs):
+    """
+    Download the content of ``path`` to ``dest`` with concurrent http Range
+    requests. Each part is written at its offset of the preallocated
+    destination file and a failed part is resumed from the last byte written
+    instead of being downloaded again.
+
+    Falls back to one streamed request if the upstream service does not
+    support Range requests.
+
+    :param client: :class:`kloudless.client.Client` or its subclass
+    :param str path: Request path, e.g. ``storage/files/{id}/contents``
+    :param dest: File path or seekable file object opened in binary mode
+    :param int parts: Maximum number of concurrent requests
+    :param int part_size: Bytes per Range request. Default to the file size
+        divided by ``parts``
+    :param int max_retries: Retries of each part on connection errors or
+        failed responses
+    :param list resume_parts: ``parts`` of a previous
+        :class:`kloudless.exceptions.TransferFailed` to download only the
+        incomplete parts into the same ``dest``
+    :param kwargs: kwargs passed to :func:`kloudless.client.Client.get`
+
+    :return: (int) Size in bytes of the downloaded content, or of
+        ``resume_parts`` if given
+    :raise: :class:`kloudless.exceptions.TransferFailed` with the incomplete
+        parts in ``parts`` attribute
+    """
+    headers = dict(kwargs.pop('headers', None) or {})
+    if resume_parts:
+        fileobj, should_close = _open_destination(dest, None, resume=True)
+        return _download_parts(client, path, resume_parts, fileobj,
+                               should_close, parts, max_retries,
+                               dict(kwargs, headers=headers))
+
+    headers['Range'] = 'bytes=0-0'
+    try:
+        response = client.get(path, headers=headers, stream=True,
+                              get_raw_response=True, **kwargs)
+    except exceptions.APIException as e:
+        if e.status != 416:
+            raise
+        # Range Not Satisfiable for an empty file
+        fileobj, should_close = _open_destination(dest, 0)
+        if should_close:
+            fileobj.close()
+        return 0
+    size = _get_range_size(response)
+    del headers['Range']
+
+    if size is None:
+        fileobj, should_close = _open_destination(dest, None)
+        try:
+            written = 0
+            for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                fileobj.write(chunk)
+                written += len(chunk)
+            return written
+        finally:
+            response.close()
+            if should_close:
+                fileobj.close()
+    response.close()
+
+    part_size = part_size or max(1, -(-size // max(1, parts)))
+    download_parts = [DownloadPart(start, min(start + part_size, size) - 1)
+                      for start in range(0, size, part_size)]
+
+    fileobj, should_close = _open_destination(dest, size)
+    return _download_parts(client, path, download_parts, fileobj,
+                           should_close, parts, max_retries,
+                           dict(kwargs, headers=headers))
+
+
+class MultipartUpload(object):
+    """
+    Uploads a large file through the `multipart upload endpoints
+    <https://developers.kloudless.com/docs/latest/storage#multipart-uploads>`_.
+
+    Parts of a file path are streamed from disk. Parts of a file object are
+    read one at a time by each worker, so memory usage is bounded by
+    ``workers * part_size`` regardless of the file size. If
+    ``checkpoint_path`` is given, the upload session and the completed part
+    numbers are saved there after each part, and a later upload of the same
+    file with the same ``checkpoint_path`` uploads only the missing parts.
+
+    **Instance attributes**
+
+    :ivar session: :class:`kloudless.resources.base.Resource` of the upload
+        session, available once the upload is initialized
+    :ivar set completed_parts: Part numbers already uploaded
+    """
+    def __init__(self, account, source, parent_id, name, size=None,
+                 overwrite=False, workers=4, checkpoint_path=None,
+                 max_retries=3, **params):
+        """
+        :param account: :class:`kloudless.account.Account`
+        :param source: File path or seekable file object opened in binary mode
+        :param str parent_id: ID of the destination folder
+        :param str name: Name of the uploaded file
+        :param int size: File size. Default to the size of ``source``
+        :param bool overwrite: Whether to overwrite an existing file
+        :param int workers: Maximum number of parts uploaded concurrently
+        :param str checkpoint_path: Path of the JSON file used to resume the
+            upload
+        :param int max_retries: Retries of each part on connection errors or
+            failed responses
+        :param params: Additional query parameters to initialize the upload
+        """
+        self.account = account
+        self.source = source
+        self.parent_id = parent_id
+        self.name = name
+        self.size = size if size is not None else self._get_source_size()
+        self.overwrite = overwrite
+        self.workers = workers
+        self.checkpoint_path = checkpoint_path
+        self.max_retries = max_retries
+        self.params = params
+
+        self.session = None
+        self.completed_parts = set()
+        self._lock = threading.Lock()
+
+    def _get_source_size(self):
+        if isinstance(self.source, six.string_types):
+            return os.path.getsize(self.source)
+        position = self.source.tell()
+        self.source.seek(0, os.SEEK_END)
+        size = self.source.tell()
+        self.source.seek(position)
+        return size
+
+    @property
+    def url(self):
+        return 'storage/multipart/{}'.format(self.session.data['id'])
+
+    @property
+    def part_size(self):
+        return int(self.session.data['part_size'])
+
+    @property
+    def part_count(self):
+        return max(1, -(-self.size // self.part_size))
+
+    def _load_checkpoint(self):
+        if not self.checkpoint_path or not os.path.exists(
+                self.checkpoint_path):
+            return None
+        with open(self.checkpoint_path) as f:
+            checkpoint = json.load(f)
+        if (checkpoint.get('parent_id') != self.parent_id
+                or checkpoint.get('name') != self.name
+                or checkpoint.get('size') != self.size):
+            return None
+        return checkpoint
+
+    def _save_checkpoint(self):
+        if not self.checkpoint_path:
+            return
+        write_json_atomic(self.checkpoint_path, {
+            'session_id': self.session.data['id'],
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'size': self.size,
+            'completed_parts': sorted(self.completed_parts),
+        })
+
+    def _init_session(self):
+        checkpoint = self._load_checkpoint()
+        if checkpoint:
+            try:
+                self.session = self.account.get(
+                    'storage/multipart/{}'.format(checkpoint['session_id']))
+            except exceptions.NotFoundException:
+                logger.info("Upload session {} expired. Starting over.".format(
+                    checkpoint['session_id']))
+            else:
+                self.completed_parts = set(checkpoint['completed_parts'])
+                return
+
+        params = dict(self.params, overwrite=str(self.overwrite).lower())
+        self.session = self.account.post(
+            'storage/multipart', params=params,
+            json={'parent_id': self.parent_id, 'name': self.name,
+                  'size': self.size})
+        self.completed_parts = set()
+        self._save_checkpoint()
+
+    def _send_part(self, part_number):
+        offset = (part_number - 1) * self.part_size
+        length = min(self.part_size, self.size - offset)
+        kwargs = {
+            'params': {'part_number': part_number},
+            'headers': {'Content-Type': 'application/octet-stream'},
+        }
+        if isinstance(self.source, six.string_types):
+            # Stream the part from a dedicated file handle
+            with open(self.source, 'rb') as f:
+                f.seek(offset)
+                self.account.put(self.url, StreamingBody(f, size=length),
+                                 **kwargs)
+            return
+
+        # A shared file object cannot be read by several threads at a time
+        with self._lock:
+            self.source.seek(offset)
+            data = self.source.read(length)
+        self.account.put(self.url, data, **kwargs)
+
+    def _upload_part(self, part_number):
+        failures = 0
+        while True:
+            try:
+                self._send_part(part_number)
+            except RETRYABLE_ERRORS as e:
+                failures += 1
+                if failures > self.max_retries:
+                    raise
+                logger.warning("Uploading part {} of {} failed: {}. "
+                               "Retrying.".format(part_number, self.name, e))
+            else:
+                break
+
+        with self._lock:
+            self.completed_parts.add(part_number)
+            self._save_checkpoint()
+
+    def upload(self):
+        """
+        Upload the missing parts and complete the upload.
+
+        :return: :class:`kloudless.resources.base.Resource` of the file
+        :raise: :class:`kloudless.exceptions.TransferFailed` with the missing
+            part numbers in ``parts`` attribute
+        """
+        self._init_session()
+
+        missing_parts = [n for n in range(1, self.part_count + 1)
+                         if n not in self.completed_parts]
+        workers = self.workers
+        if not self.session.data.get('parallel_uploads', True):
+            workers = 1
+
+        check_concurrency(self.account, workers)
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = [executor.submit(self._upload_part, n)
+                       for n in missing_parts]
+        errors = [f.exception() for f in futures if f.exception()]
+        if errors:
+            error = exceptions.TransferFailed(
+                "Failed to upload {} of {} parts of {}: {}".format(
+                    len(errors), self.part_count, self.name, errors[0]))
+            error.parts = [n for n in missing_parts
+                           if n not in self.completed_parts]
+            raise error
+
+        resource = self.account.post('{}/complete'.format(self.url))
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        return resource
+
+    def abort(self):
+        """
+        Abort the upload session and remove the checkpoint.
+        """
+        if self.session is not None:
+            self.account.delete(self.url)
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
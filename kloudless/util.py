@@ -1,12 +1,21 @@
 from __future__ import unicode_literals
 
+import json
 import logging
+import os
+import sys
+import tempfile
+import threading
 from datetime import datetime
 
 import six
 from dateutil import parser
+from six.moves import queue
+from six.moves.urllib.parse import parse_qsl, urlparse, urlunparse
 
+from .cache import LRUCache, memoize
 from .config import configuration
+from .re_patterns import full_account_pattern, primary_calendar_alias
 
 if six.PY2:
     from urlparse import urljoin
@@ -52,6 +61,17 @@ def get_config(name, overwrite=None):
     return configuration.get(name)
 
 
+def _get_url_cache_size():
+    return get_config('url_cache_size')
+
+
+url_join_cache = LRUCache(maxsize=_get_url_cache_size)
+split_query_cache = LRUCache(maxsize=_get_url_cache_size)
+account_url_cache = LRUCache(maxsize=_get_url_cache_size)
+calendar_url_cache = LRUCache(maxsize=_get_url_cache_size)
+
+
+@memoize(url_join_cache)
 def url_join(prefix, suffix):
 
     if not suffix:
@@ -63,6 +83,63 @@ def url_join(prefix, suffix):
     return urljoin('{}/'.format(prefix), suffix.lstrip('/'))
 
 
+@memoize(split_query_cache)
+def split_query(url):
+    """
+    Split ``url`` into the url without query string and the query string.
+    """
+    parse_result = urlparse(url)
+    return urlunparse(parse_result._replace(query='')), parse_result.query
+
+
+def get_query_items(query, params=None):
+    """
+    Return the sorted ``(name, value)`` tuple of the query string ``query``
+    and of the query parameters ``params`` given as to
+    :func:`requests.request`, so that equivalent queries compare equal.
+    """
+    items = parse_qsl(query)
+    if params:
+        if isinstance(params, dict):
+            params = params.items()
+        for name, value in params:
+            values = value if isinstance(value, (list, tuple)) else [value]
+            items.extend((name, '{}'.format(v)) for v in values)
+    return tuple(sorted(items))
+
+
+@memoize(account_url_cache)
+def get_account_url(url):
+    """
+    Return the ``.../v{version}/accounts/{id}`` prefix of ``url``, or ``None``.
+    """
+    match = full_account_pattern.match(url)
+    return match.group(0) if match else None
+
+
+@memoize(calendar_url_cache)
+def is_primary_calendar_url(url):
+    """
+    Whether ``url`` ends with the ``cal/calendars/primary`` alias.
+    """
+    return bool(primary_calendar_alias.search(url))
+
+
+def get_url_cache_info():
+    """
+    Return the statistics of the url caches, which are sized by
+    ``configuration['url_cache_size']``.
+
+    :return: (dict) :func:`kloudless.cache.LRUCache.info` of each cache
+    """
+    return {
+        'url_join': url_join_cache.info(),
+        'split_query': split_query_cache.info(),
+        'get_account_url': account_url_cache.info(),
+        'is_primary_calendar_url': calendar_url_cache.info(),
+    }
+
+
 def construct_kloudless_endpoint(path='', base_url=None, api_version=None):
 
     base_url = get_config('base_url', base_url)
@@ -70,3 +147,79 @@ def construct_kloudless_endpoint(path='', base_url=None, api_version=None):
     prefix = url_join(base_url, 'v{}'.format(api_version))
 
     return url_join(prefix, path)
+
+
+# os.replace is not available in Python 2, where os.rename is only atomic on
+# POSIX
+_replace = getattr(os, 'replace', os.rename)
+
+
+def write_json_atomic(path, data):
+    """
+    Dump ``data`` as JSON to ``path`` through a temporary file, so that
+    readers never see a partially written file.
+    """
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(path)))
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f)
+    _replace(tmp_path, path)
+
+
+class BackgroundIterator(object):
+    """
+    Iterator that consumes ``iterable`` in a daemon thread and buffers up to
+    ``size`` items ahead of the caller. An exception raised by ``iterable`` is
+    re-raised to the caller once the items before it are consumed.
+    """
+    _done = object()
+
+    def __init__(self, iterable, size=1):
+        self._queue = queue.Queue(maxsize=max(1, size))
+        self._stopped = threading.Event()
+        self._finished = False
+        thread = threading.Thread(target=self._run, args=(iter(iterable),))
+        thread.daemon = True
+        thread.start()
+
+    def _put(self, item):
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _run(self, iterator):
+        try:
+            for item in iterator:
+                if not self._put((item, None)):
+                    return
+        except Exception:
+            self._put((self._done, sys.exc_info()))
+        else:
+            self._put((self._done, None))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._finished:
+            raise StopIteration
+        item, exc_info = self._queue.get()
+        if item is self._done:
+            self._finished = True
+            if exc_info:
+                six.reraise(*exc_info)
+            raise StopIteration
+        return item
+
+    next = __next__
+
+    def close(self):
+        """
+        Stop consuming ``iterable``. Items already buffered are dropped.
+        """
+        self._finished = True
+        self._stopped.set()
@@ -0,0 +1,192 @@
+"""
+Concurrent traversal of the storage tree of an account.
+"""
+from __future__ import unicode_literals
+
+import sys
+import threading
+
+import six
+from six.moves import queue
+
+from . import exceptions
+from .batch import RateLimitGate
+from .pool import check_concurrency
+from .util import logger
+
+
+class TreeWalker(object):
+    """
+    Lists a folder and all its subfolders with a bounded pool of threads.
+
+    Folders waiting to be listed are kept in a work queue shared by
+    ``concurrency`` workers. Each worker lists a folder page by page and
+    queues its subfolders, so that folders of all branches are listed in
+    parallel. The queue is consumed last in first out to keep it short on
+    deep trees. A ``429`` response pauses all workers for the ``Retry-After``
+    delay, or an exponential backoff, before the page is requested again.
+
+    Resources are yielded as their page is received, so the order of the
+    items of different folders is not deterministic. A folder that is not
+    found, e.g. because it was deleted during the walk, is skipped. Other
+    errors stop the walk and are raised to the caller.
+
+    .. code:: python
+
+        for path, resource in account.walk(concurrency=8):
+            print(path, resource.data['size'])
+
+    **Instance attributes**
+
+    :ivar account: :class:`kloudless.account.Account`
+    :ivar str folder_id: ID of the folder walked
+    :ivar int concurrency: Maximum number of folders listed at a time
+    :ivar int max_depth: Depth of the deepest items yielded, ``1`` for the
+        items of ``folder_id`` only. ``None`` for no limit
+    :ivar int folders_listed: Number of folders listed by the last walk
+    """
+    FOLDER_CONTENTS_PATH = 'storage/folders/{}/contents'
+
+    _done = object()
+
+    def __init__(self, account, folder_id='root', concurrency=4,
+                 max_depth=None, buffer_size=1000, max_rate_limit_retries=5,
+                 backoff_factor=1.0, **kwargs):
+        """
+        :param account: :class:`kloudless.account.Account`
+        :param str folder_id: ID of the folder to walk
+        :param int concurrency: Maximum number of folders listed at a time
+        :param int max_depth: Depth of the deepest items yielded, ``1`` for
+            the items of ``folder_id`` only. ``None`` for no limit
+        :param int buffer_size: Maximum number of items received ahead of the
+            caller
+        :param int max_rate_limit_retries: Maximum number of retries of a page
+            answered with ``429``
+        :param float backoff_factor: Base delay in seconds after a ``429``
+            without ``Retry-After``, doubled on each retry
+        :param kwargs: kwargs passed to :func:`kloudless.client.Client.get`
+            for each folder, e.g. ``params={'page_size': 1000}``
+        """
+        self.account = account
+        self.folder_id = folder_id
+        self.concurrency = concurrency
+        self.max_depth = max_depth
+        self.buffer_size = buffer_size
+        self.max_rate_limit_retries = max_rate_limit_retries
+        self.backoff_factor = backoff_factor
+        self.kwargs = kwargs
+        self.folders_listed = 0
+
+    def __iter__(self):
+        return self.walk()
+
+    def _put(self, item):
+        while not self._stopped.is_set():
+            try:
+                self._output.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _add_folder(self, path, folder_id, depth):
+        with self._condition:
+            self._folders.append((path, folder_id, depth))
+            self._pending += 1
+            self._condition.notify()
+
+    def _call(self, func, *args, **kwargs):
+        return self._gate.call(lambda: func(*args, **kwargs),
+                               self.max_rate_limit_retries,
+                               self.backoff_factor)
+
+    def _list_folder(self, path, folder_id, depth):
+        try:
+            page = self._call(self.account.get,
+                              self.FOLDER_CONTENTS_PATH.format(folder_id),
+                              **self.kwargs)
+        except exceptions.NotFoundException:
+            logger.warning("Folder '{}' is not found. Skipping {}".format(
+                folder_id, path or '/'))
+            return
+
+        while True:
+            for resource in page:
+                resource_path = '{}/{}'.format(path, resource.data.get('name'))
+                if (resource.data.get('type') == 'folder'
+                        and (self.max_depth is None
+                             or depth < self.max_depth)):
+                    self._add_folder(resource_path, resource.data['id'],
+                                     depth + 1)
+                if not self._put((resource_path, resource)):
+                    return
+            try:
+                page = self._call(page.get_next_page)
+            except exceptions.NoNextPage:
+                return
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while (not self._folders and self._pending
+                       and not self._stopped.is_set()):
+                    self._condition.wait()
+                if self._stopped.is_set() or not self._pending:
+                    return
+                path, folder_id, depth = self._folders.pop()
+
+            try:
+                self._list_folder(path, folder_id, depth)
+            except Exception:
+                self._put((self._done, sys.exc_info()))
+                self._stop()
+                return
+
+            with self._condition:
+                self._pending -= 1
+                self.folders_listed += 1
+                finished = not self._pending
+                if finished:
+                    self._condition.notify_all()
+            if finished:
+                self._put((self._done, None))
+
+    def _stop(self):
+        self._stopped.set()
+        with self._condition:
+            self._condition.notify_all()
+
+    def walk(self):
+        """
+        Generator walking the tree of ``self.folder_id``.
+
+        :return: generator that yield ``(path, resource)`` tuples, where
+            ``path`` is the path of the
+            :class:`kloudless.resources.base.Resource` relative to
+            ``self.folder_id``, e.g. ``/Documents/report.pdf``
+        """
+        self._output = queue.Queue(maxsize=max(1, self.buffer_size))
+        self._folders = []
+        self._pending = 0
+        self._condition = threading.Condition()
+        self._stopped = threading.Event()
+        self._gate = RateLimitGate()
+        self.folders_listed = 0
+
+        check_concurrency(self.account, self.concurrency)
+        self._add_folder('', self.folder_id, 1)
+        for _ in range(max(1, self.concurrency)):
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+
+        try:
+            while True:
+                path, value = self._output.get()
+                if path is self._done:
+                    if value:
+                        six.reraise(*value)
+                    return
+                yield path, value
+        finally:
+            self._stop()
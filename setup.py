@@ -28,11 +28,18 @@ def long_description():
 
 
 install_requires = [
-    'requests>=1.0',
+    'requests>=2.16',
     'python-dateutil',
-    'six'
+    'six',
+    'futures; python_version < "3"',
 ]
 
+extras_require = {
+    'async': ['httpx'],
+    'streaming': ['ijson>=3.1'],
+    'http2': ['httpx[http2]'],
+}
+
 if __name__ == '__main__':
     setup(
         name=package_name,
@@ -45,6 +52,7 @@ if __name__ == '__main__':
         long_description_content_type="text/markdown",
         url='https://github.com/kloudless/kloudless-python/',
         install_requires=install_requires,
+        extras_require=extras_require,
         license='MIT',
         classifiers=[
             'Programming Language :: Python',
@@ -0,0 +1,35 @@
+from __future__ import unicode_literals
+
+import pytest
+
+from kloudless import Account
+
+from .fake import FakeClock
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """
+    Record the delays slept by sessions instead of sleeping.
+    """
+    delays = []
+    monkeypatch.setattr('kloudless.client.time.sleep', delays.append)
+    return delays
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Fake the clock of the rate limit pauses shared by batch and walk workers.
+    """
+    clock = FakeClock()
+    monkeypatch.setattr('kloudless.batch.time', clock)
+    return clock
+
+
+@pytest.fixture
+def make_account():
+    def make(token='token', account_id='1', **kwargs):
+        kwargs.setdefault('connection_pool', False)
+        return Account(token=token, account_id=account_id, **kwargs)
+    return make
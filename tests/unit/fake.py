@@ -0,0 +1,101 @@
+from __future__ import unicode_literals
+
+import io
+import json
+import threading
+
+import requests
+import six
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+
+class FakeAdapter(BaseAdapter):
+    """
+    Transport adapter answering requests without network access.
+
+    ``responses`` are ``(status_code, headers, body)`` tuples, or callables
+    taking the prepared request and returning one, used in turn. The last one
+    is repeated. A dict or list ``body`` is encoded as JSON.
+
+    Request bodies are read like an http library would. The bytes read are
+    kept in ``bodies`` and in the ``content`` attribute of the request.
+    """
+    def __init__(self, responses):
+        super(FakeAdapter, self).__init__()
+        self.responses = list(responses)
+        self.requests = []
+        self.bodies = []
+
+    @staticmethod
+    def read_body(body):
+        if body is None or isinstance(body, bytes):
+            return body
+        if isinstance(body, six.text_type):
+            return body.encode('utf-8')
+        if hasattr(body, 'read'):
+            chunks = iter(lambda: body.read(8192), b'')
+        else:
+            chunks = body
+        return b''.join(bytes(chunk) for chunk in chunks)
+
+    def send(self, request, stream=False, **kwargs):
+        request.content = self.read_body(request.body)
+        self.requests.append(request)
+        self.bodies.append(request.content)
+        answer = (self.responses.pop(0) if len(self.responses) > 1
+                  else self.responses[0])
+        if callable(answer):
+            answer = answer(request)
+        status_code, headers, body = answer
+
+        headers = CaseInsensitiveDict(headers or {})
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode('utf-8')
+            headers.setdefault('Content-Type', 'application/json')
+
+        response = requests.Response()
+        response.status_code = status_code
+        response.reason = 'Fake'
+        response.headers = headers
+        response.raw = io.BytesIO(body or b'')
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        pass
+
+
+def mount(session, responses):
+    """
+    Answer the requests of ``session`` with a :class:`FakeAdapter`.
+    """
+    adapter = FakeAdapter(responses)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return adapter
+
+
+def ok(body=None, **headers):
+    return 200, headers, {'id': 'abc'} if body is None else body
+
+
+class FakeClock(object):
+    """
+    Replacement of the ``time`` module of a kloudless module. Sleeping
+    advances the clock at once.
+    """
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+        self._lock = threading.Lock()
+
+    def time(self):
+        return self.now
+
+    def sleep(self, delay):
+        with self._lock:
+            self.sleeps.append(delay)
+            self.now += delay
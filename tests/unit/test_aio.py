@@ -0,0 +1,168 @@
+from __future__ import unicode_literals
+
+import asyncio
+import json
+
+import pytest
+
+from kloudless import exceptions
+from kloudless.retry import RetryPolicy
+
+httpx = pytest.importorskip('httpx')
+
+from kloudless.aio import AsyncAccount  # noqa: E402
+from kloudless.resources.aio import (  # noqa: E402
+    AsyncResource, AsyncResourceList)
+
+PAGE_SIZE = 3
+
+
+class MockServer(object):
+    """
+    Handler of a :class:`httpx.MockTransport` answering ``responses`` in
+    turn, as in :class:`tests.unit.fake.FakeAdapter`.
+    """
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def __call__(self, request):
+        request.read()
+        self.requests.append(request)
+        answer = (self.responses.pop(0) if len(self.responses) > 1
+                  else self.responses[0])
+        if callable(answer):
+            answer = answer(request)
+        status_code, headers, body = answer
+        if isinstance(body, (dict, list)):
+            return httpx.Response(status_code, headers=headers, json=body)
+        return httpx.Response(status_code, headers=headers, content=body)
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def make_account(responses, **kwargs):
+    server = MockServer(responses)
+    kwargs.setdefault('retry_policy', False)
+    account = AsyncAccount(token='token', account_id='1',
+                           connection_pool=False,
+                           transport=httpx.MockTransport(server), **kwargs)
+    return account, server
+
+
+def paged(pages):
+    """
+    Answer ``pages`` pages of ``PAGE_SIZE`` files addressed by page number,
+    and ``404`` past the last page.
+    """
+    def respond(request):
+        page = int(request.url.params.get('page', 1))
+        if page > pages:
+            return 404, {}, {'message': 'Not found'}
+        objects = [
+            {'id': '{}-{}'.format(page, i), 'api': 'storage', 'type': 'file'}
+            for i in range(PAGE_SIZE)]
+        body = {'objects': objects, 'page': page, 'type': 'object_list'}
+        if page < pages:
+            body['next_page'] = page + 1
+        return 200, {}, body
+    return respond
+
+
+def all_ids(pages):
+    return ['{}-{}'.format(page, i) for page in range(1, pages + 1)
+            for i in range(PAGE_SIZE)]
+
+
+async def collect(resources):
+    return [resource.data['id'] async for resource in resources]
+
+
+def test_get_resource():
+    account, server = make_account(
+        [(200, {}, {'id': 'abc', 'api': 'storage', 'type': 'file'})])
+
+    async def get():
+        async with account:
+            return await account.get('storage/files/abc',
+                                     params={'fields': 'id'})
+    resource = run(get())
+
+    assert isinstance(resource, AsyncResource)
+    assert resource.data['id'] == 'abc'
+    request = server.requests[0]
+    assert str(request.url) == ('https://api.kloudless.com/v1/accounts/1/'
+                                'storage/files/abc?fields=id')
+    assert request.headers['Authorization'] == 'Bearer token'
+
+
+def test_post_json():
+    account, server = make_account([(200, {}, {'id': 'abc'})])
+
+    run(account.post('storage/folders', json={'name': 'new'}))
+
+    assert json.loads(server.requests[0].content) == {'name': 'new'}
+
+
+def test_not_found_is_raised():
+    account, _ = make_account([(404, {}, {'message': 'Not found'})])
+
+    with pytest.raises(exceptions.NotFoundException):
+        run(account.get('storage/files/missing'))
+
+
+@pytest.mark.parametrize('prefetch', [0, 2])
+def test_paging_iterator(prefetch):
+    account, server = make_account([paged(4)])
+
+    async def iterate():
+        contents = await account.get('storage/folders/root/contents')
+        assert isinstance(contents, AsyncResourceList)
+        return await collect(
+            contents.get_paging_iterator(prefetch=prefetch))
+
+    assert run(iterate()) == all_ids(4)
+
+
+@pytest.mark.parametrize('concurrency', [1, 3])
+def test_iter_all(concurrency):
+    account, _ = make_account([paged(5)])
+
+    async def iterate():
+        contents = await account.get('storage/folders/root/contents')
+        return await collect(contents.iter_all(concurrency=concurrency))
+
+    assert run(iterate()) == all_ids(5)
+
+
+def test_retry():
+    account, server = make_account(
+        [(503, {}, {'message': 'Unavailable'}), (200, {}, {'id': 'abc'})],
+        retry_policy=RetryPolicy(backoff_factor=0))
+
+    resource = run(account.get('storage/files/abc'))
+
+    assert resource.data['id'] == 'abc'
+    assert len(server.requests) == 2
+
+
+def test_retry_gives_up():
+    account, server = make_account(
+        [(503, {}, {'message': 'Unavailable'})],
+        retry_policy=RetryPolicy(max_attempts=2, backoff_factor=0))
+
+    with pytest.raises(exceptions.ServerException):
+        run(account.get('storage/files/abc'))
+    assert len(server.requests) == 2
+
+
+def test_post_is_not_retried():
+    account, server = make_account(
+        [(503, {}, {'message': 'Unavailable'}), (200, {}, {'id': 'abc'})],
+        retry_policy=RetryPolicy(backoff_factor=0))
+
+    with pytest.raises(exceptions.ServerException):
+        run(account.post('storage/files', data=b'content'))
+    assert len(server.requests) == 1
@@ -0,0 +1,91 @@
+from __future__ import unicode_literals
+
+import threading
+import time
+
+import pytest
+
+from kloudless import exceptions
+from kloudless.application import TokenVerificationCache
+
+
+def test_verified_token_is_cached():
+    cache = TokenVerificationCache()
+    calls = []
+
+    def verify(app_id, token):
+        calls.append(token)
+        return {'client_id': app_id}
+
+    assert cache.verify('app', 'token', verify) == {'client_id': 'app'}
+    info = cache.verify('app', 'token', verify)
+    info['client_id'] = 'changed'
+
+    assert cache.verify('app', 'token', verify) == {'client_id': 'app'}
+    assert calls == ['token']
+    cache.verify('app', 'other', verify)
+    assert calls == ['token', 'other']
+
+
+def test_rejected_token_is_cached_for_negative_ttl(monkeypatch):
+    cache = TokenVerificationCache(negative_ttl=30)
+    calls = []
+    now = [1000.0]
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+
+    def verify(app_id, token):
+        calls.append(token)
+        raise exceptions.TokenVerificationFailed('rejected')
+
+    for _ in range(2):
+        with pytest.raises(exceptions.TokenVerificationFailed):
+            cache.verify('app', 'token', verify)
+    assert len(calls) == 1
+
+    now[0] += 31
+    with pytest.raises(exceptions.TokenVerificationFailed):
+        cache.verify('app', 'token', verify)
+    assert len(calls) == 2
+
+
+def test_other_errors_are_not_cached():
+    cache = TokenVerificationCache()
+    calls = []
+
+    def verify(app_id, token):
+        calls.append(token)
+        if len(calls) == 1:
+            raise ValueError('network error')
+        return {'client_id': app_id}
+
+    with pytest.raises(ValueError):
+        cache.verify('app', 'token', verify)
+    assert cache.verify('app', 'token', verify) == {'client_id': 'app'}
+    assert len(calls) == 2
+
+
+def test_concurrent_verifications_send_one_request():
+    cache = TokenVerificationCache()
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def verify(app_id, token):
+        calls.append(token)
+        release.wait(5)
+        return {'client_id': app_id}
+
+    threads = [threading.Thread(target=lambda: results.append(
+        cache.verify('app', 'token', verify))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    deadline = time.time() + 5
+    while (cache._coalescer.info()['coalesced'] < 3
+           and time.time() < deadline):
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert calls == ['token']
+    assert results == [{'client_id': 'app'}] * 4
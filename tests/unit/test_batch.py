@@ -0,0 +1,140 @@
+from __future__ import unicode_literals
+
+import threading
+
+import pytest
+from six.moves.urllib.parse import urlparse
+
+from kloudless import exceptions
+from kloudless.batch import Batch
+
+from .fake import mount
+
+
+def by_path(request):
+    """
+    Answer ``files/<id>`` with the file, ``404`` for ``files/missing`` and
+    ``500`` for ``files/broken``.
+    """
+    name = urlparse(request.url).path.rsplit('/', 1)[-1]
+    if name == 'missing':
+        return 404, {}, {'message': 'Not found'}
+    if name == 'broken':
+        return 500, {}, {'message': 'Server error'}
+    return 200, {}, {'id': name, 'api': 'storage', 'type': 'file'}
+
+
+def test_results_keep_request_order(make_account):
+    account = make_account()
+    mount(account, [by_path])
+    names = ['f{}'.format(i) for i in range(20)]
+
+    with account.batch(workers=4) as batch:
+        for name in names:
+            batch.get('storage/files/{}'.format(name))
+
+    assert len(batch) == 20
+    assert [result.data['id'] for result in batch.results] == names
+    assert batch.errors == []
+
+
+def test_failed_requests_give_their_exception(make_account):
+    account = make_account(retry_policy=False)
+    mount(account, [by_path])
+
+    results = account.bulk([
+        ('GET', 'storage/files/a'),
+        ('GET', 'storage/files/missing'),
+        ('GET', 'storage/files/b'),
+        ('GET', 'storage/files/broken'),
+    ], workers=2)
+
+    assert results[0].data['id'] == 'a'
+    assert isinstance(results[1], exceptions.NotFoundException)
+    assert results[2].data['id'] == 'b'
+    assert isinstance(results[3], exceptions.ServerException)
+
+
+def test_errors_map_to_request_index(make_account):
+    account = make_account(retry_policy=False)
+    mount(account, [by_path])
+    batch = account.batch()
+    batch.extend([('GET', 'storage/files/missing'),
+                  ('GET', 'storage/files/a')])
+    index = batch.get('storage/files/broken')
+
+    batch.run()
+
+    assert index == 2
+    assert [(i, type(e)) for i, e in batch.errors] == [
+        (0, exceptions.NotFoundException), (2, exceptions.ServerException)]
+
+
+def test_bulk_passes_request_kwargs(make_account):
+    account = make_account()
+    adapter = mount(account, [(200, {}, {'id': 'abc'})])
+
+    account.bulk([('POST', 'storage/folders', {'json': {'name': 'a'}}),
+                  ('PATCH', 'storage/files/abc', {'json': {'name': 'b'}})],
+                 workers=1)
+
+    assert sorted((r.method, r.content) for r in adapter.requests) == [
+        ('PATCH', b'{"name": "b"}'), ('POST', b'{"name": "a"}')]
+
+
+def test_batch_is_not_run_on_error(make_account):
+    account = make_account()
+    adapter = mount(account, [by_path])
+
+    with pytest.raises(ValueError):
+        with account.batch() as batch:
+            batch.get('storage/files/a')
+            raise ValueError('boom')
+
+    assert batch.results == [] and adapter.requests == []
+
+
+def test_workers_bound_concurrent_requests(make_account):
+    account = make_account()
+    lock = threading.Lock()
+    active = [0, 0]  # current, maximum
+
+    def respond(request):
+        with lock:
+            active[0] += 1
+            active[1] = max(active)
+        threading.Event().wait(0.01)
+        with lock:
+            active[0] -= 1
+        return by_path(request)
+
+    mount(account, [respond])
+    account.bulk([('GET', 'storage/files/{}'.format(i)) for i in range(12)],
+                 workers=3)
+
+    assert 1 < active[1] <= 3
+
+
+def test_rate_limit_pauses_and_retries(make_account, clock):
+    account = make_account(retry_policy=False)
+    mount(account, [(429, {'Retry-After': '5'}, {'message': 'Slow'}),
+                    (200, {}, {'id': 'abc'})])
+
+    results = account.bulk([('GET', 'storage/files/abc')], workers=1)
+
+    assert results[0].data['id'] == 'abc'
+    assert clock.sleeps == [5]
+
+
+def test_rate_limit_retries_are_bounded(make_account, clock):
+    account = make_account(retry_policy=False)
+    adapter = mount(account, [(429, {}, {'message': 'Slow'})])
+    batch = Batch(account, workers=1, max_rate_limit_retries=2,
+                  backoff_factor=0.5)
+    batch.get('storage/files/abc')
+
+    result, = batch.run()
+
+    assert isinstance(result, exceptions.RateLimitException)
+    assert clock.sleeps == [0.5, 1.0]
+    assert len(adapter.requests) == 3
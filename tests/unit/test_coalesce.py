@@ -0,0 +1,131 @@
+from __future__ import unicode_literals
+
+import threading
+import time
+
+import pytest
+
+from kloudless import exceptions
+from kloudless.coalesce import RequestCoalescer
+
+from .fake import mount
+
+URL = 'https://api.kloudless.com/v2/accounts/5/storage/files/abc'
+
+
+def get_key(url=URL, params=None, headers=None, identity='Bearer a'):
+    return RequestCoalescer.get_key('GET', url, params, headers, identity)
+
+
+def test_key_separates_credentials_and_headers():
+    assert get_key() == get_key(headers={'Authorization': 'Bearer b'})
+    assert get_key() != get_key(identity='Bearer b')
+    assert get_key() != get_key(headers={'X-Kloudless-As-User': '1'})
+    assert get_key() != get_key(headers={'Range': 'bytes=0-9'})
+    assert get_key() != get_key(headers={'If-None-Match': '"v1"'})
+    assert get_key(headers={'range': 'bytes=0-9'}) == get_key(
+        headers={'Range': 'bytes=0-9'})
+    assert get_key(URL + '?a=1&b=2') == get_key(params={'b': 2, 'a': 1})
+
+
+def wait_until(condition):
+    deadline = time.time() + 5
+    while not condition() and time.time() < deadline:
+        time.sleep(0.001)
+
+
+def test_concurrent_calls_share_result():
+    coalescer = RequestCoalescer()
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def send():
+        calls.append(1)
+        release.wait(5)
+        return object()
+
+    def call():
+        results.append(coalescer.send('key', send))
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    wait_until(lambda: calls)
+    followers = [threading.Thread(target=call) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    wait_until(lambda: coalescer.info()['coalesced'] == 3)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert len(results) == 4 and len(set(map(id, results))) == 1
+    assert coalescer.info() == {'sent': 1, 'coalesced': 3, 'in_flight': 0}
+
+
+def call_in_thread(func, errors):
+    def call():
+        try:
+            func()
+        except BaseException as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=call)
+    thread.start()
+    return thread
+
+
+@pytest.mark.parametrize('error, follower_error', [
+    (ValueError('failed'), ValueError),
+    (KeyboardInterrupt(), exceptions.KloudlessException),
+])
+def test_followers_fail_when_leader_fails(error, follower_error):
+    coalescer = RequestCoalescer()
+    release = threading.Event()
+    leader_errors = []
+    follower_errors = []
+
+    def send():
+        release.wait(5)
+        raise error
+
+    leader = call_in_thread(lambda: coalescer.send('key', send),
+                            leader_errors)
+    wait_until(lambda: coalescer.info()['in_flight'])
+    follower = call_in_thread(lambda: coalescer.send('key', send),
+                              follower_errors)
+    wait_until(lambda: coalescer.info()['coalesced'])
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert leader_errors == [error]
+    assert len(follower_errors) == 1
+    assert isinstance(follower_errors[0], follower_error)
+
+
+def test_client_does_not_share_requests_with_different_headers(make_account):
+    account = make_account(request_coalescer=RequestCoalescer())
+    key = account._get_coalesce_key('GET', URL, {})
+
+    assert key == account._get_coalesce_key('get', URL, {})
+    assert key != account._get_coalesce_key(
+        'GET', URL, {'headers': {'Range': 'bytes=0-9'}})
+    assert key != account._get_coalesce_key(
+        'GET', URL, {'impersonate_user_id': '1'})
+    assert key != make_account(
+        token='other', request_coalescer=RequestCoalescer(),
+    )._get_coalesce_key('GET', URL, {})
+    assert account._get_coalesce_key('GET', URL, {'stream': True}) is None
+    assert account._get_coalesce_key('POST', URL, {}) is None
+
+
+def test_client_sends_through_coalescer(make_account):
+    coalescer = RequestCoalescer()
+    account = make_account(request_coalescer=coalescer)
+    adapter = mount(account, [(200, {}, {'id': 'abc'})])
+
+    assert account.get('storage/files/abc').data['id'] == 'abc'
+    assert len(adapter.requests) == 1
+    assert coalescer.info()['sent'] == 1
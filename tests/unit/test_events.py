@@ -0,0 +1,382 @@
+from __future__ import unicode_literals
+
+import json
+import threading
+
+import pytest
+from six.moves.urllib.parse import parse_qs, urlparse
+
+from kloudless.events import (EventBatch, EventScheduler, EventStream,
+                              FileCheckpointStore, MemoryCheckpointStore,
+                              SQLiteCheckpointStore)
+from kloudless.retry import RetryPolicy
+
+from .fake import mount
+
+
+def get_param(request, name, default=None):
+    return parse_qs(urlparse(request.url).query).get(name, [default])[0]
+
+
+class EventServer(object):
+    """
+    Answer the events of one account, addressed by integer cursors. New
+    events can be appended to ``events`` while the account is polled.
+    """
+    def __init__(self, count=0, latest=0, page_size=2):
+        self.events = [{'id': 'e{}'.format(i), 'type': 'add'}
+                       for i in range(count)]
+        self.latest = latest
+        self.page_size = page_size
+        self.cursors = []
+
+    def __call__(self, request):
+        path = urlparse(request.url).path
+        if path.endswith('/events/latest'):
+            return 200, {}, {'cursor': self.latest}
+        if not path.endswith('/events'):
+            return 200, {}, {'id': 7, 'type': 'account'}
+        cursor = int(get_param(request, 'cursor'))
+        self.cursors.append(cursor)
+        objects = self.events[cursor:cursor + self.page_size]
+        return 200, {}, {'objects': objects, 'count': len(objects),
+                         'cursor': cursor + len(objects),
+                         'type': 'object_list'}
+
+
+def event_ids(batch):
+    return [event.data['id'] for event in batch]
+
+
+@pytest.fixture(params=['memory', 'file', 'sqlite'])
+def make_store(request, tmpdir):
+    def make():
+        if request.param == 'memory':
+            if not hasattr(request, 'memory_store'):
+                request.memory_store = MemoryCheckpointStore()
+            return request.memory_store
+        if request.param == 'file':
+            return FileCheckpointStore(str(tmpdir.join('cursors.json')))
+        store = SQLiteCheckpointStore(str(tmpdir.join('cursors.db')))
+        request.addfinalizer(store.close)
+        return store
+    return make
+
+
+def test_store_saves_cursors(make_store):
+    store = make_store()
+    assert store.get('1') is None
+
+    store.set('1', 10)
+    store.set('2', 20)
+    store.set('1', 11)
+
+    # SQLite keeps cursors as text
+    assert str(store.get('1')) == '11'
+    assert str(make_store().get('2')) == '20'
+
+
+def test_file_store_is_json(tmpdir):
+    path = str(tmpdir.join('cursors.json'))
+    FileCheckpointStore(path).set('1', 'abc')
+
+    with open(path) as f:
+        assert json.load(f) == {'1': 'abc'}
+    assert tmpdir.listdir() == [tmpdir.join('cursors.json')]
+
+
+def test_first_fetch_starts_at_latest_cursor(make_account):
+    server = EventServer(count=5, latest=3)
+    account = make_account()
+    mount(account, [server])
+    store = MemoryCheckpointStore()
+    stream = EventStream(account, store)
+
+    batch = stream.fetch()
+
+    assert store.get('1') == 3
+    assert event_ids(batch) == ['e3', 'e4']
+    assert batch.cursor == 5 and not batch.is_full
+    # The cursor is saved on commit only
+    assert store.get('1') == 3
+    stream.commit(batch)
+    assert store.get('1') == 5
+
+
+def test_fetch_pages_until_max_batch_size(make_account):
+    server = EventServer(count=9)
+    account = make_account()
+    mount(account, [server])
+    stream = EventStream(account, max_batch_size=5)
+
+    batch = stream.fetch()
+    assert event_ids(batch) == ['e0', 'e1', 'e2', 'e3', 'e4', 'e5']
+    assert batch.is_full and batch.cursor == 6
+    stream.commit(batch)
+
+    batch = stream.fetch()
+    assert event_ids(batch) == ['e6', 'e7', 'e8']
+    assert not batch.is_full and batch.cursor == 9
+
+
+def test_stream_resumes_from_store(make_account, make_store):
+    server = EventServer(count=4)
+    account = make_account()
+    mount(account, [server])
+    stream = EventStream(account, make_store(), max_batch_size=2)
+    stream.commit(stream.fetch())
+
+    resumed = EventStream(account, make_store())
+    batch = resumed.fetch()
+
+    assert event_ids(batch) == ['e2', 'e3']
+    assert str(server.cursors[-2]) == '2'
+
+
+def test_key_defaults_to_account_id(make_account):
+    account = make_account(account_id=None)
+    mount(account, [EventServer()])
+
+    assert EventStream(account).key == '7'
+    assert EventStream(account, key='custom').key == 'custom'
+
+
+def test_run_saves_cursor_after_callback(make_account):
+    server = EventServer(count=3)
+    account = make_account()
+    mount(account, [server])
+    store = MemoryCheckpointStore()
+    stream = EventStream(account, store, min_interval=0)
+    batches = []
+
+    def callback(batch):
+        batches.append((event_ids(batch), store.get('1')))
+        if len(batches) == 1:
+            server.events.append({'id': 'e3', 'type': 'add'})
+        else:
+            stream.stop()
+
+    stream.run(callback)
+
+    assert batches == [(['e0', 'e1', 'e2'], 0), (['e3'], 3)]
+    assert store.get('1') == 4
+
+
+def test_failed_callback_does_not_save_cursor(make_account):
+    account = make_account()
+    mount(account, [EventServer(count=3)])
+    store = MemoryCheckpointStore()
+    stream = EventStream(account, store, min_interval=0)
+
+    def callback(batch):
+        raise ValueError('boom')
+
+    with pytest.raises(ValueError):
+        stream.run(callback)
+    assert store.get('1') == 0
+    assert event_ids(EventStream(account, store).fetch()) == [
+        'e0', 'e1', 'e2']
+
+
+def test_idle_polls_back_off(make_account):
+    server = EventServer()
+    account = make_account()
+    mount(account, [server])
+    stream = EventStream(account, min_interval=1, max_interval=5)
+
+    intervals = []
+    for _ in range(4):
+        assert len(stream.poll()) == 0
+        intervals.append(stream.interval)
+    assert intervals == [2, 4, 5, 5]
+
+    server.events.append({'id': 'e0', 'type': 'add'})
+    assert event_ids(stream.poll()) == ['e0']
+    assert stream.interval == 1
+
+
+def test_full_batch_polls_again_at_once(make_account):
+    account = make_account()
+    mount(account, [EventServer(count=5)])
+    stream = EventStream(account, max_batch_size=2)
+
+    assert stream.poll().is_full
+    assert stream.interval == 0
+
+
+def test_server_error_backs_off(make_account, sleeps):
+    account = make_account(retry_policy=RetryPolicy(jitter=0))
+    adapter = mount(account, [
+        EventServer(), (503, {}, {'message': 'Unavailable'})])
+    stream = EventStream(account, min_interval=1, max_interval=60)
+    stream._get_cursor()
+
+    assert stream.poll() is None
+    assert stream.interval == 2
+    # The account retries before the stream backs off
+    assert sleeps == [0.5, 1.0]
+    assert len(adapter.requests) == 4
+
+
+def test_rate_limit_waits_for_retry_after(make_account, sleeps):
+    account = make_account(retry_policy=RetryPolicy(jitter=0))
+    mount(account, [
+        EventServer(), (429, {'Retry-After': '30'}, {'message': 'Slow'})])
+    stream = EventStream(account, min_interval=1, max_interval=10)
+    stream._get_cursor()
+
+    assert stream.poll() is None
+    assert stream.interval == 30
+    assert sleeps == [30, 30]
+
+
+def run_scheduler(scheduler, timeout=5):
+    """
+    Run ``scheduler`` until it is stopped, or fail after ``timeout`` seconds.
+    """
+    timed_out = threading.Event()
+
+    def stop():
+        timed_out.set()
+        scheduler.stop()
+
+    timer = threading.Timer(timeout, stop)
+    timer.start()
+    try:
+        scheduler.run()
+    finally:
+        timer.cancel()
+    assert not timed_out.is_set()
+
+
+def make_accounts(make_account, servers, **kwargs):
+    accounts = []
+    for i, server in enumerate(servers, 1):
+        account = make_account(account_id=str(i), **kwargs)
+        mount(account, [server])
+        accounts.append(account)
+    return accounts
+
+
+def test_scheduler_polls_all_accounts(make_account):
+    servers = [EventServer(count=3), EventServer(count=1)]
+    received = {}
+
+    def callback(account, batch):
+        received.setdefault(account.account_id, []).extend(event_ids(batch))
+        if sum(map(len, received.values())) == 4:
+            scheduler.stop()
+
+    store = MemoryCheckpointStore()
+    scheduler = EventScheduler(callback, store, workers=2,
+                               min_interval=0.01, max_interval=0.05)
+    for account in make_accounts(make_account, servers):
+        scheduler.add_account(account)
+    run_scheduler(scheduler)
+
+    assert received == {'1': ['e0', 'e1', 'e2'], '2': ['e0']}
+    assert store.get('1') == 3 and store.get('2') == 1
+
+
+def test_scheduler_polls_due_accounts_in_order(make_account):
+    servers = [EventServer(count=1) for _ in range(3)]
+    polled = []
+
+    def callback(account, batch):
+        polled.append(account.account_id)
+        if len(polled) == 3:
+            scheduler.stop()
+
+    scheduler = EventScheduler(callback, workers=1, max_interval=60)
+    for account in make_accounts(make_account, servers):
+        scheduler.add_account(account)
+    run_scheduler(scheduler)
+
+    assert polled == ['1', '2', '3']
+
+
+def test_removed_account_is_not_polled(make_account):
+    servers = [EventServer(count=1), EventServer(count=1)]
+    polled = []
+
+    def callback(account, batch):
+        polled.append(account.account_id)
+        scheduler.stop()
+
+    scheduler = EventScheduler(callback, workers=1)
+    first, second = make_accounts(make_account, servers)
+    scheduler.add_account(first)
+    scheduler.add_account(second)
+    scheduler.remove_account(first)
+    run_scheduler(scheduler)
+
+    assert polled == ['2']
+    assert servers[0].cursors == []
+
+
+def test_failed_callback_delays_account(make_account):
+    servers = [EventServer(count=1)]
+    calls = []
+
+    def callback(account, batch):
+        calls.append(account.account_id)
+        scheduler.stop()
+        raise ValueError('boom')
+
+    store = MemoryCheckpointStore()
+    scheduler = EventScheduler(callback, store, max_interval=30)
+    stream = scheduler.add_account(
+        make_accounts(make_account, servers)[0])
+    run_scheduler(scheduler)
+
+    assert calls == ['1']
+    assert stream.interval == 30
+    assert store.get('1') == 0
+
+
+def test_rate_limited_account_is_delayed(make_account, sleeps):
+    limited = EventServer()
+    busy = EventServer(count=1)
+    accounts = make_accounts(make_account, [limited, busy],
+                             retry_policy=RetryPolicy(max_attempts=2))
+    mount(accounts[0], [
+        limited, (429, {'Retry-After': '30'}, {'message': 'Slow'})])
+    polls = []
+
+    def callback(account, batch):
+        polls.append(account.account_id)
+        busy.events.append({'id': 'e', 'type': 'add'})
+        if len(polls) == 3:
+            scheduler.stop()
+
+    scheduler = EventScheduler(callback, workers=2, min_interval=0.01)
+    for account in accounts:
+        scheduler.add_account(account)
+    run_scheduler(scheduler)
+
+    assert polls == ['2', '2', '2']
+    # The account retried once, then the scheduler waits for Retry-After
+    assert sleeps == [30]
+
+
+def test_delay_follows_event_rate(make_account, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('kloudless.events.time.time', lambda: now[0])
+    scheduler = EventScheduler(None, target_batch_size=10, rate_smoothing=1,
+                               min_interval=1, max_interval=60)
+    stream = scheduler.add_account(make_account())
+    entry = scheduler._entries[id(stream.account)]
+
+    def delay_after(seconds, count):
+        now[0] += seconds
+        batch = EventBatch([None] * count, cursor=0)
+        stream.update_interval(batch)
+        return scheduler._get_delay(entry, batch)
+
+    assert delay_after(0, 5) == 1
+    # 5 events per second: 10 events are expected in 2 seconds
+    assert delay_after(1, 5) == 2
+    # 0.5 events per second
+    assert delay_after(10, 5) == 20
+    assert delay_after(10, 0) == 2
+    assert scheduler._get_delay(entry, None) == stream.interval
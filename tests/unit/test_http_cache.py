@@ -0,0 +1,88 @@
+from __future__ import unicode_literals
+
+from kloudless import RetryPolicy
+from kloudless.http_cache import ResponseCache
+
+from .fake import mount
+
+
+def test_not_modified_response_is_served_from_cache(make_account):
+    cache = ResponseCache()
+    account = make_account(response_cache=cache)
+    adapter = mount(account, [
+        (200, {'ETag': '"v1"', 'X-Version': '1'}, {'id': 'abc'}),
+        (304, {'etag': '"v1"', 'x-version': '2', 'Content-Length': '0'},
+         b''),
+    ])
+
+    account.get('storage/files/abc')
+    resource = account.get('storage/files/abc')
+
+    assert adapter.requests[1].headers['If-None-Match'] == '"v1"'
+    assert resource.data['id'] == 'abc'
+    assert resource.response.from_cache is True
+    headers = resource.response.headers
+    assert headers['X-Version'] == '2'
+    assert 'Content-Length' not in headers
+    assert len([name for name in headers if name.lower() == 'etag']) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_modified_response_replaces_entry(make_account):
+    cache = ResponseCache()
+    account = make_account(response_cache=cache)
+    mount(account, [(200, {'ETag': '"v1"'}, {'id': 'abc', 'name': 'a'}),
+                    (200, {'ETag': '"v2"'}, {'id': 'abc', 'name': 'b'})])
+
+    account.get('storage/files/abc')
+    resource = account.get('storage/files/abc')
+
+    assert resource.data['name'] == 'b'
+    assert resource.response.from_cache is False
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_fresh_entry_is_served_without_request(make_account):
+    account = make_account(response_cache=ResponseCache(default_ttl=60))
+    adapter = mount(account, [(200, {}, {'id': 'abc'})])
+
+    account.get('storage/files/abc')
+    account.get('storage/files/abc')
+
+    assert len(adapter.requests) == 1
+
+
+def test_range_and_conditional_requests_bypass_cache(make_account):
+    cache = ResponseCache(default_ttl=60)
+    account = make_account(response_cache=cache)
+    adapter = mount(account, [(200, {'ETag': '"v1"'}, {'id': 'abc'})])
+    account.get('storage/files/abc')
+
+    for headers in ({'Range': 'bytes=0-9'}, {'If-None-Match': '"v0"'},
+                    {'If-Match': '"v1"'}):
+        account.get('storage/files/abc', headers=headers)
+
+    assert len(adapter.requests) == 4
+    assert 'If-None-Match' not in adapter.requests[1].headers
+    assert (cache.hits, cache.misses) == (0, 1)
+
+
+def test_retried_revalidation_is_served_from_cache(make_account, sleeps):
+    cache = ResponseCache()
+    account = make_account(response_cache=cache,
+                           retry_policy=RetryPolicy(jitter=0))
+    adapter = mount(account, [
+        (200, {'ETag': '"v1"'}, {'id': 'abc'}),
+        (503, {}, b''),
+        (304, {'ETag': '"v1"'}, b''),
+    ])
+
+    account.get('storage/files/abc')
+    resource = account.get('storage/files/abc')
+
+    assert resource.data['id'] == 'abc'
+    assert resource.response.status_code == 200
+    assert resource.response.from_cache is True
+    assert [r.headers.get('If-None-Match') for r in adapter.requests] == [
+        None, '"v1"', '"v1"']
+    assert len(sleeps) == 1
@@ -0,0 +1,106 @@
+from __future__ import unicode_literals
+
+from collections import namedtuple
+from datetime import datetime
+
+import pytest
+
+from kloudless import exceptions
+from kloudless.index import MetadataIndex
+from kloudless.mirror import StorageMirror
+
+
+def item(id, name, account=1, parent='root', type='file', modified=None,
+         **fields):
+    fields.update(id=id, name=name, account=account, type=type,
+                  parent={'id': parent}, modified=modified)
+    return fields
+
+
+@pytest.fixture
+def index():
+    index = MetadataIndex()
+    index.add([
+        item('a', 'Report.pdf', mime_type='application/pdf', size=30,
+             modified='2020-03-01T00:00:00Z'),
+        item('b', 'notes.txt', mime_type='text/plain', size=10,
+             modified='2019-06-01T12:00:00+02:00'),
+        item('c', 'Docs', type='folder', modified='2021-01-01T00:00:00Z'),
+        item('d', '100%_done.pdf', parent='c', mime_type='application/pdf',
+             size=20, modified='2020-01-01T00:00:00Z'),
+        item('a', 'Other.pdf', account=2, mime_type='application/pdf'),
+    ], batch_size=2)
+    yield index
+    index.close()
+
+
+def names(results):
+    return [result['name'] for result in results]
+
+
+def test_get(index):
+    assert index.get('b')['name'] == 'notes.txt'
+    assert index.get('a', account=2)['name'] == 'Other.pdf'
+    assert index.get('a', account=1)['name'] == 'Report.pdf'
+    assert index.get('missing') is None
+
+
+def test_find_by_columns(index):
+    assert names(index.find(mime_type='application/pdf', account=1)) == [
+        '100%_done.pdf', 'Report.pdf']
+    assert names(index.find(parent_id='c')) == ['100%_done.pdf']
+    assert names(index.find(type='folder')) == ['Docs']
+    assert names(index.find(name_contains='REPORT')) == ['Report.pdf']
+    assert names(index.find(name_contains='%_')) == ['100%_done.pdf']
+
+
+def test_find_by_modification_time(index):
+    results = index.find(modified_after=datetime(2020, 1, 1),
+                         modified_before='2021-01-01T00:00:00Z',
+                         order_by='-modified')
+    assert names(results) == ['Report.pdf', '100%_done.pdf']
+    assert names(index.find(modified_before='2019-06-01T11:00:00Z')) == [
+        'notes.txt']
+
+
+def test_find_order_and_limit(index):
+    assert names(index.find(account=1, order_by='-size', limit=2)) == [
+        'Report.pdf', '100%_done.pdf']
+    with pytest.raises(exceptions.InvalidParameter):
+        index.find(order_by='data')
+
+
+def test_add_replaces_and_remove(index):
+    index.add([item('b', 'renamed.txt')])
+    assert len(index) == 5
+    assert index.get('b')['name'] == 'renamed.txt'
+
+    index.remove(['a'], account=2)
+    assert index.get('a', account=2) is None
+    index.remove(['a', 'b'])
+    assert len(index) == 2
+    index.clear()
+    assert len(index) == 0
+
+
+def test_id_lookups_use_an_index(index):
+    plan = index._conn.execute(
+        'EXPLAIN QUERY PLAN SELECT data FROM kloudless_metadata '
+        'WHERE id = ?', ('a',)).fetchall()
+    assert 'USING INDEX' in plan[0][-1]
+
+
+Event = namedtuple('Event', 'data')
+
+
+def test_mirror_shares_schema(make_account, tmpdir):
+    mirror = StorageMirror(make_account(account_id='5'),
+                           str(tmpdir.join('mirror.db')))
+    mirror.apply_events([Event({'type': 'add', 'metadata': item(
+        'a', 'Report.pdf', modified='2020-03-01T00:00:00Z')})])
+
+    assert mirror.get('a')['name'] == 'Report.pdf'
+    assert mirror._conn.execute(
+        'SELECT account, typeof(modified) FROM mirror_items').fetchall() == [
+        ('5', 'real')]
+    mirror.close()
@@ -0,0 +1,14 @@
+from __future__ import unicode_literals
+
+from kloudless import jsonlib
+
+
+def test_default_backend_is_simplejson_or_json():
+    assert jsonlib.get_backend().name in jsonlib.DEFAULT_BACKENDS
+
+
+def test_stdlib_backend_decodes_bytes():
+    backend = jsonlib.get_backend('json')
+    assert backend.loads('{"name": "café"}'.encode('utf-8')) == {
+        'name': 'café'}
+    assert backend.loads(backend.dumps([1, 'a'])) == [1, 'a']
@@ -0,0 +1,91 @@
+from __future__ import unicode_literals
+
+from kloudless.metadata_cache import MetadataCache
+
+from .fake import mount
+
+
+def file_response(request):
+    return 200, {}, {'id': 'abc', 'api': 'storage', 'type': 'file',
+                     'authorization': request.headers['Authorization']}
+
+
+def test_repeated_lookups_are_served_from_cache(make_account):
+    cache = MetadataCache()
+    account = make_account(metadata_cache=cache)
+    adapter = mount(account, [file_response])
+
+    account.get('storage/files/abc')
+    resource = account.get('storage/files/abc')
+
+    assert resource.data['id'] == 'abc'
+    assert len(adapter.requests) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_entries_are_kept_apart_per_credential(make_account):
+    cache = MetadataCache()
+    first = make_account(token='first', account_id='5', metadata_cache=cache)
+    second = make_account(token='second', account_id='5',
+                          metadata_cache=cache)
+    mount(first, [file_response])
+    adapter = mount(second, [file_response])
+
+    first.get('storage/files/abc')
+    resource = second.get('storage/files/abc')
+
+    assert len(adapter.requests) == 1
+    assert resource.data['authorization'] == 'Bearer second'
+    assert first.get('storage/files/abc').data['authorization'] == (
+        'Bearer first')
+
+
+def test_writes_invalidate_entries_of_all_credentials(make_account):
+    cache = MetadataCache()
+    first = make_account(token='first', account_id='5', metadata_cache=cache)
+    second = make_account(token='second', account_id='5',
+                          metadata_cache=cache)
+    mount(first, [file_response])
+    adapter = mount(second, [file_response])
+    first.get('storage/files/abc')
+    second.get('storage/files/abc')
+
+    first.patch('storage/files/abc', json={'name': 'b'})
+    second.get('storage/files/abc')
+
+    assert len(adapter.requests) == 2
+
+
+def test_events_invalidate_resources_and_parents(make_account):
+    cache = MetadataCache()
+    account = make_account(metadata_cache=cache)
+    adapter = mount(account, [
+        (200, {}, {'id': 'abc', 'api': 'storage', 'type': 'file'}),
+        (200, {}, {'id': 'root', 'api': 'storage', 'type': 'folder'}),
+        (200, {}, {'objects': [{'type': 'add', 'ids': ['xyz'],
+                                'metadata': {'id': 'xyz',
+                                             'parent': {'id': 'root'}}}],
+                   'cursor': 'next', 'count': 1, 'type': 'object_list'}),
+        (200, {}, {'id': 'abc', 'api': 'storage', 'type': 'file'}),
+    ])
+    account.get('storage/files/abc')
+    account.get('storage/folders/root')
+
+    account.get('events', params={'cursor': 'current'})
+    account.get('storage/files/abc')
+    account.get('storage/folders/root')
+
+    assert [r.path_url.rsplit('/', 1)[-1] for r in adapter.requests] == [
+        'abc', 'root', 'events?cursor=current', 'root']
+
+
+def test_keys():
+    cache = MetadataCache()
+    url = 'https://api.kloudless.com/v2/accounts/5/storage/files/abc'
+
+    assert cache.get_key(url, identity='Bearer a') != cache.get_key(
+        url, identity='Bearer b')
+    assert cache.get_key(url + '?b=2&a=1') == cache.get_key(
+        url, params={'a': '1', 'b': '2'})
+    assert cache.get_key(url + '/contents') is None
+    assert cache.get_key('https://api.kloudless.com/v2/meta/apps') is None
@@ -0,0 +1,227 @@
+from __future__ import unicode_literals
+
+import re
+
+import pytest
+from six.moves.urllib.parse import parse_qs, urlparse
+
+from kloudless.mirror import StorageMirror
+
+from .fake import mount
+
+
+class DriveServer(object):
+    """
+    Answer the storage and events endpoints of an account whose items are
+    kept in ``items`` by ID. :func:`change` updates the items and records
+    an event.
+    """
+    def __init__(self):
+        self.items = {}
+        self.events = []
+        self.listed = []
+        for name, parent in [('docs', 'root'), ('a.txt', 'root'),
+                             ('old', 'docs'), ('b.txt', 'docs'),
+                             ('c.txt', 'old')]:
+            self.add(name, parent)
+
+    def add(self, name, parent):
+        type_ = 'file' if '.' in name else 'folder'
+        self.items[name] = {'id': name, 'name': name, 'type': type_,
+                            'api': 'storage', 'parent': {'id': parent}}
+        return self.items[name]
+
+    def change(self, type_, name, parent=None, with_metadata=True):
+        if type_ == 'delete':
+            self.delete(name)
+            metadata = None
+        elif type_ == 'add':
+            metadata = self.add(name, parent)
+        else:
+            metadata = self.items[name]
+            metadata['name'] = name + '.new'
+        event = {'id': 'e{}'.format(len(self.events)), 'type': type_,
+                 'ids': [name]}
+        if with_metadata and metadata is not None:
+            event['metadata'] = dict(metadata)
+        self.events.append(event)
+
+    def delete(self, item_id):
+        for child in [i for i, item in self.items.items()
+                      if item['parent']['id'] == item_id]:
+            self.delete(child)
+        del self.items[item_id]
+
+    def children(self, folder_id):
+        return sorted((item for item in self.items.values()
+                       if item['parent']['id'] == folder_id),
+                      key=lambda item: item['name'])
+
+    def __call__(self, request):
+        url = urlparse(request.url)
+        params = parse_qs(url.query)
+        path = url.path.split('/accounts/1/', 1)[1]
+        not_found = 404, {}, {'message': 'Not found'}
+
+        if path == 'events/latest':
+            return 200, {}, {'cursor': len(self.events)}
+        if path == 'events':
+            cursor = int(params['cursor'][0])
+            objects = self.events[cursor:cursor + 2]
+            return 200, {}, {'objects': objects, 'type': 'object_list',
+                             'cursor': cursor + len(objects)}
+        match = re.match(r'storage/folders/([^/]+)/contents$', path)
+        if match:
+            if 'page' in params:
+                return not_found
+            self.listed.append(match.group(1))
+            return 200, {}, {'objects': self.children(match.group(1)),
+                             'page': 1, 'type': 'object_list'}
+        match = re.match(r'storage/(files|folders)/([^/]+)$', path)
+        item = self.items.get(match.group(2))
+        if item is None or item['type'] + 's' != match.group(1):
+            return not_found
+        return 200, {}, item
+
+
+@pytest.fixture
+def server():
+    return DriveServer()
+
+
+@pytest.fixture
+def mirror(make_account, server, tmpdir):
+    account = make_account(retry_policy=False)
+    mount(account, [server])
+    mirror = StorageMirror(account, str(tmpdir.join('mirror.db')),
+                           concurrency=2)
+    yield mirror
+    mirror.close()
+
+
+def names(items):
+    return [item['name'] for item in items]
+
+
+def test_first_sync_walks_tree(mirror, server):
+    assert not mirror.is_initialized()
+
+    assert mirror.sync() == 5
+
+    assert mirror.is_initialized()
+    assert mirror.count() == 5
+    assert names(mirror.get_children('root')) == ['a.txt', 'docs']
+    assert names(mirror.get_children('docs')) == ['b.txt', 'old']
+    assert mirror.get_path('c.txt') == ['docs', 'old', 'c.txt']
+    assert mirror.get('c.txt') == server.items['c.txt']
+
+
+def test_sync_applies_events(mirror, server):
+    mirror.sync()
+    server.change('add', 'd.txt', parent='old')
+    server.change('update', 'a.txt')
+    server.change('add', 'new', parent='root')
+
+    assert mirror.sync() == 3
+
+    assert names(mirror.get_children('old')) == ['c.txt', 'd.txt']
+    assert mirror.get('a.txt')['name'] == 'a.txt.new'
+    assert names(mirror.get_children('root')) == ['a.txt.new', 'docs', 'new']
+    assert mirror.stream.checkpoint_store.get(mirror.key) == '3'
+    assert mirror.sync() == 0
+    assert server.listed.count('root') == 1
+
+
+def test_events_without_metadata_are_requested(mirror, server):
+    mirror.sync()
+    server.change('update', 'docs', with_metadata=False)
+    server.change('update', 'b.txt', with_metadata=False)
+
+    mirror.sync()
+
+    assert mirror.get('docs')['name'] == 'docs.new'
+    assert mirror.get('b.txt')['name'] == 'b.txt.new'
+
+
+def test_resource_deleted_before_it_is_requested(mirror, server):
+    mirror.sync()
+    server.change('update', 'b.txt', with_metadata=False)
+    server.delete('b.txt')
+
+    mirror.sync()
+
+    assert mirror.get('b.txt') is None
+
+
+def test_delete_removes_subtree(mirror, server):
+    mirror.sync()
+    server.change('delete', 'docs')
+
+    assert mirror.sync() == 1
+
+    assert [mirror.get(i) for i in ['docs', 'old', 'b.txt', 'c.txt']] == [
+        None] * 4
+    assert names(mirror.get_children('root')) == ['a.txt']
+    assert mirror.count() == 1
+
+
+def test_applying_events_again_changes_nothing(mirror, server):
+    mirror.sync()
+    server.change('add', 'd.txt', parent='old')
+    server.change('delete', 'old')
+    batch = mirror.stream.fetch()
+
+    mirror.apply_events(batch.events)
+    items = [mirror.get(i) for i in server.items]
+    count = mirror.count()
+    mirror.apply_events(batch.events, batch.cursor)
+
+    assert [mirror.get(i) for i in server.items] == items
+    assert mirror.count() == count == 3
+    assert mirror.stream.fetch().events == []
+
+
+def test_rebuild_replaces_items(mirror, server):
+    mirror.sync()
+    server.delete('old')
+    server.add('e.txt', 'docs')
+    server.change('update', 'a.txt')
+
+    assert mirror.rebuild() == 4
+
+    assert names(mirror.get_children('docs')) == ['b.txt', 'e.txt']
+    assert mirror.get('c.txt') is None
+    assert mirror.get('a.txt')['name'] == 'a.txt.new'
+    # Events before the walk are not applied again
+    assert mirror.sync() == 0
+
+
+def test_mirror_is_resumed(mirror, server, make_account, tmpdir):
+    mirror.sync()
+    server.change('add', 'd.txt', parent='root')
+
+    account = make_account(retry_policy=False)
+    mount(account, [server])
+    resumed = StorageMirror(account, mirror.path)
+    try:
+        assert resumed.is_initialized()
+        assert resumed.sync() == 1
+        assert names(resumed.get_children('root')) == [
+            'a.txt', 'd.txt', 'docs']
+    finally:
+        resumed.close()
+    assert server.listed.count('root') == 1
+
+
+def test_sync_applies_full_batches(make_account, server, tmpdir):
+    account = make_account(retry_policy=False)
+    mount(account, [server])
+    mirror = StorageMirror(account, str(tmpdir.join('mirror.db')),
+                           max_batch_size=2)
+    mirror.sync()
+    for i in range(5):
+        server.change('add', 'f{}.txt'.format(i), parent='root')
+
+    assert mirror.sync() == 5
+    assert mirror.count() == 10
+    mirror.close()
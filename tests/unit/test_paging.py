@@ -0,0 +1,194 @@
+from __future__ import unicode_literals
+
+import logging
+import threading
+
+import pytest
+from six.moves.urllib.parse import parse_qs, urlparse
+
+from kloudless import exceptions
+from kloudless.util import BackgroundIterator
+
+from .fake import mount
+
+PAGE_SIZE = 3
+
+
+def get_page(request):
+    return int(parse_qs(urlparse(request.url).query).get('page', [1])[0])
+
+
+def paged(pages, failing_page=None, empty_page=None):
+    """
+    Answer ``pages`` pages of ``PAGE_SIZE`` files addressed by page number,
+    and ``404`` past the last page.
+    """
+    def respond(request):
+        page = get_page(request)
+        if page == failing_page:
+            return 500, {}, {'message': 'Server error'}
+        if page > pages:
+            return 404, {}, {'message': 'Not found'}
+        objects = [] if page == empty_page else [
+            {'id': '{}-{}'.format(page, i), 'api': 'storage', 'type': 'file'}
+            for i in range(PAGE_SIZE)]
+        body = {'objects': objects, 'page': page, 'type': 'object_list'}
+        if page < pages:
+            body['next_page'] = page + 1
+        return 200, {}, body
+    return respond
+
+
+def all_ids(pages):
+    return ['{}-{}'.format(page, i) for page in range(1, pages + 1)
+            for i in range(PAGE_SIZE)]
+
+
+def ids_of(resources):
+    return [resource.data['id'] for resource in resources]
+
+
+@pytest.fixture
+def account(make_account):
+    return make_account(retry_policy=False)
+
+
+def test_background_iterator_keeps_order():
+    assert list(BackgroundIterator(range(10), size=3)) == list(range(10))
+
+
+def test_background_iterator_reraises_after_items():
+    def items():
+        yield 1
+        yield 2
+        raise ValueError('boom')
+
+    iterator = BackgroundIterator(items(), size=5)
+    assert next(iterator) == 1
+    assert next(iterator) == 2
+    with pytest.raises(ValueError):
+        next(iterator)
+    assert list(iterator) == []
+
+
+@pytest.mark.parametrize('prefetch', [0, 1, 2, 10])
+def test_prefetch_keeps_order(account, prefetch):
+    mount(account, [paged(5)])
+
+    contents = account.get('storage/folders/root/contents')
+    resources = contents.get_paging_iterator(prefetch=prefetch)
+
+    assert ids_of(resources) == all_ids(5)
+
+
+def test_prefetch_requests_pages_ahead(account):
+    adapter = mount(account, [paged(5)])
+    contents = account.get('storage/folders/root/contents')
+
+    resources = contents.get_paging_iterator(prefetch=2)
+    next(resources)
+    # Pages 2 and 3 are buffered, page 4 waits for a free slot
+    for _ in range(50):
+        if len(adapter.requests) >= 4:
+            break
+        threading.Event().wait(0.01)
+    assert [get_page(r) for r in adapter.requests] == [1, 2, 3, 4]
+    resources.close()
+
+
+def test_prefetch_stops_at_max_resources(account):
+    mount(account, [paged(5)])
+    contents = account.get('storage/folders/root/contents')
+
+    resources = contents.get_paging_iterator(max_resources=4, prefetch=1)
+
+    assert ids_of(resources) == all_ids(5)[:4]
+
+
+def test_prefetch_error_is_raised_to_caller(account):
+    mount(account, [paged(5, failing_page=3)])
+    contents = account.get('storage/folders/root/contents')
+
+    ids = []
+    with pytest.raises(exceptions.ServerException):
+        for resource in contents.get_paging_iterator(prefetch=2):
+            ids.append(resource.data['id'])
+
+    assert ids == all_ids(2)
+
+
+@pytest.mark.parametrize('workers', [1, 2, 4, 8])
+def test_pages_parallel_keeps_order(account, workers):
+    mount(account, [paged(6)])
+    contents = account.get('storage/folders/root/contents')
+
+    pages = list(contents.get_pages_parallel(workers=workers))
+
+    assert [page.page for page in pages] == [1, 2, 3, 4, 5, 6]
+    assert pages[0] is contents
+
+
+def test_pages_parallel_stops_at_empty_page(account):
+    mount(account, [paged(6, empty_page=3)])
+    contents = account.get('storage/folders/root/contents')
+
+    pages = list(contents.get_pages_parallel(workers=4))
+
+    assert [page.page for page in pages] == [1, 2]
+
+
+def test_pages_parallel_error_is_raised_to_caller(account):
+    mount(account, [paged(6, failing_page=4)])
+    contents = account.get('storage/folders/root/contents')
+
+    pages = contents.get_pages_parallel(workers=2)
+    assert [next(pages).page for _ in range(3)] == [1, 2, 3]
+    with pytest.raises(exceptions.ServerException):
+        next(pages)
+
+
+def test_pages_parallel_single_page(account):
+    mount(account, [paged(1)])
+    contents = account.get('storage/folders/root/contents')
+
+    assert list(contents.get_pages_parallel(workers=4)) == [contents]
+
+
+def test_iter_all(account):
+    mount(account, [paged(5)])
+    contents = account.get('storage/folders/root/contents')
+
+    assert ids_of(contents.iter_all(concurrency=3)) == all_ids(5)
+
+
+def test_iter_all_max_resources(account):
+    mount(account, [paged(5)])
+    contents = account.get('storage/folders/root/contents')
+
+    resources = contents.iter_all(concurrency=3, max_resources=7)
+
+    assert ids_of(resources) == all_ids(5)[:7]
+
+
+def test_speculative_not_found_is_not_logged_as_error(account, caplog):
+    adapter = mount(account, [paged(2)])
+    contents = account.get('storage/folders/root/contents')
+
+    with caplog.at_level(logging.DEBUG, logger='kloudless'):
+        assert ids_of(contents.iter_all(concurrency=4)) == all_ids(2)
+
+    assert max(get_page(r) for r in adapter.requests) > 2
+    assert not [r for r in caplog.records if r.levelno >= logging.ERROR]
+    assert any('404' in r.getMessage() for r in caplog.records
+               if r.levelno == logging.DEBUG)
+
+
+def test_not_found_is_logged_as_error(account, caplog):
+    mount(account, [(404, {}, {'message': 'Not found'})])
+
+    with caplog.at_level(logging.DEBUG, logger='kloudless'):
+        with pytest.raises(exceptions.NotFoundException):
+            account.get('storage/files/missing')
+
+    assert [r.levelno for r in caplog.records
+            if r.levelno > logging.DEBUG] == [logging.ERROR]
@@ -0,0 +1,100 @@
+from __future__ import unicode_literals
+
+import io
+
+import pytest
+
+from kloudless import Account, configuration, exceptions
+from kloudless.pool import ConnectionPool, HTTP2Adapter
+
+
+def get_adapter(account):
+    return account.get_adapter('https://api.kloudless.com')
+
+
+def test_sessions_have_their_own_pool_by_default():
+    first = Account(token='first')
+    second = Account(token='second')
+
+    assert first.connection_pool is None
+    assert get_adapter(first) is not get_adapter(second)
+
+
+def test_auto_pool_is_shared(monkeypatch):
+    monkeypatch.setitem(configuration, 'connection_pool', 'auto')
+    first = Account(token='first')
+    second = Account(token='second')
+
+    assert first.connection_pool is second.connection_pool
+    assert get_adapter(first) is get_adapter(second)
+    first.close()
+    assert get_adapter(second) is second.connection_pool.adapter
+
+
+def test_own_pool_follows_configuration(monkeypatch):
+    monkeypatch.setitem(configuration, 'pool_maxsize', 3)
+    pool = ConnectionPool()
+
+    assert pool.pool_maxsize == 3
+    assert get_adapter(Account(token='token'))._pool_maxsize == 3
+
+
+class TestHTTP2Adapter(object):
+
+    @pytest.fixture
+    def account(self):
+        httpx = pytest.importorskip('httpx')
+        self.requests = []
+
+        def handler(request):
+            request.read()
+            self.requests.append(request)
+            if request.url.path.endswith('/contents'):
+                return httpx.Response(200, content=[b'file ', b'content'])
+            if request.url.path.endswith('/missing'):
+                return httpx.Response(404, json={'message': 'Not found'})
+            return httpx.Response(200, json={'id': 'abc'})
+
+        account = Account(token='token', account_id='1',
+                          connection_pool=False, retry_policy=False)
+        account.mount('https://', HTTP2Adapter(
+            transport=httpx.MockTransport(handler)))
+        return account
+
+    @pytest.mark.parametrize('data', [
+        b'content', bytearray(b'content'), io.BytesIO(b'content'),
+        iter([b'con', b'tent'])])
+    def test_request_body(self, account, data):
+        account.post('storage/files', data=data)
+
+        request = self.requests[0]
+        assert request.content == b'content'
+        assert request.headers['Authorization'] == 'Bearer token'
+
+    def test_streamed_body(self, account):
+        progress = []
+
+        account.post('storage/files', data=io.BytesIO(b'content'),
+                     progress_callback=lambda *args: progress.append(args))
+
+        assert self.requests[0].content == b'content'
+        assert self.requests[0].headers['Content-Length'] == '7'
+        assert progress[-1] == (7, 7)
+
+    def test_iterator_body_is_chunked(self, account):
+        account.post('storage/files', data=iter([b'con', b'tent']),
+                     progress_callback=lambda *args: None)
+
+        assert self.requests[0].content == b'content'
+        assert self.requests[0].headers['Transfer-Encoding'] == 'chunked'
+
+    def test_streamed_response(self, account):
+        response = account.get('storage/files/abc/contents', stream=True,
+                               get_raw_response=True)
+
+        assert response.raw.http_version == 'HTTP/1.1'
+        assert b''.join(response.iter_content(3)) == b'file content'
+
+    def test_error_status(self, account):
+        with pytest.raises(exceptions.NotFoundException):
+            account.get('storage/files/missing')
@@ -0,0 +1,101 @@
+from __future__ import unicode_literals
+
+import pytest
+
+from kloudless import exceptions
+from kloudless.ratelimit import (
+    Limit, RateLimiter, SQLiteRateLimitBackend, slow_down, take_token)
+
+from .fake import mount
+
+ACCOUNT_URL = 'https://api.kloudless.com/v2/accounts/5/storage/files/abc'
+
+
+def test_burst_is_free_then_tokens_are_borrowed():
+    limit = Limit(2, burst=3)
+    state = None
+    delays = []
+    for _ in range(5):
+        state, delay = take_token(state, 100.0, limit, recovery=0)
+        delays.append(delay)
+
+    assert delays == [0.0, 0.0, 0.0, 0.5, 1.0]
+
+
+def test_tokens_refill_with_time_up_to_burst():
+    limit = Limit(2, burst=3)
+    state, _ = take_token(None, 100.0, limit, recovery=0)
+    state, _ = take_token(state, 100.0, limit, recovery=0)
+    assert state['tokens'] == 1
+
+    state, delay = take_token(state, 101.0, limit, recovery=0)
+    assert delay == 0.0
+    assert state['tokens'] == 2
+
+    state, _ = take_token(state, 200.0, limit, recovery=0)
+    assert state['tokens'] == 2
+
+
+def test_slow_down_holds_bucket_and_recovers():
+    limit = Limit(10)
+    state = slow_down(None, 100.0, limit, factor=0.5, min_rate=0.1, delay=2)
+    assert state['rate'] == 5
+    assert state['tokens'] == -10
+
+    state, delay = take_token(state, 100.0, limit, recovery=0.1)
+    assert delay == pytest.approx(2.2)
+    assert state['rate'] == 6
+
+    state = slow_down(None, 100.0, Limit(0.15), factor=0.5, min_rate=0.1,
+                      delay=0)
+    assert state['rate'] == 0.1
+
+
+def test_buckets_of_a_request():
+    limiter = RateLimiter(application=50, account=5, service=20,
+                          services={'5': 'gdrive'})
+    keys = [key for key, _ in limiter.get_buckets(ACCOUNT_URL)]
+    assert keys == ['default:application', 'default:account:5',
+                    'default:service:gdrive']
+
+    me_url = 'https://api.kloudless.com/v2/accounts/me/storage/files/abc'
+    first = limiter.get_buckets(me_url, 'Bearer a')
+    second = limiter.get_buckets(me_url, 'Bearer b')
+    assert len(first) == len(second) == 2
+    assert first[1][0] != second[1][0]
+
+    assert [key for key, _ in limiter.get_buckets(
+        'https://api.kloudless.com/v2/meta/apps')] == ['default:application']
+
+
+@pytest.mark.parametrize('backend', [None, 'sqlite'])
+def test_reserve_takes_a_token_from_each_bucket(backend, tmpdir):
+    if backend == 'sqlite':
+        backend = SQLiteRateLimitBackend(str(tmpdir.join('limits.db')))
+    limiter = RateLimiter(application=(100, 1), account=(1, 2),
+                          backend=backend)
+    buckets = limiter.get_buckets(ACCOUNT_URL)
+
+    delays = [limiter.reserve(buckets) for _ in range(3)]
+
+    assert delays[:2] == [0.0, pytest.approx(0.01, abs=0.01)]
+    assert delays[2] == pytest.approx(1.0, abs=0.05)
+    assert limiter.waited == pytest.approx(sum(delays))
+    limiter.clear()
+    assert limiter.waited == 0
+    assert limiter.reserve(buckets) == 0.0
+
+
+def test_session_waits_and_slows_down_on_429(make_account, sleeps):
+    limiter = RateLimiter(account=(10, 1))
+    account = make_account(account_id='5', rate_limiter=limiter)
+    mount(account, [(429, {'Retry-After': '3'}, b''), (200, {}, {})])
+
+    with pytest.raises(exceptions.RateLimitException):
+        account.get('storage/files/abc')
+    account.get('storage/files/abc')
+
+    assert len(sleeps) == 1
+    assert sleeps[0] == pytest.approx(3.0, abs=0.2)
+    bucket = limiter.backend.buckets['default:account:5']
+    assert bucket['rate'] == pytest.approx(5.0, abs=0.1)
@@ -0,0 +1,97 @@
+from __future__ import unicode_literals
+
+import pytest
+
+from kloudless.resources.base import LazyResourceSequence, Resource
+
+from .fake import mount, ok
+
+
+def test_storage_url_is_built_from_account_url():
+    url = Resource._construct_url(
+        {'api': 'storage', 'type': 'file', 'id': 'abc'},
+        'https://api.kloudless.com/v2/accounts/5/storage/folders/root/'
+        'contents')
+    assert url == 'https://api.kloudless.com/v2/accounts/5/storage/files/abc'
+
+
+def test_storage_url_without_account_falls_back_to_url():
+    url = Resource._construct_url(
+        {'api': 'storage', 'type': 'file', 'id': 'abc'},
+        'https://api.kloudless.com/v2/files')
+    assert url == 'https://api.kloudless.com/v2/files/abc'
+
+
+def make_page(make_account, count=3):
+    account = make_account()
+    objects = [{'id': str(i), 'api': 'storage', 'type': 'file'}
+               for i in range(count)]
+    mount(account, [ok({'objects': objects, 'type': 'object_list'})])
+    return account, account.get('storage/folders/root/contents',
+                                params={'page_size': count})
+
+
+def test_resources_are_created_lazily(make_account):
+    _, page = make_page(make_account)
+
+    assert isinstance(page.objects, LazyResourceSequence)
+    assert page.objects.data[1]['id'] == '1'
+    assert page.objects._resources == [None] * 3
+
+    resource = page.objects[1]
+    assert page.objects._resources == [None, resource, None]
+    assert page.objects[1] is resource
+    assert page.objects[-1] is page.objects[2]
+    assert page.objects[:2] == [page.objects[0], resource]
+    assert list(page) == list(page.objects)
+    assert len(page.objects) == 3
+
+
+def test_resources_are_slotted(make_account):
+    account, page = make_page(make_account)
+    resource = page.objects[0]
+
+    assert not hasattr(resource, '__dict__')
+    with pytest.raises(AttributeError):
+        resource.extra = True
+    with pytest.raises(AttributeError):
+        resource.status_code
+    assert resource.data == {'id': '0', 'api': 'storage', 'type': 'file'}
+    assert resource.url == ('https://api.kloudless.com/v1/accounts/1/'
+                            'storage/files/0')
+    assert resource.client is account
+    assert resource.response is None
+    assert page.status_code == 200
+
+
+def test_resources_share_page_context(make_account):
+    _, page = make_page(make_account)
+    first, second = page.objects[:2]
+
+    assert first._context is second._context
+    assert page.query_params == {'page_size': ['3']}
+    assert first.query_params == {}
+
+
+def test_resource_query_params_are_not_shared(make_account):
+    account, page = make_page(make_account)
+    first, second = page.objects[:2]
+
+    first.query_params['fields'] = 'id'
+
+    assert first.query_params == {'fields': 'id'}
+    assert second.query_params == {}
+    assert page.objects[2].query_params == {}
+    assert first.client is account and first.url != second.url
+
+
+def test_resource_client_is_not_shared(make_account):
+    account, page = make_page(make_account)
+    first, second = page.objects[:2]
+    other = make_account(token='other')
+
+    first.client = other
+
+    assert first.client is other
+    assert second.client is account
+    assert second.query_params == {}
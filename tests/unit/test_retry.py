@@ -0,0 +1,97 @@
+from __future__ import unicode_literals
+
+import pytest
+
+from kloudless import RetryPolicy, exceptions
+
+from .fake import mount, ok
+
+
+def policy(**kwargs):
+    kwargs.setdefault('jitter', 0)
+    return RetryPolicy(**kwargs)
+
+
+def test_retries_server_errors_with_exponential_backoff(make_account, sleeps):
+    account = make_account(retry_policy=policy(max_attempts=4))
+    adapter = mount(account, [(503, {}, b''), (502, {}, b''), ok()])
+
+    resource = account.get('storage/files/abc')
+
+    assert resource.data['id'] == 'abc'
+    assert len(adapter.requests) == 3
+    assert sleeps == [0.5, 1.0]
+
+
+def test_backoff_is_capped_and_jittered():
+    assert policy(backoff_factor=1, max_backoff=5).get_backoff(10) == 5
+    jittered = RetryPolicy(backoff_factor=1, jitter=1.0)
+    assert all(0 <= jittered.get_backoff(3) <= 4 for _ in range(100))
+
+
+def test_retry_after_takes_precedence(make_account, sleeps):
+    account = make_account(retry_policy=policy())
+    mount(account, [(429, {'Retry-After': '2'}, b''), ok()])
+
+    account.get('storage/files/abc')
+
+    assert sleeps == [2.0]
+
+
+def test_retry_after_is_capped_by_max_backoff(make_account, sleeps):
+    account = make_account(retry_policy=policy(max_backoff=30))
+    mount(account, [(429, {'Retry-After': '86400'}, b''), ok()])
+
+    account.get('storage/files/abc')
+
+    assert sleeps == [30]
+
+
+def test_retry_after_http_date():
+    assert RetryPolicy.parse_retry_after(
+        'Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
+    assert RetryPolicy.parse_retry_after('soon') is None
+
+
+def test_gives_up_after_max_attempts(make_account, sleeps):
+    account = make_account(retry_policy=policy(max_attempts=3))
+    adapter = mount(account, [(500, {}, b'')])
+
+    with pytest.raises(exceptions.ServerException):
+        account.get('storage/files/abc')
+
+    assert len(adapter.requests) == 3
+
+
+def test_deadline_stops_retrying(make_account, sleeps):
+    account = make_account(retry_policy=policy(deadline=1))
+    adapter = mount(account, [(429, {'Retry-After': '5'}, b''), ok()])
+
+    with pytest.raises(exceptions.RateLimitException):
+        account.get('storage/files/abc')
+
+    assert len(adapter.requests) == 1
+
+
+def test_non_idempotent_methods_only_retry_rate_limits(make_account, sleeps):
+    account = make_account(retry_policy=policy())
+    adapter = mount(account, [(503, {}, b''), ok()])
+    with pytest.raises(exceptions.ServerException):
+        account.post('storage/files', data=b'content')
+    assert len(adapter.requests) == 1
+
+    adapter = mount(account, [(429, {}, b''), ok()])
+    account.post('storage/files', data=b'content')
+    assert len(adapter.requests) == 2
+    assert adapter.requests[1].body == b'content'
+
+
+def test_non_replayable_body_is_not_retried(make_account, sleeps):
+    account = make_account(retry_policy=policy())
+    adapter = mount(account, [(429, {}, b''), ok()])
+
+    with pytest.raises(exceptions.RateLimitException):
+        account.post('storage/files', data=iter([b'a', b'b']))
+
+    assert len(adapter.requests) == 1
+    assert sleeps == []
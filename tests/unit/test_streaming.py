@@ -0,0 +1,120 @@
+from __future__ import unicode_literals
+
+import pytest
+from six.moves.urllib.parse import parse_qs, urlparse
+
+from kloudless.resources.base import StreamingResourceList
+
+from .fake import mount
+
+PAGE_SIZE = 1000
+
+
+def get_param(request, name, default=None):
+    return parse_qs(urlparse(request.url).query).get(name, [default])[0]
+
+
+def paged(pages):
+    """
+    Answer ``pages`` pages of ``PAGE_SIZE`` files addressed by page number,
+    and ``404`` past the last page.
+    """
+    def respond(request):
+        page = int(get_param(request, 'page', 1))
+        if page > pages:
+            return 404, {}, {'message': 'Not found'}
+        objects = [{'id': '{}-{}'.format(page, i), 'api': 'storage',
+                    'type': 'file'} for i in range(PAGE_SIZE)]
+        body = {'objects': objects, 'page': page, 'type': 'object_list'}
+        if page < pages:
+            body['next_page'] = page + 1
+        return 200, {}, body
+    return respond
+
+
+def events(pages):
+    def respond(request):
+        cursor = int(get_param(request, 'cursor', 0))
+        if cursor >= pages:
+            return 200, {}, {'objects': [], 'cursor': cursor}
+        return 200, {}, {'objects': [{'id': 'e{}'.format(cursor)}],
+                         'cursor': cursor + 1}
+    return respond
+
+
+def test_resources_are_streamed(make_account):
+    account = make_account()
+    mount(account, [paged(1)])
+
+    contents = account.get('storage/folders/root/contents',
+                           stream_objects=True)
+
+    assert isinstance(contents, StreamingResourceList)
+    assert contents.count == 0
+    ids = [resource.data['id'] for resource in contents]
+    assert ids[:2] == ['1-0', '1-1'] and len(ids) == PAGE_SIZE
+    assert contents.count == PAGE_SIZE
+    assert contents.page == 1
+    assert list(contents) == []
+
+
+def test_finish_parses_remaining_fields(make_account):
+    account = make_account()
+    mount(account, [paged(2)])
+
+    with account.get('storage/folders/root/contents',
+                     stream_objects=True) as contents:
+        contents.finish()
+        assert contents.next_page == 2
+        assert contents.count == PAGE_SIZE
+
+
+@pytest.mark.parametrize('prefetch', [0, 1, 3])
+def test_paging_iterator(make_account, prefetch):
+    account = make_account()
+    adapter = mount(account, [paged(6)])
+
+    contents = account.get('storage/folders/root/contents',
+                           stream_objects=True)
+    ids = [resource.data['id'] for resource
+           in contents.get_paging_iterator(prefetch=prefetch)]
+
+    assert len(ids) == 6 * PAGE_SIZE
+    assert ids[PAGE_SIZE] == '2-0' and ids[-1] == '6-999'
+    assert [get_param(r, 'page') for r in adapter.requests] == [
+        None, '2', '3', '4', '5', '6', '7']
+
+
+def test_paging_iterator_max_resources(make_account):
+    account = make_account()
+    adapter = mount(account, [paged(6)])
+
+    contents = account.get('storage/folders/root/contents',
+                           stream_objects=True)
+    ids = list(contents.get_paging_iterator(max_resources=PAGE_SIZE + 1))
+
+    assert len(ids) == PAGE_SIZE + 1
+    assert len(adapter.requests) == 2
+
+
+def test_events_are_paged_by_cursor(make_account):
+    account = make_account()
+    mount(account, [events(3)])
+
+    stream = account.get('events', params={'cursor': 0},
+                         stream_objects=True)
+    ids = [event.data['id'] for event in stream.get_paging_iterator()]
+
+    assert ids == ['e0', 'e1', 'e2']
+    assert stream.latest_cursor == 3
+
+
+def test_iter_all_is_sequential(make_account):
+    account = make_account()
+    adapter = mount(account, [paged(3)])
+
+    contents = account.get('storage/folders/root/contents',
+                           stream_objects=True)
+
+    assert len(list(contents.iter_all(concurrency=4))) == 3 * PAGE_SIZE
+    assert len(adapter.requests) == 4
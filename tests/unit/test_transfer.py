@@ -0,0 +1,301 @@
+from __future__ import unicode_literals
+
+import io
+import json
+import mmap
+import re
+
+import pytest
+from six.moves.urllib.parse import parse_qs, urlparse
+
+from kloudless import exceptions
+from kloudless.transfer import StreamingBody, get_streaming_body
+
+from .fake import mount, ok
+
+CONTENT = bytes(bytearray(range(256))) * 1024
+
+
+def progress_recorder():
+    calls = []
+
+    def callback(sent, total):
+        calls.append((sent, total))
+    callback.calls = calls
+    return callback
+
+
+@pytest.mark.parametrize('make_source, size', [
+    (lambda: CONTENT, len(CONTENT)),
+    (lambda: bytearray(CONTENT), len(CONTENT)),
+    (lambda: memoryview(CONTENT), len(CONTENT)),
+    (lambda: io.BytesIO(CONTENT), len(CONTENT)),
+    (lambda: iter([CONTENT[:1000], CONTENT[1000:]]), None),
+])
+def test_bodies_are_streamed_with_progress(make_account, make_source, size):
+    account = make_account()
+    adapter = mount(account, [ok()])
+    callback = progress_recorder()
+
+    account.post('storage/files', data=make_source(),
+                 progress_callback=callback)
+
+    assert adapter.bodies == [CONTENT]
+    request = adapter.requests[0]
+    if size is None:
+        assert request.headers['Transfer-Encoding'] == 'chunked'
+    else:
+        assert request.headers['Content-Length'] == str(size)
+    assert callback.calls[-1] == (len(CONTENT), size)
+    assert [sent for sent, _ in callback.calls] == sorted(
+        sent for sent, _ in callback.calls)
+
+
+def test_bytes_without_progress_are_sent_as_is():
+    assert get_streaming_body(CONTENT) is CONTENT
+    assert get_streaming_body({'a': 'b'}) == {'a': 'b'}
+    assert isinstance(get_streaming_body(bytearray(b'a')), StreamingBody)
+
+
+def test_mmap_can_be_closed_after_request(make_account, tmpdir):
+    path = tmpdir.join('upload.bin')
+    path.write_binary(CONTENT)
+    account = make_account()
+    adapter = mount(account, [ok()])
+
+    with open(str(path), 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            account.post('storage/files', data=mm)
+
+    assert adapter.bodies == [CONTENT]
+
+
+def test_buffer_body_is_rewound_after_release():
+    body = StreamingBody(bytearray(CONTENT), chunk_size=4096)
+    assert b''.join(body) == CONTENT
+    body.seek(0)
+    assert body.read(10) == CONTENT[:10]
+    body.close()
+    assert body.read() == CONTENT[10:]
+
+
+def test_file_body_is_read_from_its_position():
+    source = io.BytesIO(CONTENT)
+    source.seek(100)
+    body = StreamingBody(source, size=50)
+
+    assert body.size == 50
+    assert body.read() == CONTENT[100:150]
+    body.seek(10)
+    assert body.read(5) == CONTENT[110:115]
+
+
+def ranged(content, failures=None):
+    """
+    Answer Range requests for ``content``. ``failures`` maps Range headers to
+    ``'truncate'``, to send half of the range, or to a status code, for the
+    first request of that range only.
+    """
+    failures = dict(failures or {})
+
+    def respond(request):
+        match = re.match(r'bytes=(\d+)-(\d+)', request.headers['Range'])
+        start, end = int(match.group(1)), int(match.group(2))
+        failure = failures.pop(request.headers['Range'], None)
+        if isinstance(failure, int):
+            return failure, {}, {'message': 'failed'}
+        body = content[start:end + 1]
+        if failure == 'truncate':
+            body = body[:len(body) // 2]
+        return 206, {'Content-Range': 'bytes {}-{}/{}'.format(
+            start, end, len(content))}, body
+    return respond
+
+
+def get_ranges(adapter):
+    return [request.headers.get('Range') for request in adapter.requests]
+
+
+def test_download_in_parts(make_account, tmpdir):
+    account = make_account()
+    adapter = mount(account, [ranged(CONTENT[:10000])])
+    dest = str(tmpdir.join('download.bin'))
+
+    size = account.download_to('storage/files/abc/contents', dest, parts=4)
+
+    assert size == 10000
+    assert tmpdir.join('download.bin').read_binary() == CONTENT[:10000]
+    assert sorted(get_ranges(adapter)) == [
+        'bytes=0-0', 'bytes=0-2499', 'bytes=2500-4999', 'bytes=5000-7499',
+        'bytes=7500-9999']
+
+
+def test_download_resumes_truncated_and_failed_parts(make_account):
+    account = make_account()
+    adapter = mount(account, [ranged(CONTENT[:10000], {
+        'bytes=2500-4999': 'truncate', 'bytes=5000-7499': 503})])
+    dest = io.BytesIO()
+
+    size = account.download_to('storage/files/abc/contents', dest, parts=4)
+
+    assert size == 10000
+    assert dest.getvalue() == CONTENT[:10000]
+    ranges = get_ranges(adapter)
+    assert 'bytes=3750-4999' in ranges
+    assert ranges.count('bytes=5000-7499') == 2
+
+
+def test_failed_parts_are_resumed_later(make_account, tmpdir):
+    account = make_account()
+    failures = dict(('bytes={}-2499'.format(start), 'truncate')
+                    for start in (0, 1250, 1875))
+    mount(account, [ranged(CONTENT[:5000], failures)])
+    dest = str(tmpdir.join('download.bin'))
+
+    with pytest.raises(exceptions.TransferFailed) as info:
+        account.download_to('storage/files/abc/contents', dest, parts=2,
+                            max_retries=2)
+    assert [(part.start, part.offset) for part in info.value.parts] == [
+        (0, 2187)]
+
+    size = account.download_to('storage/files/abc/contents', dest,
+                               resume_parts=info.value.parts)
+    assert size == 2500
+    assert tmpdir.join('download.bin').read_binary() == CONTENT[:5000]
+
+
+def test_download_without_range_support(make_account):
+    account = make_account()
+    adapter = mount(account, [(200, {}, CONTENT)])
+    dest = io.BytesIO()
+
+    assert account.download_to('storage/files/abc/contents', dest) == len(
+        CONTENT)
+    assert dest.getvalue() == CONTENT
+    assert len(adapter.requests) == 1
+
+
+def test_download_empty_file(make_account):
+    account = make_account()
+    mount(account, [(416, {}, {'message': 'Range Not Satisfiable'})])
+    dest = io.BytesIO(b'previous')
+
+    assert account.download_to('storage/files/abc/contents', dest) == 0
+    assert dest.getvalue() == b''
+
+
+def test_download_warns_when_parts_exceed_pool(make_account, caplog):
+    account = make_account()
+    mount(account, [ranged(CONTENT[:100])])
+
+    account.download_to('storage/files/abc/contents', io.BytesIO(),
+                        parts=50, part_size=10)
+
+    assert 'exceed the 10 connections' in caplog.text
+
+
+class MultipartServer(object):
+    """
+    Answers the multipart upload endpoints with parts of ``part_size`` bytes.
+    Parts in ``failing_parts`` are answered with ``503``.
+    """
+    def __init__(self, part_size=1000, failing_parts=()):
+        self.part_size = part_size
+        self.failing_parts = set(failing_parts)
+        self.parts = {}
+        self.initialized = 0
+
+    def session(self):
+        return {'id': 'upload', 'part_size': self.part_size,
+                'parallel_uploads': True}
+
+    def __call__(self, request):
+        path = urlparse(request.path_url).path.split('/storage/', 1)[1]
+        if request.method == 'POST' and path == 'multipart':
+            self.initialized += 1
+            return 200, {}, self.session()
+        if request.method == 'GET' and path == 'multipart/upload':
+            return 200, {}, self.session()
+        if request.method == 'PUT' and path == 'multipart/upload':
+            number = int(parse_qs(urlparse(request.url).query)[
+                'part_number'][0])
+            if number in self.failing_parts:
+                return 503, {}, {'message': 'unavailable'}
+            self.parts[number] = request.content
+            return 200, {}, {}
+        if request.method == 'POST' and path == 'multipart/upload/complete':
+            return 200, {}, {'id': 'file', 'api': 'storage', 'type': 'file'}
+        return 404, {}, {'message': 'not found'}
+
+    @property
+    def content(self):
+        return b''.join(self.parts[n] for n in sorted(self.parts))
+
+
+@pytest.mark.parametrize('source', ['path', 'fileobj'])
+def test_multipart_upload(make_account, tmpdir, source):
+    content = CONTENT[:4500]
+    if source == 'path':
+        tmpdir.join('upload.bin').write_binary(content)
+        source = str(tmpdir.join('upload.bin'))
+    else:
+        source = io.BytesIO(content)
+    account = make_account()
+    server = MultipartServer()
+    mount(account, [server])
+
+    resource = account.upload_multipart(source, 'root', 'upload.bin')
+
+    assert resource.data['id'] == 'file'
+    assert sorted(server.parts) == [1, 2, 3, 4, 5]
+    assert [len(server.parts[n]) for n in range(1, 6)] == [
+        1000, 1000, 1000, 1000, 500]
+    assert server.content == content
+
+
+def test_multipart_upload_resumes_from_checkpoint(make_account, tmpdir):
+    tmpdir.join('upload.bin').write_binary(CONTENT[:4500])
+    source = str(tmpdir.join('upload.bin'))
+    checkpoint = tmpdir.join('upload.json')
+    account = make_account()
+    server = MultipartServer(failing_parts=[2, 4])
+    adapter = mount(account, [server])
+
+    with pytest.raises(exceptions.TransferFailed) as info:
+        account.upload_multipart(source, 'root', 'upload.bin',
+                                 checkpoint_path=str(checkpoint),
+                                 max_retries=1)
+    assert sorted(info.value.parts) == [2, 4]
+    saved = json.loads(checkpoint.read())
+    assert saved['session_id'] == 'upload'
+    assert saved['completed_parts'] == [1, 3, 5]
+
+    server.failing_parts.clear()
+    del adapter.requests[:]
+    account.upload_multipart(source, 'root', 'upload.bin',
+                             checkpoint_path=str(checkpoint))
+
+    assert server.initialized == 1
+    assert [parse_qs(urlparse(r.url).query).get('part_number')
+            for r in adapter.requests if r.method == 'PUT'] in (
+        [['2'], ['4']], [['4'], ['2']])
+    assert server.content == CONTENT[:4500]
+    assert not checkpoint.check()
+
+
+def test_multipart_upload_ignores_checkpoint_of_other_file(make_account,
+                                                          tmpdir):
+    checkpoint = tmpdir.join('upload.json')
+    checkpoint.write(json.dumps({
+        'session_id': 'upload', 'parent_id': 'root', 'name': 'other.bin',
+        'size': 1500, 'completed_parts': [1]}))
+    account = make_account()
+    server = MultipartServer()
+    mount(account, [server])
+
+    account.upload_multipart(io.BytesIO(CONTENT[:1500]), 'root', 'upload.bin',
+                             checkpoint_path=str(checkpoint))
+
+    assert server.initialized == 1
+    assert sorted(server.parts) == [1, 2]
+    assert not checkpoint.check()
@@ -0,0 +1,152 @@
+from __future__ import unicode_literals
+
+import re
+
+import pytest
+from six.moves.urllib.parse import parse_qs, urlparse
+
+from kloudless import exceptions
+from kloudless.walk import TreeWalker
+
+from .fake import mount
+
+PAGE_SIZE = 2
+
+TREE = {
+    'root': [('docs', 'folder'), ('a.txt', 'file'), ('pics', 'folder')],
+    'docs': [('b.txt', 'file'), ('old', 'folder'), ('c.txt', 'file')],
+    'old': [('d.txt', 'file')],
+    'pics': [('e.png', 'file')],
+}
+
+
+class TreeServer(object):
+    """
+    Answer the folder contents of ``tree``, where folders are named after
+    their ID, in pages of ``PAGE_SIZE`` items.
+    """
+    def __init__(self, tree, failures=None):
+        self.tree = tree
+        self.failures = dict(failures or {})
+        self.listed = []
+
+    def __call__(self, request):
+        folder_id = re.search(r'/folders/([^/]+)/contents',
+                              urlparse(request.url).path).group(1)
+        page = int(parse_qs(urlparse(request.url).query).get('page', [1])[0])
+        if folder_id in self.failures:
+            return self.failures.pop(folder_id)
+        if folder_id not in self.tree:
+            return 404, {}, {'message': 'Not found'}
+        items = self.tree[folder_id]
+        start = (page - 1) * PAGE_SIZE
+        if page > 1 and start >= len(items):
+            return 404, {}, {'message': 'Not found'}
+        self.listed.append((folder_id, page))
+        objects = [{'id': name, 'name': name, 'type': type_,
+                    'api': 'storage', 'parent': {'id': folder_id}}
+                   for name, type_ in items[start:start + PAGE_SIZE]]
+        body = {'objects': objects, 'page': page, 'type': 'object_list'}
+        if start + PAGE_SIZE < len(items):
+            body['next_page'] = page + 1
+        return 200, {}, body
+
+
+@pytest.fixture
+def account(make_account):
+    return make_account(retry_policy=False)
+
+
+def paths(walk):
+    return [path for path, _ in walk]
+
+
+ALL_PATHS = ['/docs', '/a.txt', '/pics', '/pics/e.png', '/docs/b.txt',
+             '/docs/old', '/docs/c.txt', '/docs/old/d.txt']
+
+
+def test_single_worker_lists_last_folder_found_first(account):
+    server = TreeServer(TREE)
+    mount(account, [server])
+
+    assert paths(account.walk(concurrency=1)) == ALL_PATHS
+    assert server.listed == [
+        ('root', 1), ('root', 2), ('pics', 1), ('docs', 1), ('docs', 2),
+        ('old', 1)]
+
+
+@pytest.mark.parametrize('concurrency', [2, 4, 8])
+def test_concurrent_walk_yields_all_items(account, concurrency):
+    mount(account, [TreeServer(TREE)])
+    walker = TreeWalker(account, concurrency=concurrency)
+
+    walked = paths(walker)
+
+    assert sorted(walked) == sorted(ALL_PATHS)
+    assert walker.folders_listed == 4
+    # Items of a folder keep their order
+    docs = [path for path in walked if re.match(r'/docs/[^/]+$', path)]
+    assert docs == ['/docs/b.txt', '/docs/old', '/docs/c.txt']
+
+
+def test_resources_match_paths(account):
+    mount(account, [TreeServer(TREE)])
+
+    for path, resource in account.walk():
+        assert path.rsplit('/', 1)[-1] == resource.data['name']
+
+
+@pytest.mark.parametrize('max_depth, expected', [
+    (1, ['/docs', '/a.txt', '/pics']),
+    (2, ['/docs', '/a.txt', '/pics', '/pics/e.png', '/docs/b.txt',
+         '/docs/old', '/docs/c.txt']),
+    (3, ALL_PATHS),
+])
+def test_max_depth(account, max_depth, expected):
+    server = TreeServer(TREE)
+    mount(account, [server])
+
+    assert paths(account.walk(concurrency=1, max_depth=max_depth)) == expected
+    # Folders at the deepest level are not listed
+    assert len({folder for folder, _ in server.listed}) == {
+        1: 1, 2: 3, 3: 4}[max_depth]
+
+
+def test_walk_subfolder(account):
+    mount(account, [TreeServer(TREE)])
+
+    assert paths(account.walk('docs', concurrency=1)) == [
+        '/b.txt', '/old', '/c.txt', '/old/d.txt']
+
+
+def test_missing_folder_is_skipped(account):
+    tree = dict(TREE)
+    del tree['old']
+    mount(account, [TreeServer(tree)])
+
+    assert paths(account.walk(concurrency=1)) == [
+        path for path in ALL_PATHS if path != '/docs/old/d.txt']
+
+
+def test_error_stops_walk(account):
+    mount(account, [TreeServer(TREE, failures={
+        'docs': (500, {}, {'message': 'Server error'})})])
+
+    with pytest.raises(exceptions.ServerException):
+        paths(account.walk(concurrency=2))
+
+
+def test_rate_limited_folder_is_listed_again(account, clock):
+    mount(account, [TreeServer(TREE, failures={
+        'pics': (429, {'Retry-After': '3'}, {'message': 'Slow'})})])
+
+    assert paths(account.walk(concurrency=1)) == ALL_PATHS
+    assert clock.sleeps == [3]
+
+
+def test_walk_can_be_closed_early(account):
+    mount(account, [TreeServer(TREE)])
+    walk = account.walk(concurrency=2, buffer_size=1)
+
+    assert next(walk)[0] in ALL_PATHS
+    walk.close()